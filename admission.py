@@ -0,0 +1,211 @@
+"""
+Admission control for pipeline requests.
+
+At most `max_in_flight` pipelines run at once. Further requests wait in a
+bounded FIFO queue, and once the queue is full they are rejected at once
+with a Retry-After estimate instead of slowing every running request
+down. While a request waits or runs, the client connection is polled.
+If the client has gone away, a queued request leaves the queue. A
+running one is cancelled before its next LLM call, so abandoned requests
+stop spending LLM calls. Its slot is freed only once its thread has
+actually stopped.
+"""
+import math
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+from config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+# Set while a pipeline runs on behalf of a client; checked before each LLM call
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("cancel_event", default=None)
+
+
+class Overloaded(Exception):
+    """The request was not admitted; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its request finished."""
+
+
+class PipelineCancelled(BaseException):
+    """
+    Raised inside the pipeline when its request was cancelled.
+
+    Like `asyncio.CancelledError` it is not an `Exception`, so the
+    pipeline's broad error handlers and LLM fallbacks let it through.
+    """
+
+
+def cancelled() -> bool:
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def check_cancelled():
+    """Stop the current pipeline if its client has disconnected."""
+    if cancelled():
+        raise PipelineCancelled("Request cancelled: the client disconnected")
+
+
+class AdmissionController:
+    """
+    Bounds concurrent pipelines and the queue in front of them.
+
+    Meant to be used from a single event loop (one per API worker process).
+
+    Args:
+        max_in_flight (int): Pipelines allowed to run at once.
+        max_queue (int): Requests allowed to wait for a slot; 0 rejects as soon as all slots are busy.
+        queue_timeout_s (float): Longest a request waits before it is rejected.
+        poll_s (float): Interval between client disconnect checks.
+        history (int): Wait and service times kept for the statistics.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout_s: float,
+                 poll_s: float = 0.25, history: int = 1000):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.poll_s = poll_s
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._wait_ms = deque(maxlen=history)
+        self._service_s = deque(maxlen=history)
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.abandoned = 0
+        self.cancelled = 0
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from the queue depth and recent service times."""
+        service_s = float(np.mean(self._service_s)) if self._service_s else 1.0
+        return max(1, math.ceil(service_s * (len(self._waiters) + 1) / self.max_in_flight))
+
+    async def run(self, func: Callable, *args, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        """
+        Run `func(*args)` on a worker thread once a slot is free.
+
+        Args:
+            func (callable): Blocking pipeline call.
+            is_disconnected (callable, optional): Coroutine function telling
+                whether the client has gone away, e.g. `request.is_disconnected`.
+
+        Raises:
+            Overloaded: The queue is full or the wait exceeded `queue_timeout_s`.
+            ClientDisconnected: The client left while queued or running.
+        """
+        await self._enter(is_disconnected)
+        start = time.perf_counter()
+        try:
+            return await self._run_cancellable(func, args, is_disconnected)
+        finally:
+            self._service_s.append(time.perf_counter() - start)
+            self._leave()
+
+    async def _enter(self, is_disconnected):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            self._wait_ms.append(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Server busy: request queue is full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            while not waiter.done():
+                remaining = self.queue_timeout_s - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self.queue_timeouts += 1
+                    raise Overloaded("Server busy: timed out waiting for a free slot", self.retry_after())
+                await asyncio.wait({waiter}, timeout=min(self.poll_s, remaining))
+                if not waiter.done() and is_disconnected is not None and await is_disconnected():
+                    self.abandoned += 1
+                    raise ClientDisconnected()
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self._leave()  # A slot was handed over just as the wait ended
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        self.admitted += 1
+        self._wait_ms.append((time.perf_counter() - start) * 1000)
+
+    def _leave(self):
+        # Hand the slot straight to the oldest waiter, so the count never dips and lets a newcomer jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _run_cancellable(self, func: Callable, args: tuple, is_disconnected):
+        cancel = threading.Event()
+        token = _cancel_event.set(cancel)
+        try:
+            context = contextvars.copy_context()
+        finally:
+            _cancel_event.reset(token)
+        task = asyncio.get_running_loop().run_in_executor(None, context.run, func, *args)
+
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=self.poll_s)
+            if done:
+                return task.result()
+            if is_disconnected is not None and await is_disconnected():
+                break
+
+        cancel.set()
+        self.cancelled += 1
+        logger.info("Client disconnected; cancelling its pipeline before its next LLM call")
+        # Keep the slot until the thread stops; a call already in flight runs to its budget
+        await asyncio.wait({task})
+        if not task.cancelled() and task.exception() is not None and not isinstance(task.exception(), PipelineCancelled):
+            logger.warning(f"Cancelled pipeline failed: {type(task.exception()).__name__}: {task.exception()}")
+        raise ClientDisconnected()
+
+    def stats(self) -> Dict:
+        waits = np.array(self._wait_ms) if self._wait_ms else None
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "abandoned_in_queue": self.abandoned,
+            "cancelled": self.cancelled,
+            "queue_wait_ms": {
+                "p50": float(np.percentile(waits, 50)), "p95": float(np.percentile(waits, 95))
+            } if waits is not None else {},
+            "retry_after_s": self.retry_after()
+        }
+
+
+admission = AdmissionController(
+    max_in_flight=Config.ADMISSION_MAX_IN_FLIGHT,
+    max_queue=Config.ADMISSION_MAX_QUEUE,
+    queue_timeout_s=Config.ADMISSION_QUEUE_TIMEOUT_S
+)
@@ -1,11 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, JSONResponse
-from main import main
+from main import main, get_pipeline_stats, index_manager
+from conversation import conversations
+from admission import admission, Overloaded, ClientDisconnected
+from utils.logger import capture_request_logs
+from utils.memory import memory_report
 import io
 import logging
 from contextlib import redirect_stdout
 import os
 import uvicorn
+from typing import Optional
 
 app = FastAPI()
 
@@ -101,6 +106,12 @@ def homepage():
 
         <script>
             let conversationCount = 0;
+            // Server-side conversation state, so follow-up questions reuse earlier retrieval
+            let sessionId = newSessionId();
+
+            function newSessionId() {
+                return Date.now().toString(36) + Math.random().toString(36).slice(2);
+            }
 
             // Allow Enter key to submit
             document.getElementById('query').addEventListener('keypress', function(e) {
@@ -148,7 +159,7 @@ def homepage():
                 queryInput.value = '';
 
                 try {
-                    const response = await fetch('/run?query=' + encodeURIComponent(query));
+                    const response = await fetch('/run?query=' + encodeURIComponent(query) + '&session_id=' + sessionId);
                     const result = await response.json();
                     
                     const answerDiv = conversationDiv.querySelector('.answer');
@@ -204,6 +215,8 @@ def homepage():
                 if (confirm('Are you sure you want to clear the conversation history?')) {
                     document.getElementById('conversation-history').innerHTML = '';
                     conversationCount = 0;
+                    fetch('/session/' + sessionId, { method: 'DELETE' });
+                    sessionId = newSessionId();
                 }
             }
         </script>
@@ -211,61 +224,31 @@ def homepage():
     </html>
     """
 
-class StringIOHandler(logging.Handler):
-    """Custom logging handler that writes to a StringIO object"""
-    def __init__(self, string_io):
-        super().__init__()
-        self.string_io = string_io
-        
-    def emit(self, record):
-        msg = self.format(record)
-        self.string_io.write(msg + '\n')
+@app.on_event("startup")
+def build_index():
+    """Build the index in the background so the first query does not pay for it alone"""
+    index_manager.request_reload()
 
-cache = {
-    "embeddings": None,
-    "chunks": None,
-    "document_processed": False
-}
-
-@app.get("/run", response_class=JSONResponse)
-def run_rag(query: str = "What are Parkinson's treatments?"):
+def execute_rag(query: str, filters: dict, session_id: Optional[str]) -> dict:
+    """Run the pipeline for one request, capturing its logs and stdout"""
     log_capture = io.StringIO()
     
     try:
-        # Get the logger from your main module
-        logger = logging.getLogger()  # or use the specific logger name from your config
+        logger = logging.getLogger()
         
-        # Create custom handler to capture logs
-        handler = StringIOHandler(log_capture)
-        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        # Tag this request's records with a correlation id and capture only those
+        with capture_request_logs(log_capture) as request_id:
+            # Capture both stdout and the final answer
+            stdout_capture = io.StringIO()
+            final_answer = None
         
-        # Add handler temporarily
-        logger.addHandler(handler)
-        
-        # Capture both stdout and the final answer
-        stdout_capture = io.StringIO()
-        final_answer = None
-        
-        try:
-            with redirect_stdout(stdout_capture):
-                if cache["document_processed"]:
-                    logger.info("Using cached embeddings - faster processing!")
-                    # Call main with cached embeddings
-                    embedded_docs , final_answer = main(query=query, log_stream=log_capture, cached_embeddings=cache["embeddings"])
-                else:
-                    logger.info("First run - processing documents and creating embeddings")
-                    # First run - process everything
-                    embedded_docs, final_answer = main(query=query, log_stream=log_capture)
-                    # Cache the results
-                    cache["embeddings"] = embedded_docs
-                    cache["document_processed"] = True
-                    logger.info("Embeddings cached for future queries")
+            try:
+                with redirect_stdout(stdout_capture):
+                    # The index is built once per process and reloaded in the background on corpus changes
+                    _, final_answer = main(query=query, log_stream=log_capture, filters=filters, session_id=session_id)
 
-        except Exception as main_error:
-            logger.error(f"Error in main: {str(main_error)}")
-            
-        # Remove the handler
-        logger.removeHandler(handler)
+            except Exception as main_error:
+                logger.error(f"Error in main: {str(main_error)}")
         
         # Get captured content
         logs = log_capture.getvalue()
@@ -281,6 +264,7 @@ def run_rag(query: str = "What are Parkinson's treatments?"):
         
         return {
             "status": "success", 
+            "request_id": request_id,
             "logs": logs,
             "final_answer": final_answer,
             "stdout": stdout_content
@@ -295,6 +279,64 @@ def run_rag(query: str = "What are Parkinson's treatments?"):
     finally:
         log_capture.close()
 
+@app.get("/run", response_class=JSONResponse)
+async def run_rag(
+    request: Request,
+    query: str = "What are Parkinson's treatments?",
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    journal: Optional[str] = None,
+    article_type: Optional[str] = None,
+    session_id: Optional[str] = None
+):
+    """Run the RAG pipeline and return results, if a pipeline slot or queue place is free"""
+    filters = {"year_from": year_from, "year_to": year_to, "journal": journal, "article_type": article_type}
+    try:
+        return await admission.run(execute_rag, query, filters, session_id, is_disconnected=request.is_disconnected)
+    except Overloaded as e:
+        return JSONResponse({"status": "error", "message": f"{e} - please retry in {e.retry_after}s"},
+                            status_code=429, headers={"Retry-After": str(e.retry_after)})
+    except ClientDisconnected:
+        # Nobody is listening; 499 is the conventional "client closed request" status
+        return JSONResponse({"status": "cancelled"}, status_code=499)
+
+@app.delete("/session/{session_id}", response_class=JSONResponse)
+def end_session(session_id: str):
+    """Forget a conversation's questions and candidate pool"""
+    conversations.drop(session_id)
+    return {"status": "success"}
+
+@app.post("/admin/reload", response_class=JSONResponse)
+def admin_reload():
+    """Rebuild the index in the background; the current version keeps serving until the swap"""
+    started = index_manager.request_reload(force=True)
+    return {"status": "started" if started else "already building", **index_manager.stats()}
+
+@app.get("/admin/index", response_class=JSONResponse)
+def admin_index():
+    """Serving and retained index versions"""
+    return index_manager.stats()
+
+@app.post("/admin/rollback", response_class=JSONResponse)
+def admin_rollback(version: Optional[int] = None):
+    """Serve a retained index version again (the most recent one by default)"""
+    try:
+        index_manager.rollback(version)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=404)
+    return {"status": "success", **index_manager.stats()}
+
+@app.get("/admin/memory", response_class=JSONResponse)
+def admin_memory():
+    """Process RSS, footprint per component and allocation peaks per pipeline stage"""
+    return memory_report()
+
+@app.get("/admin/stats", response_class=JSONResponse)
+def admin_stats():
+    """Runtime statistics of the pipeline (cache hit rates, etc.)"""
+    return get_pipeline_stats()
+
+
 # Launch server
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
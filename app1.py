@@ -2,12 +2,17 @@ from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from main import main
+from main import main, get_pipeline_stats, index_manager
+from conversation import conversations
+from admission import admission, Overloaded, ClientDisconnected
+from utils.logger import capture_request_logs
+from utils.memory import memory_report
 import io
 import logging
 from contextlib import redirect_stdout
 import os
 import uvicorn
+from typing import Optional
 
 app = FastAPI()
 
@@ -17,24 +22,6 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Set up templates
 templates = Jinja2Templates(directory="templates")
 
-# Global cache for embeddings
-cache = {
-    "embeddings": None,
-    "chunks": None,
-    "document_processed": False
-}
-
-class StringIOHandler(logging.Handler):
-    """Custom logging handler that writes to a StringIO object"""
-    def __init__(self, string_io):
-        super().__init__()
-        self.string_io = string_io
-        
-    def emit(self, record):
-        msg = self.format(record)
-        self.string_io.write(msg + '\n')
-
-
 @app.get("/", response_class=HTMLResponse)
 def homepage(request: Request):
     """Serve the main homepage using Jinja2 template"""
@@ -46,50 +33,31 @@ def homepage(request: Request):
     })
 
 
-@app.get("/run", response_class=JSONResponse)
-def run_rag(query: str = "What are Parkinson's treatments?"):
-    """Run the RAG pipeline and return results"""
+@app.on_event("startup")
+def build_index():
+    """Build the index in the background so the first query does not pay for it alone"""
+    index_manager.request_reload()
+
+def execute_rag(query: str, filters: dict, session_id: Optional[str]) -> dict:
+    """Run the pipeline for one request, capturing its logs and stdout"""
     log_capture = io.StringIO()
     
     try:
-        # Get the logger from your main module
         logger = logging.getLogger()
         
-        # Create custom handler to capture logs
-        handler = StringIOHandler(log_capture)
-        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        # Tag this request's records with a correlation id and capture only those
+        with capture_request_logs(log_capture) as request_id:
+            # Capture both stdout and the final answer
+            stdout_capture = io.StringIO()
+            final_answer = None
         
-        # Add handler temporarily
-        logger.addHandler(handler)
-        
-        # Capture both stdout and the final answer
-        stdout_capture = io.StringIO()
-        final_answer = None
-        
-        try:
-            with redirect_stdout(stdout_capture):
-                if cache["document_processed"]:
-                    logger.info("Using cached embeddings - faster processing!")
-                    # Call main with cached embeddings
-                    embedded_docs, final_answer = main(
-                        query=query, 
-                        log_stream=log_capture, 
-                        cached_embeddings=cache["embeddings"]
-                    )
-                else:
-                    logger.info("First run - processing documents and creating embeddings")
-                    # First run - process everything
-                    embedded_docs, final_answer = main(query=query, log_stream=log_capture)
-                    # Cache the results
-                    cache["embeddings"] = embedded_docs
-                    cache["document_processed"] = True
-                    logger.info("Embeddings cached for future queries")
-
-        except Exception as main_error:
-            logger.error(f"Error in main: {str(main_error)}")
-            
-        # Remove the handler
-        logger.removeHandler(handler)
+            try:
+                with redirect_stdout(stdout_capture):
+                    # The index is built once per process and reloaded in the background on corpus changes
+                    _, final_answer = main(query=query, log_stream=log_capture, filters=filters, session_id=session_id)
+
+            except Exception as main_error:
+                logger.error(f"Error in main: {str(main_error)}")
         
         # Get captured content
         logs = log_capture.getvalue()
@@ -105,6 +73,7 @@ def run_rag(query: str = "What are Parkinson's treatments?"):
         
         return {
             "status": "success", 
+            "request_id": request_id,
             "logs": logs,
             "final_answer": final_answer,
             "stdout": stdout_content
@@ -119,6 +88,64 @@ def run_rag(query: str = "What are Parkinson's treatments?"):
     finally:
         log_capture.close()
 
+@app.get("/run", response_class=JSONResponse)
+async def run_rag(
+    request: Request,
+    query: str = "What are Parkinson's treatments?",
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    journal: Optional[str] = None,
+    article_type: Optional[str] = None,
+    session_id: Optional[str] = None
+):
+    """Run the RAG pipeline and return results, if a pipeline slot or queue place is free"""
+    filters = {"year_from": year_from, "year_to": year_to, "journal": journal, "article_type": article_type}
+    try:
+        return await admission.run(execute_rag, query, filters, session_id, is_disconnected=request.is_disconnected)
+    except Overloaded as e:
+        return JSONResponse({"status": "error", "message": f"{e} - please retry in {e.retry_after}s"},
+                            status_code=429, headers={"Retry-After": str(e.retry_after)})
+    except ClientDisconnected:
+        # Nobody is listening; 499 is the conventional "client closed request" status
+        return JSONResponse({"status": "cancelled"}, status_code=499)
+
+
+@app.delete("/session/{session_id}", response_class=JSONResponse)
+def end_session(session_id: str):
+    """Forget a conversation's questions and candidate pool"""
+    conversations.drop(session_id)
+    return {"status": "success"}
+
+@app.post("/admin/reload", response_class=JSONResponse)
+def admin_reload():
+    """Rebuild the index in the background; the current version keeps serving until the swap"""
+    started = index_manager.request_reload(force=True)
+    return {"status": "started" if started else "already building", **index_manager.stats()}
+
+@app.get("/admin/index", response_class=JSONResponse)
+def admin_index():
+    """Serving and retained index versions"""
+    return index_manager.stats()
+
+@app.post("/admin/rollback", response_class=JSONResponse)
+def admin_rollback(version: Optional[int] = None):
+    """Serve a retained index version again (the most recent one by default)"""
+    try:
+        index_manager.rollback(version)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=404)
+    return {"status": "success", **index_manager.stats()}
+
+@app.get("/admin/memory", response_class=JSONResponse)
+def admin_memory():
+    """Process RSS, footprint per component and allocation peaks per pipeline stage"""
+    return memory_report()
+
+@app.get("/admin/stats", response_class=JSONResponse)
+def admin_stats():
+    """Runtime statistics of the pipeline (cache hit rates, etc.)"""
+    return get_pipeline_stats()
+
 
 # Launch server
 if __name__ == "__main__":
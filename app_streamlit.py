@@ -1,29 +1,29 @@
 # app_streamlit.py
 import io
+import uuid
 import streamlit as st
-from main import main
+from main import main, index_manager
 import logging
-
-# Add log handler
-def get_log_stream():
-    log_stream = io.StringIO()
-    handler = logging.StreamHandler(log_stream)
-    handler.setLevel(logging.INFO)
-    logger = logging.getLogger()
-    logger.addHandler(handler)
-    return log_stream, handler
-
-# Global cache for embeddings
-if "embeddings" not in st.session_state:
-    st.session_state.embeddings = None
-    st.session_state.document_processed = False
+from utils.logger import capture_request_logs
 
 logger = logging.getLogger()
 
+# One index and model for the whole server process, shared by every browser session.
+# Corpus changes are picked up by a background rebuild while the current index keeps serving.
+with st.sidebar:
+    if st.button("Reload corpus"):
+        if index_manager.request_reload(force=True):
+            st.info("Rebuilding the index in the background; answers use the current one until it is ready.")
+        else:
+            st.info("A rebuild is already running.")
+
 st.title("Basic chat - based on papers archive")
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    # Server-side conversation state, so follow-up questions reuse earlier retrieval
+    st.session_state.session_id = uuid.uuid4().hex
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -35,24 +35,16 @@ if query := st.chat_input("Ask your question here"):
         st.write(query)
 
     try:
-        log_stream, handler = get_log_stream()
+        log_stream = io.StringIO()
 
-        if st.session_state.document_processed:
-            logger.info("Using cached embeddings - faster processing!")
-            embedded_docs, final_answer = main(
+        # Capture only this session's records, not those of other concurrent users
+        with capture_request_logs(log_stream):
+            _, final_answer = main(
                 query=query,
                 log_stream=log_stream,
-                cached_embeddings=st.session_state.embeddings
+                session_id=st.session_state.session_id
             )
-        else:
-            logger.info("First run - processing documents and creating embeddings")
-            embedded_docs, final_answer = main(query=query, log_stream=log_stream)
-            st.session_state.embeddings = embedded_docs
-            st.session_state.document_processed = True
-            logger.info("Embeddings cached for future queries")
         
-        # Remove the handler so logs don't duplicate
-        logging.getLogger().removeHandler(handler)
         # Show also logs 
         # Display logs in an expandable section
         with st.expander("Show logs"):
@@ -0,0 +1,123 @@
+"""
+Lazy registry of the pluggable backends: LLM, embedder and vector store.
+
+Each backend is a factory that imports its library on first use, so a
+process only pays the import and construction cost of the stack it is
+configured for. Instances are created once per process and shared.
+"""
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import Config
+from utils.logger import setup_logger
+from utils.memory import register_component, module_bytes
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+BACKEND_KINDS = ("llm", "embedder", "vector_store")
+
+_factories: Dict[str, Dict[str, Callable[..., Any]]] = {kind: {} for kind in BACKEND_KINDS}
+_instances: Dict[Tuple[str, str], Any] = {}
+_lock = threading.RLock()
+
+
+def register(kind: str, name: str):
+    """Decorator registering `factory` as backend `name` of the given kind."""
+    if kind not in BACKEND_KINDS:
+        raise ValueError(f"Unknown backend kind '{kind}', expected one of {BACKEND_KINDS}")
+
+    def decorator(factory: Callable[..., Any]) -> Callable[..., Any]:
+        _factories[kind][name] = factory
+        return factory
+    return decorator
+
+
+def configured_backend(kind: str) -> str:
+    """Backend name selected by the configuration for `kind`."""
+    return {
+        "llm": Config.LLM_BACKEND,
+        "embedder": Config.EMBED_BACKEND,
+        "vector_store": "chroma" if Config.BOOL_CHROMADB else "memory"
+    }[kind]
+
+
+def get_backend(kind: str, name: Optional[str] = None) -> Any:
+    """
+    Return the shared instance of a backend, creating it on first use.
+
+    Args:
+        kind (str): 'llm', 'embedder' or 'vector_store'.
+        name (str, optional): Backend name; defaults to the configured one.
+            'name:model' (e.g. 'groq:llama-3.1-8b-instant' or 'ollama:llama3:8b')
+            selects a model other than the backend's configured default.
+
+    Returns:
+        The backend instance.
+    """
+    name = name or configured_backend(kind)
+    key = (kind, name)
+    if key not in _instances:
+        with _lock:
+            if key not in _instances:
+                backend, _, model = name.partition(":")
+                try:
+                    factory = _factories[kind][backend]
+                except KeyError:
+                    raise ValueError(f"Unknown {kind} backend '{backend}', expected one of {sorted(_factories[kind])}")
+                logger.info(f"Loading {kind} backend '{name}'")
+                _instances[key] = factory(model) if model else factory()
+    return _instances[key]
+
+
+@register("llm", "groq")
+def _groq_llm(model: Optional[str] = None):
+    from langchain_groq import ChatGroq
+
+    # ChatGroq falls back to the GROQ_API_KEY environment variable
+    return ChatGroq(model=model or Config.GROQ_MODEL, api_key=Config.GROQ_API_KEY or None)
+
+
+@register("llm", "ollama")
+def _ollama_llm(model: Optional[str] = None):
+    from langchain_ollama import OllamaLLM
+
+    return OllamaLLM(model=model or Config.MODEL_NAME, base_url=Config.OLLAMA_HOST)
+
+
+@register("embedder", "sentence_transformers")
+def _sentence_transformer():
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(Config.TRANSFORMER_MODEL)
+
+
+@register("embedder", "service")
+def _embedding_service():
+    from embedding_service import RemoteEncoder
+
+    return RemoteEncoder(Config.EMBED_SERVICE_ADDRESS)
+
+
+@register("vector_store", "chroma")
+def _chroma_client():
+    import chromadb
+
+    return chromadb.PersistentClient(path=Config.CHROMA_DIR)
+
+
+@register("vector_store", "memory")
+def _memory_store():
+    # In-process indexes are built from the embeddings themselves; nothing to connect to
+    return None
+
+
+def _embedding_model_footprint() -> Dict:
+    """Weights of the embedding models the registry has loaded in this process."""
+    # No lock: a model being loaded holds it, and the report should not wait for the load
+    embedders = [instance for (kind, _), instance in list(_instances.items()) if kind == "embedder"]
+    # A service client holds no weights; only in-process torch modules count
+    models = [model for model in embedders if hasattr(model, "parameters")]
+    return {"bytes": sum(module_bytes(model) for model in models), "instances": len(models)}
+
+
+register_component("embedding_model", _embedding_model_footprint)
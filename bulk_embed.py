@@ -0,0 +1,139 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+# Model instance owned by each worker process of the pool
+_worker_model = None
+
+
+def _init_worker(model_name: str, num_threads: int) -> None:
+    """Load the embedding model once per worker with a fixed thread count."""
+    global _worker_model
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(num_threads)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_bucket(ids: List[int], texts: List[str], batch_size: int) -> Tuple[List[int], np.ndarray]:
+    """Encode one length bucket inside a worker process."""
+    embeddings = _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return ids, embeddings
+
+
+def make_length_buckets(texts: List[str], bucket_size: int) -> List[List[int]]:
+    """
+    Group text indices into buckets of similar length so batches need little padding.
+
+    Args:
+        texts (List[str]): Texts to embed.
+        bucket_size (int): Maximum number of texts per bucket.
+
+    Returns:
+        List[List[int]]: Buckets of indices into `texts`, shortest texts first.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[start:start + bucket_size] for start in range(0, len(order), bucket_size)]
+
+
+def iter_bulk_embeddings(
+    texts: List[str],
+    model=None,
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    bucket_size: Optional[int] = None
+) -> Iterator[Tuple[List[int], np.ndarray]]:
+    """
+    Embed texts in length buckets, yielding each bucket as soon as it is done.
+
+    With a single worker the buckets are encoded in-process with `model`;
+    otherwise they are sharded across a process pool where every worker
+    loads its own copy of `Config.TRANSFORMER_MODEL`.
+
+    Args:
+        texts (List[str]): Texts to embed.
+        model (SentenceTransformer, optional): Model for in-process encoding.
+        workers (int, optional): Number of worker processes.
+        threads_per_worker (int, optional): Torch threads per worker.
+        batch_size (int, optional): Encoder batch size inside a bucket.
+        bucket_size (int, optional): Number of texts per bucket.
+
+    Yields:
+        tuple: (indices into `texts`, embeddings array for those indices)
+    """
+    workers = workers or Config.EMBED_WORKERS
+    batch_size = batch_size or Config.EMBED_BATCH_SIZE
+    bucket_size = bucket_size or Config.EMBED_BUCKET_SIZE
+    threads_per_worker = threads_per_worker or Config.EMBED_THREADS_PER_WORKER \
+        or max(1, (os.cpu_count() or 1) // workers)
+
+    buckets = make_length_buckets(texts, bucket_size)
+    total = len(texts)
+    done = 0
+    start_time = time.time()
+    logger.info(f"Embedding {total} chunks in {len(buckets)} buckets "
+                f"({workers} workers x {threads_per_worker} threads)")
+
+    def report(count: int) -> None:
+        elapsed = max(time.time() - start_time, 1e-9)
+        logger.info(f"Embedded {count}/{total} chunks ({count / elapsed:.1f} chunks/s)")
+
+    if workers <= 1:
+        if model is None:
+            raise ValueError("An in-process model is required when EMBED_WORKERS <= 1")
+        for ids in buckets:
+            embeddings = model.encode([texts[i] for i in ids], batch_size=batch_size, convert_to_numpy=True)
+            done += len(ids)
+            report(done)
+            yield ids, embeddings
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(Config.TRANSFORMER_MODEL, threads_per_worker)
+    ) as pool:
+        futures = [pool.submit(_encode_bucket, ids, [texts[i] for i in ids], batch_size) for ids in buckets]
+        for future in as_completed(futures):
+            ids, embeddings = future.result()
+            done += len(ids)
+            report(done)
+            yield ids, embeddings
+
+
+def bulk_embed(texts: List[str], model=None, **kwargs) -> np.ndarray:
+    """
+    Embed all texts and return the embeddings in the original order.
+
+    Args:
+        texts (List[str]): Texts to embed.
+        model (SentenceTransformer, optional): Model for in-process encoding.
+        **kwargs: Forwarded to `iter_bulk_embeddings`.
+
+    Returns:
+        np.ndarray: Matrix of shape (len(texts), dim).
+    """
+    matrix = None
+    for ids, embeddings in iter_bulk_embeddings(texts, model=model, **kwargs):
+        if matrix is None:
+            matrix = np.zeros((len(texts), embeddings.shape[1]), dtype=np.float32)
+        matrix[ids] = embeddings
+    if matrix is None:
+        return np.zeros((0, 0), dtype=np.float32)
+    return matrix
@@ -1,36 +1,97 @@
 import os
-import logging
 from dotenv import load_dotenv
+from utils.logger import setup_logger
 
 load_dotenv()
 
 class Config:
     FILE_PATH = os.getenv("FILE_PATH", "abstracts_park.txt")
+    CORPUS_DB = os.getenv("CORPUS_DB", "")  # SQLite corpus store; takes precedence over FILE_PATH when set
+    CORPUS_MMAP_BYTES = int(os.getenv("CORPUS_MMAP_BYTES", 256 * 1024 * 1024))
     MODEL_NAME = os.getenv("MODEL_NAME", "llama3")
     MODEL_NAME_GCP = os.getenv("MODEL_NAME_GCP", "gpt-3.5-turbo")
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "groq").lower()  # groq or ollama
+    GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+    # Per-stage routes: comma-separated 'backend:model' candidates, primary first, then fallbacks
+    _DEFAULT_LLM = f"groq:{GROQ_MODEL}" if LLM_BACKEND == "groq" else f"{LLM_BACKEND}:{MODEL_NAME}"
+    _FAST_LLM = "groq:llama-3.1-8b-instant" if LLM_BACKEND == "groq" else _DEFAULT_LLM
+    LLM_ENRICH_MODELS = os.getenv("LLM_ENRICH_MODELS", _FAST_LLM)
+    LLM_SCORE_MODELS = os.getenv("LLM_SCORE_MODELS", _FAST_LLM)
+    LLM_ANSWER_MODELS = os.getenv("LLM_ANSWER_MODELS", ",".join(dict.fromkeys([_DEFAULT_LLM, _FAST_LLM])))
+    LLM_ENRICH_BUDGET_S = float(os.getenv("LLM_ENRICH_BUDGET_S", 3))
+    LLM_SCORE_BUDGET_S = float(os.getenv("LLM_SCORE_BUDGET_S", 5))
+    LLM_ANSWER_BUDGET_S = float(os.getenv("LLM_ANSWER_BUDGET_S", 20))
+    LLM_COOLDOWN_S = float(os.getenv("LLM_COOLDOWN_S", 30))  # skip a model this long after it failed or timed out
     RETRIEVE_TOP_K = int(os.getenv("RETRIEVE_TOP_K", 5))
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+    QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", 16))  # 1 encodes every query on its own
+    QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", 5))
     MIN_RELEVANCE_SCORE = int(os.getenv("MIN_RELEVANCE_SCORE", 5))
+    LLM_RERANK = os.getenv("LLM_RERANK", "False").lower() in ['true', '1', 'yes']  # score chunks with the LLM before answering
+    SCORE_WORKERS = int(os.getenv("SCORE_WORKERS", 4))  # parallel per-document scoring calls
+    SCORE_TIMEOUT_S = float(os.getenv("SCORE_TIMEOUT_S", 10))
+    SCORE_DEADLINE_S = float(os.getenv("SCORE_DEADLINE_S", 15))  # all of one request's scoring calls
+    SCORE_CACHE_SIZE = int(os.getenv("SCORE_CACHE_SIZE", 10000))  # (query, chunk) scores kept
+    GATE_ENABLED = os.getenv("GATE_ENABLED", "True").lower() in ['true', '1', 'yes']
+    GATE_MIN_SIMILARITY = float(os.getenv("GATE_MIN_SIMILARITY")) if os.getenv("GATE_MIN_SIMILARITY") else None  # unset = log-only, fit with scripts/calibrate_gate.py
+    GATE_MIN_Z = float(os.getenv("GATE_MIN_Z", 1.0))
+    GATE_MAX_DROP_Z = float(os.getenv("GATE_MAX_DROP_Z", 1.5))
+    GATE_MAX_K = int(os.getenv("GATE_MAX_K", RETRIEVE_TOP_K))
+    GATE_CALIBRATION_SAMPLES = int(os.getenv("GATE_CALIBRATION_SAMPLES", 512))
+    SESSION_TTL_S = float(os.getenv("SESSION_TTL_S", 1800))  # idle conversations are forgotten after this
+    SESSION_MAX = int(os.getenv("SESSION_MAX", 1000))
+    SESSION_HISTORY = int(os.getenv("SESSION_HISTORY", 2))  # previous questions prefixed to a follow-up
+    SESSION_POOL_K = int(os.getenv("SESSION_POOL_K", 30))  # candidates kept per full search
+    SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", 200))
+    SESSION_POOL_MIN_SIMILARITY = float(os.getenv("SESSION_POOL_MIN_SIMILARITY")) if os.getenv("SESSION_POOL_MIN_SIMILARITY") else None  # unset = relative to the last full search
+    ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 4))  # concurrent pipelines per API worker
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 16))  # waiting requests beyond this get a 429
+    ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", 30))
+    # Every pipeline may hold a score call per scoring worker plus its enrich and answer calls
+    LLM_ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", ADMISSION_MAX_IN_FLIGHT * (SCORE_WORKERS + 2)))
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 600))
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 300))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000))
+    MEMORY_TRACE_STAGES = os.getenv("MEMORY_TRACE_STAGES", "False").lower() in ['true', '1', 'yes']  # tracemalloc peaks per stage; slows allocations
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_STRUCTURED = os.getenv("LOG_STRUCTURED", "False").lower() in ['true', '1', 'yes']  # JSON lines with request ids
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
     EMAIL_FOR_PUBMED = os.getenv("EMAIL_FOR_PUBMED", "")
+    NCBI_API_KEY = os.getenv("NCBI_API_KEY", "")
+    HARVEST_BATCH_SIZE = int(os.getenv("HARVEST_BATCH_SIZE", 200))
+    HARVEST_WORKERS = int(os.getenv("HARVEST_WORKERS", 3))
     TRANSFORMER_MODEL = os.getenv("TRANSFORMER_MODEL", "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract-fulltext")
-    LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
     LOG_FILE = "app.log"
     OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
     BOOL_CHROMADB = os.getenv("BOOL_CHROMADB", "True").lower() in ['true', '1', 'yes']
+    CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_data")
+    INDEX_STORAGE = os.getenv("INDEX_STORAGE", "float32").lower()  # float32, int8 or binary
+    INDEX_DIR = os.getenv("INDEX_DIR", "./index_data")
+    INDEX_WATCH_INTERVAL_S = float(os.getenv("INDEX_WATCH_INTERVAL_S", 30))  # corpus change checks; 0 disables
+    INDEX_RETAIN_VERSIONS = int(os.getenv("INDEX_RETAIN_VERSIONS", 1))  # replaced index versions kept for rollback
+    RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", 10))
+    INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", 1))  # >1 serves float32 retrieval from worker processes
+    PROGRESSIVE_INDEX = os.getenv("PROGRESSIVE_INDEX", "True").lower() in ['true', '1', 'yes']  # serve BM25 while embeddings are computed
+    SHARED_INDEX = os.getenv("SHARED_INDEX", "False").lower() in ['true', '1', 'yes']  # memory-map one float32 matrix across API workers
+    EMBED_SERVICE_ADDRESS = os.getenv("EMBED_SERVICE_ADDRESS", "")  # host:port or socket path; set to encode queries in one shared process
+    EMBED_SERVICE_AUTHKEY = os.getenv("EMBED_SERVICE_AUTHKEY", "")  # empty: random key kept in an owner-only file
+    EMBED_BACKEND = os.getenv("EMBED_BACKEND", "service" if EMBED_SERVICE_ADDRESS else "sentence_transformers").lower()
+    EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 1))
+    EMBED_THREADS_PER_WORKER = int(os.getenv("EMBED_THREADS_PER_WORKER", 0))  # 0 = cpu_count // workers
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+    EMBED_BUCKET_SIZE = int(os.getenv("EMBED_BUCKET_SIZE", 512))
 
     @staticmethod
     def setup_logging():
-        logging.basicConfig(
-            filename=Config.LOG_FILE,
-            level=Config.LOG_LEVEL,
-            format=Config.LOG_FORMAT,
-            filemode="a"
+        setup_logger(
+            log_file=Config.LOG_FILE,
+            log_level=Config.LOG_LEVEL,
+            structured=Config.LOG_STRUCTURED,
+            fmt=Config.LOG_FORMAT,
+            queue_size=Config.LOG_QUEUE_SIZE
         )
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(logging.Formatter(Config.LOG_FORMAT))
-        logging.getLogger().addHandler(console_handler)
 
 Config.setup_logging()
 
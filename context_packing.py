@@ -0,0 +1,147 @@
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+# Rough characters-per-token ratio for English biomedical text
+CHARS_PER_TOKEN = 4
+
+Span = Tuple[object, int, int]  # (source abstract, start offset, end offset)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of LLM tokens in a text."""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_to_tokens(text: str, token_budget: int) -> str:
+    """
+    Cut a text to fit `token_budget`, ending at the last complete sentence.
+
+    Falls back to the last whole word when no sentence ends in time, and
+    returns an empty string when not even that fits.
+    """
+    if estimate_tokens(text) <= token_budget:
+        return text
+    head = text[:token_budget * CHARS_PER_TOKEN]
+    sentence_ends = [match.end() for match in re.finditer(r"[.!?](?=\s|$)", head)]
+    if sentence_ends:
+        return head[:sentence_ends[-1]]
+    return head[:head.rfind(" ")].rstrip() if " " in head else ""
+
+
+def locate_chunks(document_text: str, chunks: List[str]) -> Dict[str, Span]:
+    """
+    Find where each chunk sits in the document it was split from.
+
+    Every line of the document is one abstract, so the source of a chunk
+    is the index of the line it starts on.
+
+    Args:
+        document_text (str): The cleaned document the chunks came from.
+        chunks (List[str]): Chunks in split order.
+
+    Returns:
+        Dict[str, Span]: Chunk text -> (line index, start offset, end offset).
+    """
+    line_starts = [0] + [match.end() for match in re.finditer("\n", document_text)]
+    spans = {}
+    cursor = 0
+    for chunk in chunks:
+        start = document_text.find(chunk, cursor)
+        if start < 0:
+            start = document_text.find(chunk)
+        if start < 0:
+            continue
+        cursor = start + 1
+        source = bisect_right(line_starts, start) - 1
+        spans.setdefault(chunk, (source, start, start + len(chunk)))
+    return spans
+
+
+def _merge_group(items: List[Tuple[int, str, int, int]], max_gap: int) -> List[Tuple[int, str]]:
+    """Merge overlapping or adjacent (rank, text, start, end) items of one source."""
+    merged = []
+    rank, text, start, end = None, None, None, None
+    for item_rank, item_text, item_start, item_end in sorted(items, key=lambda item: item[2]):
+        if text is not None and item_start <= end + max_gap:
+            if item_end > end:
+                if item_start < end:
+                    text += item_text[end - item_start:]
+                else:
+                    text += " " + item_text
+                end = item_end
+            rank = min(rank, item_rank)
+            continue
+        if text is not None:
+            merged.append((rank, text))
+        rank, text, start, end = item_rank, item_text, item_start, item_end
+    if text is not None:
+        merged.append((rank, text))
+    return merged
+
+
+def pack_context(
+    docs: List[str],
+    spans: Optional[Dict[str, Span]] = None,
+    token_budget: Optional[int] = None,
+    max_gap: int = 1
+) -> List[str]:
+    """
+    Merge overlapping chunks into contiguous spans and pack them into a token budget.
+
+    Args:
+        docs (List[str]): Retrieved chunks, most relevant first.
+        spans (Dict[str, Span], optional): Chunk locations from `locate_chunks`.
+        token_budget (int, optional): Maximum context size in estimated tokens.
+        max_gap (int): Largest gap in characters for chunks to count as adjacent.
+
+    Returns:
+        List[str]: Deduplicated passages ordered by relevance. The first
+        passage that does not fit is cut to the remaining budget, so a top
+        hit larger than the budget still reaches the prompt.
+    """
+    token_budget = token_budget or Config.CONTEXT_TOKEN_BUDGET
+    spans = spans or {}
+
+    groups: Dict[object, List[Tuple[int, str, int, int]]] = {}
+    passages = []
+    seen = set()
+    for rank, doc in enumerate(docs):
+        if doc in seen:
+            continue
+        seen.add(doc)
+        if doc in spans:
+            source, start, end = spans[doc]
+            groups.setdefault(source, []).append((rank, doc, start, end))
+        else:
+            passages.append((rank, doc))
+
+    for items in groups.values():
+        passages.extend(_merge_group(items, max_gap))
+    passages.sort(key=lambda passage: passage[0])
+
+    packed = []
+    used = 0
+    truncated = False
+    for _, text in passages:
+        tokens = estimate_tokens(text)
+        if used + tokens > token_budget:
+            if truncated:
+                continue
+            truncated = True
+            text = truncate_to_tokens(text, token_budget - used)
+            if not text:
+                continue
+            tokens = estimate_tokens(text)
+        packed.append(text)
+        used += tokens
+
+    original = sum(estimate_tokens(doc) for doc in docs)
+    logger.info(f"Context packing: {len(docs)} chunks -> {len(packed)} passages, "
+                f"{original} -> {used} tokens ({original - used} saved, budget {token_budget})")
+    return packed
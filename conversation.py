@@ -0,0 +1,195 @@
+"""
+Session-scoped conversation state for follow-up questions.
+
+Each session remembers its last few questions and a pool of candidate
+chunks, with their normalized vectors, retrieved for earlier turns. A
+follow-up is first answered by re-ranking that pool, which costs one
+query embedding and a small matrix product. The full index is searched,
+and the query enriched by the LLM, only when the pool's best match falls
+short of what the full search found for the question that built it.
+"""
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from vector_index import top_k
+from utils.logger import setup_logger
+from utils.memory import register_component, text_bytes
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+
+class Session:
+    """Questions and candidate pool of one conversation."""
+
+    def __init__(self, session_id: str, pool_size: int, history: int):
+        self.session_id = session_id
+        self.pool_size = pool_size
+        self.questions = deque(maxlen=history)
+        self.filters: Optional[Dict] = None
+        # Corpus the pooled chunks were retrieved from; a reloaded corpus invalidates them
+        self.content_signature: Optional[str] = None
+        # Best raw-query score of the last full search, the bar the pool has to meet
+        self.reference_top: Optional[float] = None
+        self.last_used = time.monotonic()
+        self._pool: OrderedDict = OrderedDict()  # chunk text -> normalized vector
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def footprint(self) -> int:
+        with self._lock:
+            return text_bytes(self._pool) + sum(vector.nbytes for vector in self._pool.values()) + text_bytes(self.questions)
+
+    def contextual_query(self, query: str) -> str:
+        """The query prefixed with the previous questions, so short follow-ups keep their topic."""
+        return " ".join([*self.questions, query])
+
+    def matches(self, filters: Optional[Dict], content_signature: str) -> bool:
+        """Whether the pool was retrieved with these filters from this corpus, and is worth re-ranking."""
+        with self._lock:
+            if self._pool and self.content_signature != content_signature:
+                # Retrieved from a corpus that has since been reloaded; its chunks may no longer exist
+                self._pool.clear()
+                self.reference_top = None
+            return bool(self._pool) and self.filters == filters
+
+    def rerank(self, query_vector: np.ndarray, k: int) -> Tuple[List[str], np.ndarray]:
+        """The k pooled chunks closest to a normalized query vector, best first."""
+        with self._lock:
+            if not self._pool:
+                return [], np.empty(0, dtype=np.float32)
+            docs = list(self._pool)
+            scores = np.stack(list(self._pool.values())) @ query_vector
+        best = top_k(scores, k)
+        return [docs[i] for i in best], scores[best]
+
+    def covers(self, top_score: float, threshold: float, margin: float) -> bool:
+        """
+        Whether a follow-up whose best pooled chunk scores `top_score` can skip the full search.
+
+        The score must clear the relevance threshold and come within `margin`
+        of the best score the last full search reached for its own question.
+        """
+        if self.reference_top is None or top_score < threshold:
+            return False
+        if Config.SESSION_POOL_MIN_SIMILARITY is not None:
+            return top_score >= Config.SESSION_POOL_MIN_SIMILARITY
+        return top_score >= self.reference_top - (margin if np.isfinite(margin) else 0.0)
+
+    def remember(self, question: str, filters: Optional[Dict] = None, docs: Sequence[str] = (),
+                 vectors: Optional[np.ndarray] = None, query_vector: Optional[np.ndarray] = None,
+                 content_signature: Optional[str] = None):
+        """
+        Record an answered question, and the candidates of a full search if one ran.
+
+        Args:
+            question (str): The question as asked.
+            filters (dict, optional): Metadata filters the candidates were retrieved with.
+            docs (sequence): Chunks retrieved by the full search.
+            vectors (np.ndarray, optional): Their normalized vectors.
+            query_vector (np.ndarray, optional): Normalized embedding of the
+                contextual question, used to set the bar for later follow-ups.
+            content_signature (str, optional): Content signature of the index
+                version the candidates come from.
+        """
+        with self._lock:
+            self.questions.append(question)
+            self.last_used = time.monotonic()
+            if vectors is None or not len(docs):
+                return
+            if filters != self.filters or content_signature != self.content_signature:
+                self._pool.clear()
+                self.filters = filters
+                self.content_signature = content_signature
+            for doc, vector in zip(docs, vectors):
+                self._pool[doc] = vector
+                self._pool.move_to_end(doc)
+            while len(self._pool) > self.pool_size:
+                self._pool.popitem(last=False)
+            if query_vector is not None:
+                self.reference_top = float(np.max(vectors @ query_vector))
+
+
+class ConversationStore:
+    """
+    Bounded, thread-safe map of session id to `Session`.
+
+    Sessions idle for longer than `ttl_s` expire, and the least recently
+    used one is dropped when `max_sessions` is reached.
+    """
+
+    def __init__(self, ttl_s: float, max_sessions: int, pool_size: int, history: int):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.pool_size = pool_size
+        self.history = history
+        self._sessions: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._latencies = {"pool": deque(maxlen=1000), "full": deque(maxlen=1000)}
+        self.follow_ups = 0
+        self.pool_answers = 0
+
+    def get(self, session_id: str) -> Session:
+        """Return the session, creating it if it is new or expired."""
+        now = time.monotonic()
+        with self._lock:
+            # Sessions are kept in last-used order, so the expired ones are at the front
+            while self._sessions and now - next(iter(self._sessions.values())).last_used > self.ttl_s:
+                self._sessions.popitem(last=False)
+            session = self._sessions.get(session_id)
+            if session is None:
+                # Make room only for a new session, never at the expense of the one asked for
+                while len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                session = self._sessions[session_id] = Session(session_id, self.pool_size, self.history)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def record_turn(self, session: Session, path: str, seconds: float):
+        """Count a session turn answered from the 'pool' or by a 'full' search."""
+        with self._lock:
+            self._latencies[path].append(seconds * 1000)
+            if len(session.questions) > 1:
+                self.follow_ups += 1
+                self.pool_answers += path == "pool"
+
+    def footprint(self) -> dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {"bytes": sum(session.footprint() for session in sessions), "sessions": len(sessions),
+                "pooled_chunks": sum(len(session) for session in sessions)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "follow_ups": self.follow_ups,
+                "pool_answers": self.pool_answers,
+                "pool_answer_rate": self.pool_answers / self.follow_ups if self.follow_ups else 0.0,
+                "mean_latency_ms": {
+                    path: float(np.mean(latencies)) if latencies else None
+                    for path, latencies in self._latencies.items()
+                }
+            }
+
+
+conversations = ConversationStore(
+    ttl_s=Config.SESSION_TTL_S,
+    max_sessions=Config.SESSION_MAX,
+    pool_size=Config.SESSION_POOL_SIZE,
+    history=Config.SESSION_HISTORY
+)
+
+register_component("session_pools", conversations.footprint)
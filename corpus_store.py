@@ -0,0 +1,329 @@
+import re
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config import Config
+from text_split import split_into_chunks
+from context_packing import locate_chunks
+from utils.doc_parser import filter_conflict_lines, filter_author_like_lines
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    pmid TEXT PRIMARY KEY,
+    title TEXT,
+    journal TEXT,
+    publication_date TEXT,
+    year INTEGER,
+    authors TEXT,
+    publication_types TEXT,
+    url TEXT,
+    text TEXT,
+    added_at REAL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    pmid TEXT NOT NULL REFERENCES articles(pmid),
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    embedding BLOB
+);
+CREATE INDEX IF NOT EXISTS chunks_pmid ON chunks(pmid);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    query TEXT PRIMARY KEY,
+    last_date TEXT,
+    last_run REAL,
+    articles INTEGER
+);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    size INTEGER,
+    articles INTEGER,
+    chunks_added INTEGER,
+    ingested_at REAL
+);
+CREATE INDEX IF NOT EXISTS sources_hash ON sources(content_hash);
+CREATE TABLE IF NOT EXISTS article_sources (
+    pmid TEXT NOT NULL REFERENCES articles(pmid),
+    source TEXT NOT NULL REFERENCES sources(path),
+    PRIMARY KEY (pmid, source)
+);
+CREATE INDEX IF NOT EXISTS article_sources_source ON article_sources(source);
+"""
+
+# Keep IN (...) lists below SQLite's bound-parameter limit
+MAX_SQL_PARAMS = 900
+
+
+def clean_abstract(text: str) -> str:
+    """Apply the same cleaning rules the pipeline uses for flat abstract files."""
+    text = filter_conflict_lines(text)
+    text = filter_author_like_lines(text)
+    return text.strip()
+
+
+def parse_year(publication_date: Optional[str]) -> Optional[int]:
+    """Extract the four-digit year from a PubMed publication date string."""
+    match = re.search(r"\b(1[89]\d\d|20\d\d)\b", publication_date or "")
+    return int(match.group(1)) if match else None
+
+
+def prepare_article(article: Dict, chunk_size: int, chunk_overlap: int) -> Dict:
+    """
+    Clean and chunk one article into its store rows.
+
+    Pure and picklable, so ingestion can prepare articles in worker processes
+    and leave only the inserts to the process holding the store.
+
+    Returns:
+        Dict: 'row' (the articles table values without `added_at`) and
+        'chunks' as (start, end, text) tuples.
+    """
+    pmid = str(article['pmid'])
+    text = clean_abstract(article.get('abstract') or '')
+    row = (
+        pmid,
+        article.get('title'),
+        article.get('journal'),
+        article.get('publication_date'),
+        parse_year(article.get('publication_date')),
+        json.dumps(article.get('authors', [])),
+        json.dumps(article.get('publication_types', [])),
+        article.get('url'),
+        text
+    )
+    chunks = []
+    if text:
+        pieces = split_into_chunks(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        spans = locate_chunks(text, pieces)
+        chunks = [(spans[piece][1], spans[piece][2], piece) for piece in pieces if piece in spans]
+    return {'row': row, 'chunks': chunks}
+
+
+class CorpusStore:
+    """
+    SQLite-backed corpus of PubMed articles, their cleaned text and chunks.
+
+    Chunks are stored with their boundaries inside the cleaned article text
+    and, optionally, their embeddings, so the RAG pipeline can load them
+    column by column without re-reading, re-cleaning or re-splitting.
+    """
+
+    def __init__(self, path: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None):
+        self.path = path
+        self.chunk_size = chunk_size or Config.CHUNK_SIZE
+        self.chunk_overlap = chunk_overlap or Config.CHUNK_OVERLAP
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(f"PRAGMA mmap_size={Config.CORPUS_MMAP_BYTES}")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_articles(self, articles: Iterable[Dict]) -> List[str]:
+        """
+        Insert new articles with their cleaned text and chunks.
+
+        Articles whose PMID is already stored are skipped.
+
+        Args:
+            articles (Iterable[Dict]): Article dictionaries from the PubMed retrievers.
+
+        Returns:
+            List[str]: PMIDs that were added.
+        """
+        return self.add_prepared(prepare_article(article, self.chunk_size, self.chunk_overlap) for article in articles)
+
+    def add_prepared(self, prepared: Iterable[Dict], source: Optional[Dict] = None) -> List[str]:
+        """
+        Insert articles prepared by `prepare_article`, optionally recording the file they came from.
+
+        Articles whose PMID is already stored are skipped, but are still
+        linked to `source`, so every file an article appears in is recorded.
+
+        Args:
+            prepared (Iterable[Dict]): Output of `prepare_article`.
+            source (Dict, optional): 'path', 'content_hash' and 'size' of the
+                corpus file. Its previous provenance links are replaced.
+
+        Returns:
+            List[str]: PMIDs that were added.
+        """
+        added, linked, chunk_count = [], [], 0
+        with self._lock, self.conn:
+            for article in prepared:
+                pmid = article['row'][0]
+                linked.append(pmid)
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*article['row'], time.time())
+                )
+                if cursor.rowcount == 0:
+                    continue
+                added.append(pmid)
+                chunk_count += len(article['chunks'])
+                self.conn.executemany(
+                    "INSERT INTO chunks (pmid, start, end, text) VALUES (?, ?, ?, ?)",
+                    [(pmid, start, end, text) for start, end, text in article['chunks']]
+                )
+            if source is not None:
+                self._link_source(source, linked, chunk_count)
+        logger.info(f"Corpus store: added {len(added)} new articles")
+        return added
+
+    def _link_source(self, source: Dict, pmids: List[str], chunk_count: int):
+        self.conn.execute("DELETE FROM article_sources WHERE source = ?", (source['path'],))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?)",
+            (source['path'], source['content_hash'], source.get('size'), len(pmids), chunk_count, time.time())
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO article_sources VALUES (?, ?)", [(pmid, source['path']) for pmid in pmids]
+        )
+
+    def get_source(self, path: Optional[str] = None, content_hash: Optional[str] = None) -> Optional[Dict]:
+        """Return the recorded ingestion of a file, looked up by path or by content hash."""
+        column, value = ('path', path) if path is not None else ('content_hash', content_hash)
+        row = self.conn.execute(
+            f"SELECT path, content_hash, size, articles, chunks_added, ingested_at FROM sources WHERE {column} = ?",
+            (value,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('path', 'content_hash', 'size', 'articles', 'chunks_added', 'ingested_at'), row))
+
+    def copy_source(self, existing_path: str, source: Dict):
+        """Record `source` as a copy of an already ingested file with the same content."""
+        with self._lock, self.conn:
+            pmids = [row[0] for row in self.conn.execute(
+                "SELECT pmid FROM article_sources WHERE source = ?", (existing_path,)
+            )]
+            self._link_source(source, pmids, 0)
+
+    def sources_of(self, pmids: Iterable[str]) -> Dict[str, List[str]]:
+        """Map each PMID to the corpus files it was ingested from."""
+        pmids = list(pmids)
+        provenance: Dict[str, List[str]] = {}
+        for offset in range(0, len(pmids), MAX_SQL_PARAMS):
+            batch = pmids[offset:offset + MAX_SQL_PARAMS]
+            for pmid, source in self.conn.execute(
+                f"SELECT pmid, source FROM article_sources WHERE pmid IN ({','.join('?' * len(batch))}) ORDER BY source",
+                batch
+            ):
+                provenance.setdefault(pmid, []).append(source)
+        return provenance
+
+    def load_chunks(self, pmids: Optional[List[str]] = None, unembedded: bool = False) -> Dict[str, list]:
+        """
+        Read chunk columns in id order.
+
+        Args:
+            pmids (List[str], optional): Restrict to chunks of these articles.
+            unembedded (bool): Only chunks that have no embedding yet.
+
+        Returns:
+            Dict[str, list]: Columns 'id', 'pmid', 'start', 'end' and 'text'.
+        """
+        query = "SELECT id, pmid, start, end, text FROM chunks WHERE " + ("embedding IS NULL" if unembedded else "1")
+        if pmids is None:
+            rows = self.conn.execute(query + " ORDER BY id").fetchall()
+        else:
+            pmids = list(pmids)
+            rows = []
+            for offset in range(0, len(pmids), MAX_SQL_PARAMS):
+                batch = pmids[offset:offset + MAX_SQL_PARAMS]
+                rows.extend(self.conn.execute(
+                    query + f" AND pmid IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+            rows.sort()
+        names = ('id', 'pmid', 'start', 'end', 'text')
+        if not rows:
+            return {name: [] for name in names}
+        return {name: list(column) for name, column in zip(names, zip(*rows))}
+
+    def load_articles(self, columns: Iterable[str] = ('pmid', 'title', 'journal', 'year')) -> Dict[str, list]:
+        """Read selected article metadata columns."""
+        columns = list(columns)
+        rows = self.conn.execute(f"SELECT {', '.join(columns)} FROM articles ORDER BY pmid").fetchall()
+        if not rows:
+            return {name: [] for name in columns}
+        return {name: list(column) for name, column in zip(columns, zip(*rows))}
+
+    def save_embeddings(self, chunk_ids: List[int], embeddings: np.ndarray, model_name: str):
+        """Store float32 embeddings for the given chunk ids."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE chunks SET embedding = ? WHERE id = ?",
+                [(row.tobytes(), int(chunk_id)) for chunk_id, row in zip(chunk_ids, embeddings)]
+            )
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('embedding_model', ?)", (model_name,))
+
+    def load_embeddings(self, chunk_ids: List[int], model_name: str) -> Optional[np.ndarray]:
+        """
+        Load stored embeddings for the given chunk ids.
+
+        Returns:
+            np.ndarray or None: Matrix in `chunk_ids` order, or None if any
+            embedding is missing or was produced by a different model.
+        """
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'embedding_model'").fetchone()
+        if row is None or row[0] != model_name or not chunk_ids:
+            return None
+        chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+        blobs = {}
+        for offset in range(0, len(chunk_ids), MAX_SQL_PARAMS):
+            batch = chunk_ids[offset:offset + MAX_SQL_PARAMS]
+            blobs.update(self.conn.execute(
+                f"SELECT id, embedding FROM chunks WHERE embedding IS NOT NULL AND id IN ({','.join('?' * len(batch))})",
+                batch
+            ).fetchall())
+        if any(chunk_id not in blobs for chunk_id in chunk_ids):
+            return None
+        return np.stack([np.frombuffer(blobs[chunk_id], dtype=np.float32) for chunk_id in chunk_ids])
+
+    def embeddings_complete(self, model_name: str) -> bool:
+        """Whether every chunk has an embedding from `model_name`, without loading them."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'embedding_model'").fetchone()
+        if row is None or row[0] != model_name:
+            return False
+        return self.conn.execute("SELECT 1 FROM chunks WHERE embedding IS NULL LIMIT 1").fetchone() is None
+
+    def count(self) -> Dict[str, int]:
+        articles = self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        chunks = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {'articles': articles, 'chunks': chunks}
+
+    def get_sync_state(self, query: str) -> Optional[Dict]:
+        """Return the last sync date and counters recorded for a query."""
+        row = self.conn.execute(
+            "SELECT last_date, last_run, articles FROM sync_state WHERE query = ?", (query,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'last_date': row[0], 'last_run': row[1], 'articles': row[2]}
+
+    def update_sync_state(self, query: str, last_date: str, added: int):
+        """Record a finished sync for a query."""
+        previous = self.get_sync_state(query)
+        total = (previous['articles'] if previous else 0) + added
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                (query, last_date, time.time(), total)
+            )
@@ -0,0 +1,219 @@
+"""
+Local embedding process shared by all API workers.
+
+Run it once per host (`python embedding_service.py`) or let the first
+worker start it on demand. Workers send texts over a multiprocessing
+connection and get numpy embeddings back, so only this process holds
+the transformer weights.
+
+Connections unpickle what the peer sends, so only holders of the
+authkey may connect. Without `EMBED_SERVICE_AUTHKEY`, a random key is
+generated once and kept in a file only the current user can read, and
+the service listens on a Unix socket with the same permissions by default.
+"""
+import os
+import sys
+import time
+import fcntl
+import secrets
+import threading
+import subprocess
+from multiprocessing.connection import Client, Listener
+from types import SimpleNamespace
+from typing import List, Optional, Union
+
+from config import Config
+from micro_batcher import MicroBatcher
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+_RUN_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ADDRESS = os.path.join(_RUN_DIR, ".embedding_service.sock")
+KEY_PATH = os.path.join(_RUN_DIR, ".embedding_service.key")
+
+
+def parse_address(address: str):
+    """'host:port' becomes a TCP address, anything else a Unix socket path."""
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def service_authkey() -> bytes:
+    """
+    The connection key: `EMBED_SERVICE_AUTHKEY` if set, else a random key shared through a private file.
+
+    The first process to need a key generates it with `secrets.token_bytes`
+    and writes it with 0600 permissions; the service and every worker of
+    the same user read the same file.
+    """
+    if Config.EMBED_SERVICE_AUTHKEY:
+        return Config.EMBED_SERVICE_AUTHKEY.encode()
+    try:
+        fd = os.open(KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        if os.stat(KEY_PATH).st_mode & 0o077:
+            raise PermissionError(f"{KEY_PATH} is readable by other users; remove it to generate a new key")
+        # The creator may still be writing it
+        for _ in range(50):
+            with open(KEY_PATH, "rb") as f:
+                key = f.read()
+            if key:
+                return key
+            time.sleep(0.1)
+        raise RuntimeError(f"{KEY_PATH} is empty; remove it to generate a new key")
+    key = secrets.token_bytes(32)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _handle_connection(conn, model, encode_lock: threading.Lock, batcher: MicroBatcher):
+    try:
+        while True:
+            request = conn.recv()
+            if request[0] == "encode":
+                _, texts, batch_size = request
+                if len(texts) == 1 and batcher.max_batch > 1:
+                    # Single queries from different workers share one forward pass
+                    embeddings = batcher.encode(texts[0])[None, :]
+                else:
+                    with encode_lock:
+                        embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+                conn.send(embeddings)
+            elif request[0] == "info":
+                conn.send({
+                    "model": Config.TRANSFORMER_MODEL,
+                    "do_lower_case": getattr(model.tokenizer, "do_lower_case", False),
+                    "pid": os.getpid(),
+                    "batching": batcher.stats()
+                })
+            else:
+                conn.send(ValueError(f"Unknown request {request[0]!r}"))
+    except (EOFError, ConnectionResetError, BrokenPipeError):
+        pass
+    finally:
+        conn.close()
+
+
+def serve(address: str, authkey: bytes):
+    """Load the model once and answer encode requests from any number of clients."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(Config.TRANSFORMER_MODEL)
+    parsed = parse_address(address)
+    if isinstance(parsed, str):
+        if os.path.exists(parsed):
+            os.remove(parsed)
+        # Create the socket owner-only, so other local users cannot even attempt the handshake
+        previous_umask = os.umask(0o077)
+        try:
+            listener = Listener(parsed, authkey=authkey)
+        finally:
+            os.umask(previous_umask)
+        os.chmod(parsed, 0o600)
+    else:
+        logger.warning(f"Embedding service listening on TCP {address}; any local process can reach it, "
+                       f"so keep the authkey secret or prefer a Unix socket path")
+        listener = Listener(parsed, authkey=authkey)
+    logger.info(f"Embedding service for {Config.TRANSFORMER_MODEL} listening on {address}")
+
+    encode_lock = threading.Lock()
+
+    def encode_batch(texts):
+        with encode_lock:
+            return model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+    batcher = MicroBatcher(encode_batch, Config.QUERY_BATCH_SIZE, Config.QUERY_BATCH_WAIT_MS)
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            logger.warning(f"Embedding service rejected a connection: {e}")
+            continue
+        threading.Thread(target=_handle_connection, args=(conn, model, encode_lock, batcher), daemon=True).start()
+
+
+def ensure_service_running(address: str, authkey: bytes, timeout: float) -> None:
+    """Start the service in the background unless some process already serves `address`."""
+    try:
+        Client(parse_address(address), authkey=authkey).close()
+        return
+    except (ConnectionRefusedError, FileNotFoundError, OSError):
+        pass
+
+    lock_path = os.path.join(_RUN_DIR, ".embedding_service.lock")
+    with open(lock_path, "w") as lock_file:
+        # Only one worker spawns the service; the others wait for it to come up
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        deadline = time.time() + timeout
+        spawned = False
+        while time.time() < deadline:
+            try:
+                Client(parse_address(address), authkey=authkey).close()
+                return
+            except (ConnectionRefusedError, FileNotFoundError, OSError):
+                if not spawned:
+                    logger.info(f"Starting embedding service on {address}")
+                    # The child resolves the same key: from the inherited environment or the key file
+                    subprocess.Popen([sys.executable, os.path.abspath(__file__)], start_new_session=True,
+                                     env={**os.environ, "EMBED_SERVICE_ADDRESS": address})
+                    spawned = True
+                time.sleep(0.5)
+    raise TimeoutError(f"Embedding service on {address} did not start within {timeout:.0f}s")
+
+
+class RemoteEncoder:
+    """
+    Stand-in for SentenceTransformer that encodes through the embedding service.
+
+    Each thread keeps its own connection, so concurrent requests in one
+    worker don't interleave messages.
+    """
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None, start_timeout: float = 300):
+        self.address = address
+        self.authkey = authkey if authkey is not None else service_authkey()
+        self._local = threading.local()
+        ensure_service_running(address, self.authkey, start_timeout)
+        info = self._call(("info",))
+        self.tokenizer = SimpleNamespace(do_lower_case=info["do_lower_case"])
+        logger.info(f"Using embedding service on {address} (pid {info['pid']}, model {info['model']})")
+
+    def _connection(self):
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = Client(parse_address(self.address), authkey=self.authkey)
+        return self._local.conn
+
+    def _call(self, request):
+        try:
+            conn = self._connection()
+            conn.send(request)
+            response = conn.recv()
+        except (EOFError, ConnectionResetError, BrokenPipeError):
+            # The service restarted; reconnect once
+            self._local.conn = None
+            conn = self._connection()
+            conn.send(request)
+            response = conn.recv()
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               convert_to_tensor: bool = False, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(sentences, str)
+        embeddings = self._call(("encode", [sentences] if single else list(sentences), batch_size))
+        if single:
+            embeddings = embeddings[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(embeddings)
+        return embeddings
+
+
+if __name__ == "__main__":
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    serve(Config.EMBED_SERVICE_ADDRESS or DEFAULT_ADDRESS, service_authkey())
@@ -0,0 +1,342 @@
+"""
+Versioned corpus index with background rebuilds and atomic swaps.
+
+An `IndexVersion` bundles everything a request reads: the chunks, their
+spans and metadata, and the reference index built over them. Requests
+pin the current version for their whole run. A rebuild happens on a
+background thread while the current version keeps serving, and the new
+version replaces it in a single reference assignment. Replaced versions
+are kept for rollback. Versions beyond the retention limit are closed
+once their last reader has finished.
+"""
+import os
+import time
+import shutil
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+
+class IndexVersion:
+    """
+    One immutable build of the corpus.
+
+    Args:
+        number (int): Version number, increasing per process.
+        source_signature (tuple): Corpus source stat it was built from.
+        content_signature (str): Hash of the chunk texts and embedding model.
+        chunks (list): Chunk texts.
+        spans (dict): Chunk text to its location, for context packing.
+        chunk_ids (list, optional): Corpus store ids of the chunks.
+        metadata_index (MetadataIndex, optional): Filter index of the chunks.
+        reference_embeddings: Index searched by the pipeline.
+        path (str, optional): Directory holding this version's index files.
+        cleanup (callable, optional): Releases external resources, e.g. a Chroma collection.
+    """
+
+    def __init__(self, number: int, source_signature: Tuple, content_signature: str, chunks: List[str],
+                 spans: Dict, chunk_ids: Optional[List], metadata_index, reference_embeddings,
+                 path: Optional[str] = None, cleanup: Optional[Callable[[], None]] = None):
+        self.number = number
+        self.source_signature = source_signature
+        self.content_signature = content_signature
+        self.chunks = chunks
+        self.spans = spans
+        self.chunk_ids = chunk_ids
+        self.metadata_index = metadata_index
+        self.reference_embeddings = reference_embeddings
+        self.path = path
+        self.built_at = time.time()
+        self.build_seconds = 0.0
+        self._cleanup = cleanup
+        self._positions: Optional[Dict[str, int]] = None
+        self._readers = 0
+        self._retired = False
+        self._keep_shared = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def positions(self) -> Dict[str, int]:
+        """Chunk text to its position, to look up retrieved chunks' vectors."""
+        if self._positions is None:
+            self._positions = {chunk: position for position, chunk in enumerate(self.chunks)}
+        return self._positions
+
+    def acquire(self):
+        with self._lock:
+            self._readers += 1
+
+    def release(self):
+        with self._lock:
+            self._readers -= 1
+            close = self._retired and self._readers == 0
+        if close:
+            self._close()
+
+    def retire(self, keep_shared: bool = False):
+        """
+        Close the version now, or once its last reader releases it.
+
+        Args:
+            keep_shared (bool): Skip the cleanup callback because a live
+                version with the same content uses the same external resources.
+        """
+        with self._lock:
+            self._retired = True
+            self._keep_shared = keep_shared
+            close = self._readers == 0
+        if close:
+            self._close()
+
+    def _close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if hasattr(self.reference_embeddings, "close"):
+            self.reference_embeddings.close()  # Stop shard workers
+        if self._cleanup is not None and not self._keep_shared:
+            self._cleanup()
+        if self.path and os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+        logger.info(f"Released index version {self.number}")
+
+    def describe(self) -> Dict:
+        description = {
+            "version": self.number,
+            "chunks": len(self.chunks),
+            "content_signature": self.content_signature,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+            "readers": self._readers
+        }
+        if hasattr(self.reference_embeddings, "progress"):  # Served lexically while the dense index builds
+            description["dense_progress"] = self.reference_embeddings.progress()
+        return description
+
+
+class IndexManager:
+    """
+    Serves the current `IndexVersion` and replaces it without blocking readers.
+
+    Args:
+        build (callable): `build(number) -> IndexVersion or None`; called off
+            the request path except for the very first build.
+        source_signature (callable): Cheap signature of the corpus source
+            (path, size, mtime) used to detect changes.
+        retain (int): Replaced versions kept for rollback.
+        watch_interval_s (float): Seconds between change checks; 0 disables the watcher.
+    """
+
+    def __init__(self, build: Callable[[int], Optional[IndexVersion]], source_signature: Callable[[], Tuple],
+                 retain: int, watch_interval_s: float):
+        self._build = build
+        self._source_signature = source_signature
+        self.retain = retain
+        self.watch_interval_s = watch_interval_s
+        self._current: Optional[IndexVersion] = None
+        self._retained: deque = deque()
+        self._next_number = 1
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._builder: Optional[threading.Thread] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Source signature a rollback moved away from; not rebuilt again until the source changes
+        self._ignored_signature: Optional[Tuple] = None
+        self.last_error: Optional[str] = None
+        self.swaps = 0
+
+    def current(self) -> Optional[IndexVersion]:
+        """The serving version; built synchronously if none exists yet."""
+        if self._current is None:
+            with self._build_lock:
+                if self._current is None:
+                    version = self._build_version()
+                    if version is not None:
+                        self._swap(version)
+        return self._current
+
+    @contextmanager
+    def acquire(self) -> Iterator[Optional[IndexVersion]]:
+        """Pin the current version for the duration of a request."""
+        while True:
+            version = self.current()
+            if version is None:
+                yield None
+                return
+            version.acquire()
+            # A swap may have retired it between the read and the pin
+            if version is self._current or not version._retired:
+                break
+            version.release()
+        try:
+            yield version
+        finally:
+            version.release()
+
+    def request_reload(self, force: bool = False) -> bool:
+        """
+        Rebuild in the background if the corpus changed (or unconditionally with `force`).
+
+        Returns:
+            bool: True if a build was started, False if one is already running
+            or nothing changed.
+        """
+        with self._lock:
+            if self._builder is not None and self._builder.is_alive():
+                return False
+            if not force and not self._source_changed():
+                return False
+            self._builder = threading.Thread(target=self._reload, args=(force,), name="index-builder", daemon=True)
+            self._builder.start()
+            return True
+
+    def wait_for_build(self, timeout: Optional[float] = None):
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+    def rollback(self, number: Optional[int] = None) -> IndexVersion:
+        """
+        Serve a retained version again (the most recent one by default).
+
+        The version being replaced is retained in turn, so a rollback can be undone.
+        """
+        with self._build_lock, self._lock:
+            candidates = [version for version in self._retained if number is None or version.number == number]
+            if not candidates:
+                raise ValueError(f"No retained index version {number if number is not None else ''}".strip())
+            target = candidates[-1]
+            self._retained.remove(target)
+            previous = self._current
+            self._current = target
+            if previous is not None:
+                self._retained.append(previous)
+                self._ignored_signature = previous.source_signature
+            self.swaps += 1
+        logger.info(f"Rolled back to index version {target.number}")
+        return target
+
+    def replace(self, old: IndexVersion, new: IndexVersion) -> bool:
+        """
+        Serve `new` instead of `old`, if `old` is still the serving version.
+
+        Used when a version is upgraded in place (e.g. its dense index finished
+        building); `old` is released rather than retained for rollback.
+
+        Returns:
+            bool: False if another version has replaced `old` in the meantime.
+        """
+        with self._lock:
+            if self._current is not old:
+                return False
+            self._current = new
+            self.swaps += 1
+        logger.info(f"Index version {new.number} upgraded in place")
+        old.retire(keep_shared=True)
+        return True
+
+    def versions(self) -> List[IndexVersion]:
+        """The serving version followed by the retained ones, newest first."""
+        with self._lock:
+            return [version for version in (self._current, *reversed(self._retained)) if version is not None]
+
+    def stop(self):
+        self._stop.set()
+
+    def _source_changed(self) -> bool:
+        current = self._current
+        signature = self._source_signature()
+        return current is None or (signature != current.source_signature and signature != self._ignored_signature)
+
+    def _reload(self, force: bool):
+        with self._build_lock:
+            version = self._build_version()
+        if version is None:
+            return
+        current = self._current
+        if not force and current is not None and version.content_signature == current.content_signature:
+            logger.info("Corpus source touched but its content is unchanged; keeping the current index")
+            current.source_signature = version.source_signature
+            version.retire(keep_shared=True)
+            return
+        self._swap(version)
+
+    def _build_version(self) -> Optional[IndexVersion]:
+        with self._lock:
+            number = self._next_number
+            self._next_number += 1
+        start = time.perf_counter()
+        logger.info(f"Building index version {number}...")
+        try:
+            version = self._build(number)
+        except Exception as error:
+            self.last_error = f"{type(error).__name__}: {error}"
+            logger.exception(f"Building index version {number} failed; the current version keeps serving")
+            return None
+        if version is None:
+            self.last_error = "Corpus could not be loaded"
+            return None
+        version.build_seconds = time.perf_counter() - start
+        self.last_error = None
+        logger.info(f"Built index version {number} ({len(version.chunks)} chunks) in {version.build_seconds:.1f}s")
+        return version
+
+    def _swap(self, version: IndexVersion):
+        with self._lock:
+            previous = self._current
+            self._current = version
+            self._ignored_signature = None
+            expired = []
+            if previous is not None and hasattr(previous.reference_embeddings, "progress"):
+                expired.append(previous)  # Still building its dense index; not worth rolling back to
+            elif previous is not None:
+                self._retained.append(previous)
+            while len(self._retained) > self.retain:
+                expired.append(self._retained.popleft())
+            self.swaps += 1
+            live = {version.content_signature} | {kept.content_signature for kept in self._retained}
+        if previous is not None:
+            logger.info(f"Now serving index version {version.number} (was {previous.number})")
+        for old in expired:
+            old.retire(keep_shared=old.content_signature in live)
+        if hasattr(version.reference_embeddings, "start"):
+            version.reference_embeddings.start()  # Embed only once serving, so discarded builds never do
+        self._start_watcher()
+
+    def _start_watcher(self):
+        if self.watch_interval_s <= 0 or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="index-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval_s):
+            try:
+                if self.request_reload():
+                    logger.info("Corpus source changed; rebuilding the index in the background")
+            except Exception:
+                logger.exception("Corpus change check failed")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            current = self._current
+            return {
+                "current": current.describe() if current is not None else None,
+                "retained": [version.describe() for version in self._retained],
+                "building": self._builder is not None and self._builder.is_alive(),
+                "swaps": self.swaps,
+                "last_error": self.last_error,
+                "watch_interval_s": self.watch_interval_s
+            }
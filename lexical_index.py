@@ -0,0 +1,236 @@
+"""
+Lexical retrieval and progressive dense coverage for cold starts.
+
+`LexicalIndex` is a BM25 index over the chunks. It builds in seconds
+and needs no model, so a freshly started service can answer right away.
+`ProgressiveIndex` serves that lexical index while the dense embeddings
+are computed on a background thread. Each finished bucket of embeddings
+becomes searchable at once. Retrieval blends dense scores for the covered
+chunks with BM25 scores, weighting the dense side by the covered
+fraction. When coverage is complete, the caller builds the regular dense
+index from the finished matrix and swaps it in.
+"""
+import re
+import time
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from vector_index import normalize_rows, top_k
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with "
+    "we our not no but also than these those there their been into can may more most such".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms of two or more characters, without stopwords."""
+    return [term for term in re.findall(r"[a-z0-9]{2,}", text.lower()) if term not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Okapi BM25 over the chunks, with postings held as numpy arrays.
+
+    Args:
+        chunks (list): Chunk texts, indexed by position.
+        k1 (float): Term frequency saturation.
+        b (float): Length normalization strength.
+    """
+
+    def __init__(self, chunks: Sequence[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(chunks)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for position, chunk in enumerate(chunks):
+            terms = tokenize(chunk)
+            lengths[position] = len(terms)
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, []).append((position, count))
+
+        average = float(lengths.mean()) if self.size else 0.0
+        # Per-document length factor of the BM25 denominator, precomputed once
+        self._length_norm = k1 * (1 - b + b * lengths / max(average, 1e-9))
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, entries in postings.items():
+            positions = np.fromiter((position for position, _ in entries), dtype=np.int32, count=len(entries))
+            counts = np.fromiter((count for _, count in entries), dtype=np.float32, count=len(entries))
+            idf = float(np.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5)))
+            self._postings[term] = (positions, counts, idf)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for `query`."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            positions, counts, idf = self._postings[term]
+            scores[positions] += idf * counts * (self.k1 + 1) / (counts + self._length_norm[positions])
+        return scores
+
+    def search(self, query: str, k: int, candidate_ids=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions and BM25 scores of the k best-matching chunks with a non-zero score."""
+        scores = self.scores(query)
+        if candidate_ids is not None:
+            candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+            best = candidate_ids[top_k(scores[candidate_ids], k)]
+        else:
+            best = top_k(scores, k)
+        best = best[scores[best] > 0]
+        return best, scores[best]
+
+    def footprint(self) -> int:
+        return int(sum(positions.nbytes + counts.nbytes for positions, counts, _ in self._postings.values())
+                   + self._length_norm.nbytes)
+
+
+class ProgressiveIndex:
+    """
+    Lexical index whose dense coverage grows as embeddings are computed in the background.
+
+    Args:
+        chunks (list): Chunk texts.
+        lexical (LexicalIndex): BM25 index over the same chunks.
+        embed_buckets (callable): Returns an iterator of (positions, embeddings)
+            covering all chunks, e.g. `iter_bulk_embeddings`.
+        on_complete (callable, optional): Called on the embedding thread with
+            the finished, normalized matrix once every chunk is covered.
+    """
+
+    def __init__(self, chunks: Sequence[str], lexical: LexicalIndex,
+                 embed_buckets: Callable[[], Iterator[Tuple[List[int], np.ndarray]]],
+                 on_complete: Optional[Callable[[np.ndarray], None]] = None):
+        self.size = len(chunks)
+        self.lexical = lexical
+        self._embed_buckets = embed_buckets
+        self._on_complete = on_complete
+        self._vectors: Optional[np.ndarray] = None
+        # Positions in the order they were covered; a prefix of it is always searchable
+        self._order = np.zeros(self.size, dtype=np.int64)
+        self.covered = 0
+        self.error: Optional[str] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def coverage(self) -> float:
+        return self.covered / self.size if self.size else 1.0
+
+    @property
+    def complete(self) -> bool:
+        return self.covered == self.size
+
+    def start(self):
+        """Start embedding on a background thread; later calls do nothing."""
+        if self._thread is not None:
+            return
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._fill, name="progressive-embed", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop embedding; called when the version serving this index is released."""
+        self._stop.set()
+
+    def _fill(self):
+        try:
+            for positions, embeddings in self._embed_buckets():
+                if self._stop.is_set():
+                    logger.info("Progressive embedding stopped: its index version was replaced")
+                    return
+                embeddings = normalize_rows(embeddings)
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.size, embeddings.shape[1]), dtype=np.float32)
+                positions = np.asarray(positions, dtype=np.int64)
+                self._vectors[positions] = embeddings
+                self._order[self.covered:self.covered + len(positions)] = positions
+                # Published last, so searches only read rows that are written
+                self.covered += len(positions)
+        except Exception as error:
+            self.error = f"{type(error).__name__}: {error}"
+            logger.exception("Progressive embedding failed; serving the lexical index until the next reload")
+            return
+        self._finished_at = time.perf_counter()
+        logger.info(f"Dense coverage complete: {self.size} chunks in {self._finished_at - self._started_at:.1f}s")
+        if self._on_complete is not None and not self._stop.is_set():
+            try:
+                self._on_complete(self._vectors)
+            except Exception as error:
+                self.error = f"{type(error).__name__}: {error}"
+                logger.exception("Building the dense index from the finished embeddings failed")
+
+    def search_blended(self, query: str, query_vector: Optional[np.ndarray], k: int,
+                       candidate_ids=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best k chunks by BM25 blended with dense similarity over the covered chunks.
+
+        Both score lists are scaled so their best hit is 1, then combined as
+        `coverage * dense + (1 - coverage) * lexical`. The blended scores are
+        in [0, 1] but are not cosine similarities.
+
+        Args:
+            query (str): Query text for the lexical side.
+            query_vector (np.ndarray, optional): Query embedding; None searches lexically only.
+            k (int): Number of chunks to return.
+            candidate_ids (array-like, optional): Restrict to these chunk positions.
+        """
+        covered = self.covered
+        coverage = covered / self.size if self.size else 0.0
+        wide_k = 3 * k
+        lexical_positions, lexical_scores = self.lexical.search(query, wide_k, candidate_ids)
+        blended: Dict[int, float] = {}
+        if len(lexical_positions):
+            for position, score in zip(lexical_positions, lexical_scores / lexical_scores[0]):
+                blended[int(position)] = (1 - coverage) * float(score)
+
+        if covered and query_vector is not None:
+            searchable = self._order[:covered]
+            if candidate_ids is not None:
+                searchable = searchable[np.isin(searchable, np.asarray(candidate_ids, dtype=np.int64))]
+            query_vector = normalize_rows(np.asarray(query_vector).reshape(1, -1))[0]
+            dense_scores = self._vectors[searchable] @ query_vector
+            best = top_k(dense_scores, wide_k)
+            if len(best) and dense_scores[best[0]] > 0:
+                for position, score in zip(searchable[best], np.clip(dense_scores[best] / dense_scores[best[0]], 0, 1)):
+                    blended[int(position)] = blended.get(int(position), 0.0) + coverage * float(score)
+
+        if not blended:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        positions = np.fromiter(blended, dtype=np.int64, count=len(blended))
+        scores = np.fromiter(blended.values(), dtype=np.float32, count=len(blended))
+        best = top_k(scores, k)
+        return positions[best], scores[best]
+
+    def footprint(self) -> int:
+        vectors = self._vectors.nbytes if self._vectors is not None else 0
+        return vectors + self._order.nbytes + self.lexical.footprint()
+
+    def progress(self) -> Dict:
+        """Dense build progress: covered chunks, rate and estimated time to completion."""
+        elapsed = ((self._finished_at or time.perf_counter()) - self._started_at) if self._started_at else 0.0
+        rate = self.covered / elapsed if elapsed > 0 else 0.0
+        return {
+            "covered": self.covered,
+            "total": self.size,
+            "coverage": self.coverage,
+            "chunks_per_s": rate,
+            "eta_s": (self.size - self.covered) / rate if rate > 0 and not self.complete else None,
+            "error": self.error
+        }
@@ -0,0 +1,240 @@
+"""
+Per-stage LLM routing with latency budgets.
+
+Each pipeline stage (query enrichment, relevance scoring, answering) has
+its own ordered list of models and a latency budget. A call goes to the
+first model that is not cooling down. If that model raises, is rate
+limited or does not answer within the budget, the call moves on to the
+next candidate and the failed model is skipped for a cooldown period.
+The last candidate is always allowed to finish, so a slow answer still
+beats no answer. A call that cannot get a router thread before its
+deadline raises `QueueTimeout` and is not charged to the model.
+"""
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from config import Config
+from backends import get_backend
+from admission import check_cancelled
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+STAGES = ("enrich", "score", "answer")
+
+
+class QueueTimeout(FutureTimeout):
+    """No router thread became free before the call's deadline; the model was never asked."""
+
+
+def parse_routes(spec: str) -> List[str]:
+    """Split a comma-separated list of 'backend:model' names."""
+    return [name.strip() for name in spec.split(",") if name.strip()]
+
+
+def is_rate_limit(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or "ratelimit" in type(error).__name__.lower()
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from the Retry-After header of a rate-limit error, if the client exposes it."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def latency_summary(latencies) -> Dict:
+    if not latencies:
+        return {}
+    values = np.array(latencies)
+    return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+
+
+class LLMRouter:
+    """
+    Routes each stage's calls over its candidate models.
+
+    Args:
+        routes (dict): Stage name to candidate backend names, primary first.
+        budgets (dict): Stage name to latency budget in seconds.
+        cooldown_s (float): How long a model that failed or timed out is skipped.
+        history (int): Latencies kept per stage and model for the statistics.
+        max_workers (int): Threads running budgeted calls. A timed-out call
+            keeps its thread until the provider returns, so size this for
+            every call the concurrent pipelines can have outstanding.
+    """
+
+    def __init__(self, routes: Dict[str, List[str]], budgets: Dict[str, float], cooldown_s: float,
+                 history: int = 500, max_workers: int = 8):
+        self.routes = routes
+        self.budgets = budgets
+        self.cooldown_s = cooldown_s
+        self.history = history
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cooldown_until: Dict[str, float] = {}
+        self._stage_stats = {stage: self._new_stats() for stage in routes}
+        self._model_stats: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _new_stats(self) -> Dict:
+        return {"calls": 0, "failures": 0, "timeouts": 0, "queue_timeouts": 0, "rate_limited": 0,
+                "fallbacks": 0, "over_budget": 0, "latency_ms": deque(maxlen=self.history)}
+
+    def stage(self, stage: str, timeout: Optional[float] = None) -> Runnable:
+        """
+        A runnable for `stage`, usable wherever the pipeline expects an LLM (`prompt | llm`).
+
+        Args:
+            stage (str): Pipeline stage.
+            timeout (float, optional): Hard limit for every call, the last
+                candidate's included, time waiting for a router thread
+                counted; the call then raises `TimeoutError`.
+        """
+        if stage not in self.routes:
+            raise ValueError(f"Unknown LLM stage '{stage}', expected one of {sorted(self.routes)}")
+        return RunnableLambda(lambda prompt: self.invoke(stage, prompt, timeout=timeout), name=f"llm_{stage}")
+
+    def invoke(self, stage: str, prompt, timeout: Optional[float] = None):
+        """
+        Run `prompt` on the first candidate of `stage` that answers in time.
+
+        Each call has one deadline, from its submission to its answer.
+        Without `timeout` the last candidate may take as long as it needs.
+
+        Returns:
+            AIMessage: The model output; plain-text LLMs are wrapped so every
+            stage can read `.content` regardless of the backend.
+
+        Raises:
+            QueueTimeout: No router thread was free before the deadline.
+            TimeoutError: The last candidate exceeded `timeout`.
+        """
+        candidates = self.routes[stage]
+        budget = self.budgets[stage] if timeout is None else min(self.budgets[stage], timeout)
+        now = time.monotonic()
+        available = [model for model in candidates if self._cooldown_until.get(model, 0) <= now] or list(candidates)
+
+        start = time.perf_counter()
+        for position, model in enumerate(available):
+            check_cancelled()  # Do not start calls for a client that has gone away
+            final = position == len(available) - 1
+            call_start = time.perf_counter()
+            try:
+                result = self._call(model, prompt, timeout=timeout if final else budget)
+            except QueueTimeout:
+                # The router is saturated, not the model, so the model is not cooled down
+                with self._lock:
+                    self._model_stats_for(stage, model)["queue_timeouts"] += 1
+                    self._stage_stats[stage]["queue_timeouts"] += 1
+                if final:
+                    raise
+                logger.warning(f"LLM stage '{stage}': no router thread free for {model} in time, falling back")
+                continue
+            except FutureTimeout:
+                self._failed(stage, model, "timeouts", self.cooldown_s)
+                if final:
+                    raise
+                logger.warning(f"LLM stage '{stage}': {model} exceeded its {budget:.1f}s budget, falling back")
+                continue
+            except Exception as error:
+                if is_rate_limit(error):
+                    self._failed(stage, model, "rate_limited", retry_after(error) or self.cooldown_s)
+                else:
+                    self._failed(stage, model, "failures", self.cooldown_s)
+                if final:
+                    raise
+                logger.warning(f"LLM stage '{stage}': {model} failed ({type(error).__name__}: {error}), falling back")
+                continue
+
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                model_stats = self._model_stats_for(stage, model)
+                model_stats["calls"] += 1
+                model_stats["latency_ms"].append((time.perf_counter() - call_start) * 1000)
+                stage_stats = self._stage_stats[stage]
+                stage_stats["calls"] += 1
+                stage_stats["latency_ms"].append(elapsed * 1000)
+                stage_stats["fallbacks"] += model != candidates[0]
+                stage_stats["over_budget"] += elapsed > budget
+            logger.info(f"LLM stage '{stage}' answered by {model} in {elapsed:.2f}s")
+            return AIMessage(content=result) if isinstance(result, str) else result
+
+    def _call(self, model: str, prompt, timeout: Optional[float]):
+        llm = get_backend("llm", model)
+        if timeout is None:
+            return llm.invoke(prompt)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm")
+        deadline = time.monotonic() + timeout
+        started = threading.Event()
+
+        def run():
+            started.set()
+            return llm.invoke(prompt)
+
+        # Keep the request id on log records emitted by the client
+        future = self._executor.submit(contextvars.copy_context().run, run)
+        if not started.wait(timeout):
+            future.cancel()  # Still queued, or started only as the deadline passed
+            raise QueueTimeout()
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+
+    def _model_stats_for(self, stage: str, model: str) -> Dict:
+        return self._model_stats.setdefault((stage, model), self._new_stats())
+
+    def _failed(self, stage: str, model: str, reason: str, cooldown_s: float):
+        with self._lock:
+            self._model_stats_for(stage, model)[reason] += 1
+            self._stage_stats[stage][reason] += 1
+            self._cooldown_until[model] = max(self._cooldown_until.get(model, 0), time.monotonic() + cooldown_s)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            summary = {}
+            for stage, candidates in self.routes.items():
+                stage_stats = self._stage_stats[stage]
+                summary[stage] = {
+                    "budget_s": self.budgets[stage],
+                    **{key: value for key, value in stage_stats.items() if key != "latency_ms"},
+                    "latency_ms": latency_summary(stage_stats["latency_ms"]),
+                    "models": {
+                        model: {
+                            **{key: value for key, value in self._model_stats_for(stage, model).items()
+                               if key not in ("latency_ms", "fallbacks", "over_budget")},
+                            "latency_ms": latency_summary(self._model_stats_for(stage, model)["latency_ms"]),
+                            "cooling_down": self._cooldown_until.get(model, 0) > now
+                        } for model in candidates
+                    }
+                }
+            return summary
+
+
+llm_router = LLMRouter(
+    routes={
+        "enrich": parse_routes(Config.LLM_ENRICH_MODELS),
+        "score": parse_routes(Config.LLM_SCORE_MODELS),
+        "answer": parse_routes(Config.LLM_ANSWER_MODELS)
+    },
+    budgets={
+        "enrich": Config.LLM_ENRICH_BUDGET_S,
+        "score": Config.LLM_SCORE_BUDGET_S,
+        "answer": Config.LLM_ANSWER_BUDGET_S
+    },
+    cooldown_s=Config.LLM_COOLDOWN_S,
+    max_workers=Config.LLM_ROUTER_WORKERS
+)
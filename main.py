@@ -1,19 +1,30 @@
 import os
+import sys
 import time
 import logging
-from typing import Optional, List, Tuple, Union
+from typing import Dict, Optional, List, Tuple
 
 from config import Config
-from langchain_ollama import OllamaLLM
-from langchain_groq import ChatGroq
-from transformers_embed import nearest_sentences, embed_text
+from transformers_embed import nearest_sentences, embed_corpus, embed_query, query_cache, query_batcher
 from text_split import split_into_chunks
 from prompts_formatted import format_prompt_initial, format_rag_prompt
-from result_score_all import calc_score_from_llm
+from context_packing import locate_chunks, pack_context
+from corpus_store import CorpusStore
+from metadata_index import MetadataIndex, chroma_where
+from vector_index import QuantizedIndex, MappedIndex, corpus_signature, normalize_rows
+from sharded_index import ShardedIndex
+from index_manager import IndexManager, IndexVersion
+from lexical_index import LexicalIndex, ProgressiveIndex
+from relevance_gate import relevance_gate, chunk_vectors
+from conversation import conversations, Session
+from llm_router import llm_router
+from result_score_all import calc_score_from_llm, relevance_scorer
+from admission import admission
 from utils.doc_parser import filter_conflict_lines, filter_author_like_lines
-from utils.logger import setup_logger
+from utils.logger import setup_logger, dropped_log_records, log_buffer_footprint
+from utils.memory import register_component, enable_stage_tracing, track_stage, array_bytes, text_bytes
 from utils.file_reader import read_single_file
-from test_chroma import run_chroma, nearest_to_q
+from test_chroma import run_chroma, drop_collection, nearest_to_q
 
 # Disable noisy transformer output
 os.environ['TOKENIZERS_PARALLELISM'] = 'false'
@@ -22,8 +33,10 @@ os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
 # Configure logging
 logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
 
-# Global cache for preprocessed chunks
-_cached_chunks: Optional[List[str]] = None
+NO_RELEVANT_ANSWER = "No relevant documents found for the given query."
+
+if Config.MEMORY_TRACE_STAGES:
+    enable_stage_tracing()
 
 def read_and_clean_document() -> Optional[str]:
     """Read and clean the document from the file system."""
@@ -38,106 +51,470 @@ def read_and_clean_document() -> Optional[str]:
     document_text = filter_author_like_lines(document_text)
     return document_text
 
-def process_document(document_text: str) -> List[str]:
-    """Split the document into chunks, using cache if available."""
-    global _cached_chunks
+def process_document(document_text: str) -> Tuple[List[str], Dict]:
+    """Split the document into chunks and locate each chunk in it."""
+    chunks = split_into_chunks(document_text, chunk_size=Config.CHUNK_SIZE, chunk_overlap=Config.CHUNK_OVERLAP)
+    logger.info(f"Chunk size: {Config.CHUNK_SIZE}, number of chunks: {len(chunks)}")
+    return chunks, locate_chunks(document_text, chunks)
 
-    if _cached_chunks is not None:
-        logger.info(f"Using cached chunks: {_cached_chunks and len(_cached_chunks)} chunks")
-        return _cached_chunks
+def load_chunks_from_store() -> Tuple[List[str], Dict, List[int], MetadataIndex]:
+    """Load cleaned, pre-split chunks, their store ids and metadata straight from the corpus store."""
+    logger.info(f"Loading chunks from corpus store {Config.CORPUS_DB}...")
+    store = CorpusStore(Config.CORPUS_DB)
+    columns = store.load_chunks()
+    spans = {}
+    for text, pmid, start, end in zip(columns['text'], columns['pmid'], columns['start'], columns['end']):
+        spans.setdefault(text, (pmid, start, end))
 
-    chunks = split_into_chunks(document_text, chunk_size=Config.CHUNK_SIZE, chunk_overlap=300)
-    _cached_chunks = chunks
-    logger.info(f"Chunk size: {Config.CHUNK_SIZE}, number of chunks: {len(chunks)}")
-    return chunks
+    metadata_index = MetadataIndex(
+        columns['pmid'], store.load_articles(('pmid', 'journal', 'year', 'publication_types'))
+    )
+    logger.info(f"Loaded {len(columns['text'])} chunks from the corpus store")
+    return columns['text'], spans, columns['id'], metadata_index
 
-def get_reference_embeddings(chunks: List[str], cached_embeddings: Optional[List] = None) -> List:
-    """Return cached or new reference embeddings."""
-    if cached_embeddings is not None:
-        logger.info("Using cached embeddings - skipping embedding step")
-        return cached_embeddings
+def load_corpus() -> Optional[Tuple[List[str], Dict, Optional[List[int]], Optional[MetadataIndex]]]:
+    """Return (chunks, spans, store ids, metadata index) from the corpus store or the flat document file."""
+    if Config.CORPUS_DB:
+        return load_chunks_from_store()
 
-    logger.info("Creating new embeddings...")
+    document_text = read_and_clean_document()
+    if not document_text:
+        return None
+    chunks, spans = process_document(document_text)
+    return chunks, spans, None, None
+
+def get_reference_embeddings(chunks: List[str], path: str, chunk_ids: Optional[List[int]] = None,
+                             metadata_index: Optional[MetadataIndex] = None):
+    """Embed the chunks and build the configured reference index, writing its files under `path`."""
+    signature = corpus_signature(chunks, Config.TRANSFORMER_MODEL)
     if Config.BOOL_CHROMADB:
-        return run_chroma(chunks)
-    else:
-        return embed_text(text=chunks)
+        metadatas = metadata_index.chunk_metadata if metadata_index is not None else None
+        stored = CorpusStore(Config.CORPUS_DB).load_embeddings(chunk_ids, Config.TRANSFORMER_MODEL) if chunk_ids else None
+        # One collection per corpus content, so a rebuild never touches the collection being served
+        return run_chroma(chunks, ids=chunk_ids, metadatas=metadatas, signature=signature,
+                          name=f"docs_{signature}", embeddings=stored)
+
+    if Config.SHARED_INDEX and Config.INDEX_STORAGE == "float32":
+        # Only the first worker embeds; the others wait for the published file and map it
+        return MappedIndex.open_or_build(signature, lambda: compute_embeddings(chunks, chunk_ids).numpy(), Config.INDEX_DIR)
+
+    return build_vector_index(compute_embeddings(chunks, chunk_ids), path)
+
+def compute_embeddings(chunks: List[str], chunk_ids: Optional[List[int]] = None):
+    """Embed the chunks, reusing and filling the corpus store's saved embeddings when available."""
+    if chunk_ids is not None:
+        import torch
+
+        store = CorpusStore(Config.CORPUS_DB)
+        stored = store.load_embeddings(chunk_ids, Config.TRANSFORMER_MODEL)
+        if stored is not None:
+            logger.info("Using embeddings from the corpus store - skipping embedding step")
+            return torch.from_numpy(stored)
+
+        logger.info("Creating new embeddings...")
+        embeddings = embed_corpus(chunks)
+        store.save_embeddings(chunk_ids, embeddings.numpy(), Config.TRANSFORMER_MODEL)
+        return embeddings
+
+    logger.info("Creating new embeddings...")
+    return embed_corpus(chunks)
+
+def build_vector_index(embeddings, path: str):
+    """Wrap the embeddings in the index configured by INDEX_STORAGE and INDEX_SHARDS."""
+    if Config.INDEX_STORAGE != "float32":
+        return QuantizedIndex.build(embeddings.numpy(), Config.INDEX_STORAGE, path)
+    if Config.INDEX_SHARDS > 1:
+        return ShardedIndex(embeddings.numpy(), Config.INDEX_SHARDS, path)
+    return embeddings
+
+def corpus_source_signature() -> Tuple:
+    """Path, size and modification time of the corpus source; changes whenever the corpus does."""
+    path = Config.CORPUS_DB or Config.FILE_PATH
+    # SQLite appends to the -wal file until a checkpoint, so include it
+    paths = [path, f"{path}-wal"] if Config.CORPUS_DB else [path]
+    signature = [path]
+    for candidate in paths:
+        if os.path.exists(candidate):
+            stat = os.stat(candidate)
+            signature.extend((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+def build_index_version(number: int) -> Optional[IndexVersion]:
+    """Load the corpus and build a complete, self-contained index version."""
+    source_signature = corpus_source_signature()
+    with track_stage("load_corpus"):
+        corpus = load_corpus()
+    if not corpus or not corpus[0]:
+        return None
+    chunks, spans, chunk_ids, metadata_index = corpus
+
+    # Every version writes its files to its own directory, so building never
+    # overwrites files that the serving version has memory-mapped
+    path = os.path.join(Config.INDEX_DIR, "versions", f"v{os.getpid()}_{number}")
+    content_signature = corpus_signature(chunks, Config.TRANSFORMER_MODEL)
+    if needs_progressive_build(chunk_ids):
+        with track_stage("build_lexical"):
+            return build_progressive_version(number, source_signature, content_signature, chunks, spans,
+                                             chunk_ids, metadata_index, path)
+
+    with track_stage("build_index"):
+        reference_embeddings = get_reference_embeddings(chunks, path, chunk_ids, metadata_index)
+    cleanup = (lambda: drop_collection(f"docs_{content_signature}")) if Config.BOOL_CHROMADB else None
+    return IndexVersion(number, source_signature, content_signature, chunks, spans, chunk_ids,
+                        metadata_index, reference_embeddings, path=path, cleanup=cleanup)
+
+def needs_progressive_build(chunk_ids: Optional[List[int]]) -> bool:
+    """Whether the dense index needs the corpus embedded first, so serving BM25 meanwhile pays off."""
+    if not Config.PROGRESSIVE_INDEX or Config.BOOL_CHROMADB or Config.SHARED_INDEX:
+        return False
+    return chunk_ids is None or not CorpusStore(Config.CORPUS_DB).embeddings_complete(Config.TRANSFORMER_MODEL)
+
+def build_progressive_version(number: int, source_signature: Tuple, content_signature: str, chunks: List[str],
+                              spans: Dict, chunk_ids: Optional[List[int]], metadata_index: Optional[MetadataIndex],
+                              path: str) -> IndexVersion:
+    """
+    A version served by a BM25 index while its dense index is built in the background.
+
+    Embedding starts once the version is serving. When every chunk is
+    covered, the configured dense index is built from the embeddings and
+    replaces this version in the index manager.
+    """
+    from bulk_embed import iter_bulk_embeddings
+    from transformers_embed import get_model
+
+    def finish(matrix):
+        import torch
+
+        if chunk_ids is not None:
+            CorpusStore(Config.CORPUS_DB).save_embeddings(chunk_ids, matrix, Config.TRANSFORMER_MODEL)
+        dense = IndexVersion(number, source_signature, content_signature, chunks, spans, chunk_ids,
+                             metadata_index, build_vector_index(torch.from_numpy(matrix), path), path=path)
+        # From the start of the build until the dense index could serve
+        dense.build_seconds = version.build_seconds + time.time() - version.built_at
+        if not index_manager.replace(version, dense):
+            dense.retire()
+
+    progressive = ProgressiveIndex(
+        chunks, LexicalIndex(chunks),
+        embed_buckets=lambda: iter_bulk_embeddings(chunks, model=get_model() if Config.EMBED_WORKERS <= 1 else None),
+        on_complete=finish
+    )
+    version = IndexVersion(number, source_signature, content_signature, chunks, spans, chunk_ids,
+                           metadata_index, progressive)
+    logger.info(f"Serving {len(chunks)} chunks from a lexical index while the dense index builds")
+    return version
+
+def serving_lexically(version: IndexVersion) -> bool:
+    """Whether the version still answers from its lexical index while the dense index builds."""
+    return isinstance(version.reference_embeddings, ProgressiveIndex)
+
+index_manager = IndexManager(
+    build=build_index_version,
+    source_signature=corpus_source_signature,
+    retain=Config.INDEX_RETAIN_VERSIONS,
+    watch_interval_s=Config.INDEX_WATCH_INTERVAL_S
+)
+
+def index_footprint(reference_embeddings) -> Dict:
+    """
+    Memory held by a reference index.
+
+    `bytes` is private to this process. `mapped_bytes` are file-backed pages
+    shared with other workers and reclaimable by the OS, and
+    `external_bytes` live in shard worker processes or Chroma's storage engine.
+    """
+    footprint = {"bytes": 0, "mapped_bytes": 0, "external_bytes": 0}
+    if hasattr(reference_embeddings, "progress"):  # ProgressiveIndex
+        footprint["bytes"] = reference_embeddings.footprint()
+    elif hasattr(reference_embeddings, "matrix"):  # MappedIndex
+        footprint["mapped_bytes"] = reference_embeddings.matrix.nbytes
+    elif hasattr(reference_embeddings, "full_precision"):  # QuantizedIndex
+        footprint["bytes"] = array_bytes(reference_embeddings.codes) + array_bytes(reference_embeddings.scale)
+        footprint["mapped_bytes"] = reference_embeddings.full_precision.nbytes
+    elif hasattr(reference_embeddings, "matrix_path"):  # ShardedIndex
+        footprint["external_bytes"] = os.path.getsize(reference_embeddings.matrix_path)
+    elif hasattr(reference_embeddings, "element_size"):  # torch.Tensor
+        footprint["bytes"] = array_bytes(reference_embeddings)
+    elif hasattr(reference_embeddings, "count"):  # Chroma collection; estimated from its size
+        sample = reference_embeddings.get(limit=1, include=["embeddings"])["embeddings"]
+        dimension = len(sample[0]) if sample is not None and len(sample) else 0
+        footprint["external_bytes"] = reference_embeddings.count() * dimension * 4
+    return footprint
+
+def _index_versions_footprint() -> Dict:
+    per_version = {str(version.number): index_footprint(version.reference_embeddings)
+                   for version in index_manager.versions()}
+    return {"bytes": sum(entry["bytes"] for entry in per_version.values()),
+            "mapped_bytes": sum(entry["mapped_bytes"] for entry in per_version.values()),
+            "external_bytes": sum(entry["external_bytes"] for entry in per_version.values()),
+            "versions": per_version}
+
+def _chunk_text_footprint() -> Dict:
+    # Retained versions usually share most chunk strings with the current one; count each string once
+    seen, total = set(), 0
+    for version in index_manager.versions():
+        for chunk in version.chunks:
+            if id(chunk) not in seen:
+                seen.add(id(chunk))
+                total += text_bytes((chunk,))
+        total += sys.getsizeof(version.chunks) + sys.getsizeof(version.spans)
+    return {"bytes": total, "chunks": len(seen)}
+
+def _metadata_footprint() -> Dict:
+    return {"bytes": sum(version.metadata_index.footprint() for version in index_manager.versions()
+                         if version.metadata_index is not None)}
+
+register_component("index_vectors", _index_versions_footprint)
+register_component("chunk_text", _chunk_text_footprint)
+register_component("metadata_index", _metadata_footprint)
+register_component("request_log_buffers", log_buffer_footprint)
+
+def active_filters(filters: Optional[Dict]) -> Dict:
+    """The metadata filters that are actually set."""
+    return {key: value for key, value in (filters or {}).items() if value not in (None, '', [])}
+
+def retrieve_documents(
+    modified_query: str,
+    version: IndexVersion,
+    filters: Optional[Dict] = None,
+    k: Optional[int] = None
+) -> Tuple[List[str], List[float]]:
+    """Retrieve the top relevant documents of an index version and their similarities, pre-filtered on metadata."""
+    k = k or Config.RETRIEVE_TOP_K
+    filters = active_filters(filters)
+    if filters and version.metadata_index is None:
+        logger.warning("Metadata filters need the corpus store (CORPUS_DB); ignoring filters")
+        filters = None
 
-def retrieve_documents(modified_query: str, reference_embeddings: List, chunks: List[str]) -> List[str]:
-    """Retrieve the top relevant documents using the selected DB mode."""
     if Config.BOOL_CHROMADB:
-        return nearest_to_q(modified_query, reference_embeddings, n_results=Config.RETRIEVE_TOP_K)
+        return nearest_to_q(modified_query, version.reference_embeddings, n_results=k,
+                            where=chroma_where(filters), with_scores=True)
+
+    candidate_ids = version.metadata_index.select(filters) if filters else None
+    if serving_lexically(version):
+        index = version.reference_embeddings
+        query_vector = embed_query(modified_query).cpu().numpy() if index.covered else None
+        positions, scores = index.search_blended(modified_query, query_vector, k, candidate_ids)
+        return [version.chunks[position] for position in positions], [float(score) for score in scores]
 
-    retrieved_documents, _ = nearest_sentences(
+    retrieved_documents, similarities = nearest_sentences(
         llm_response=modified_query,
-        reference_texts=chunks,
-        reference_embeddings=reference_embeddings,
-        k=Config.RETRIEVE_TOP_K
+        reference_texts=version.chunks,
+        reference_embeddings=version.reference_embeddings,
+        k=k,
+        candidate_ids=candidate_ids
     )
-    return retrieved_documents
+    return retrieved_documents, list(similarities)
 
 def build_final_answer(
-    retrieved_docs: List[str],
+    relevant_docs: List[str],
     query: str,
-    llm_model: ChatGroq,
-    relevance_scores: List[Union[int, float]],
-    start_time: float
+    llm_model,
+    start_time: float,
+    spans: Optional[Dict] = None,
+    history: Optional[List[str]] = None
 ) -> str:
-    """Format and return the final RAG result."""
-    logger.info(f"Scored docs: {relevance_scores}")
-    relevant_docs = [doc for doc, score in zip(retrieved_docs, relevance_scores) if score >= Config.MIN_RELEVANCE_SCORE]
-
+    """Format and return the final RAG result; `history` holds earlier questions of the conversation."""
     if not relevant_docs:
         logger.info("No relevant documents found")
-        return "No relevant documents found for the given query."
+        return NO_RELEVANT_ANSWER
 
-    final_result = format_rag_prompt(relevant_docs, query, llm=llm_model)
+    context_docs = pack_context(relevant_docs, spans=spans)
+    final_result = format_rag_prompt(context_docs, query, llm=llm_model, history=history)
     final_result = final_result.content
     logger.info(f"Final answer: {final_result}")
     logger.info(f"Time taken: {time.time() - start_time:.2f} seconds")
     logger.info("=========================")
     return final_result
 
+def get_pipeline_stats() -> Dict:
+    """Collect runtime statistics of the pipeline components."""
+    return {
+        "query_embedding_cache": query_cache.stats(),
+        "query_batching": query_batcher.stats(),
+        "relevance_gate": relevance_gate.stats(),
+        "llm_stages": llm_router.stats(),
+        "relevance_scoring": relevance_scorer.stats(),
+        "conversations": conversations.stats(),
+        "index": index_manager.stats(),
+        "admission": admission.stats(),
+        "logging": {"dropped_records": dropped_log_records()}
+    }
+
+def normalized_query_vector(query: str):
+    return normalize_rows(embed_query(query).cpu().numpy())
+
+def retrieved_vectors(docs: List[str], version: IndexVersion):
+    """Normalized vectors of retrieved chunks, looked up in the version's reference index."""
+    chroma_ids = version.chunk_ids if version.chunk_ids is not None else range(len(version.chunks))
+    return chunk_vectors(version.reference_embeddings, [version.positions[doc] for doc in docs],
+                         [str(chunk_id) for chunk_id in chroma_ids] if Config.BOOL_CHROMADB else [])
+
+def rerank_scores(docs: List[str], query: str) -> Optional[List[Optional[int]]]:
+    """LLM relevance scores for `docs` when `LLM_RERANK` is on, within the request's scoring deadline."""
+    if not Config.LLM_RERANK:
+        return None
+    return calc_score_from_llm(docs, query, llm_router.stage("score", timeout=Config.SCORE_TIMEOUT_S),
+                               deadline=time.monotonic() + Config.SCORE_DEADLINE_S)
+
+def answer_from_pool(session: Session, query: str, search_query: str, history: List[str], filters: Dict,
+                     start_time: float, version: IndexVersion) -> Optional[str]:
+    """
+    Answer a follow-up from the session's candidate pool, or return None if the pool falls short.
+
+    The pool is re-ranked with the contextual `search_query`; the LLM
+    stages get the question itself, with `history` as separate context.
+    """
+    if not session.matches(filters, version.content_signature):
+        return None
+    docs, scores = session.rerank(normalized_query_vector(search_query), Config.GATE_MAX_K)
+    if not session.covers(float(scores[0]), relevance_gate.threshold, relevance_gate.margin):
+        logger.info(f"Session pool best score {scores[0]:.3f} falls short; searching the full index")
+        return None
+
+    logger.info(f"Answering follow-up from the session pool of {len(session)} chunks (best score {scores[0]:.3f})")
+    relevance_scores = rerank_scores(docs, query)
+    relevant_docs = relevance_gate.select(docs, list(scores), relevance_scores)
+    return build_final_answer(relevant_docs, query, llm_router.stage("answer"), start_time, version.spans, history)
+
+def run_pipeline(
+    version: IndexVersion,
+    query: str,
+    filters: Optional[Dict],
+    session_id: Optional[str],
+    start_time: float
+) -> str:
+    """Answer a query from one index version: gate, enrich, retrieve, select and generate."""
+    if serving_lexically(version):
+        return run_lexical_pipeline(version, query, filters, session_id, start_time)
+    relevance_gate.ensure_calibrated(version.reference_embeddings)
+
+    session = conversations.get(session_id) if session_id else None
+    # The previous questions only steer retrieval; the LLM stages get them as separate context
+    history = list(session.questions) if session is not None else []
+    search_query = session.contextual_query(query) if session is not None else query
+    filters = active_filters(filters)
+
+    if session is not None:
+        with track_stage("session_pool"):
+            final_answer = answer_from_pool(session, query, search_query, history, filters, start_time, version)
+        if final_answer is not None:
+            session.remember(query)
+            conversations.record_turn(session, "pool", time.time() - start_time)
+            return final_answer
+
+    # Probe before any LLM call so off-topic questions exit early; follow-ups probe with their context
+    with track_stage("probe"):
+        _, probe_similarities = retrieve_documents(search_query, version, filters=filters, k=1)
+    if not relevance_gate.passes(probe_similarities):
+        return NO_RELEVANT_ANSWER
+
+    logger.info("Get enriched query from LLM (consider removing)")
+    with track_stage("enrich"):
+        modified_query = format_prompt_initial(query=query, llm=llm_router.stage("enrich"), history=history)
+    logger.info(f"Modified query: {modified_query}")
+
+    # In a conversation, retrieve a wider candidate pool for follow-ups to re-rank
+    pool_k = max(Config.GATE_MAX_K, Config.SESSION_POOL_K) if session is not None else Config.GATE_MAX_K
+    with track_stage("retrieve"):
+        retrieved_docs, similarities = retrieve_documents(modified_query, version, filters=filters, k=pool_k)
+    if session is not None:
+        session.remember(query, filters, retrieved_docs, retrieved_vectors(retrieved_docs, version),
+                         query_vector=normalized_query_vector(search_query),
+                         content_signature=version.content_signature)
+        retrieved_docs, similarities = retrieved_docs[:Config.GATE_MAX_K], similarities[:Config.GATE_MAX_K]
+
+    with track_stage("score"):
+        relevance_scores = rerank_scores(retrieved_docs, query)
+    if relevance_scores is not None:
+        logger.info(f"Scored docs: {relevance_scores}")
+    relevant_docs = relevance_gate.select(retrieved_docs, similarities, relevance_scores)
+
+    with track_stage("answer"):
+        final_answer = build_final_answer(relevant_docs, query, llm_router.stage("answer"), start_time,
+                                          version.spans, history)
+    if session is not None:
+        conversations.record_turn(session, "full", time.time() - start_time)
+    return final_answer
+
+def run_lexical_pipeline(
+    version: IndexVersion,
+    query: str,
+    filters: Optional[Dict],
+    session_id: Optional[str],
+    start_time: float
+) -> str:
+    """
+    Answer a query while the version is still served by its lexical index.
+
+    The blended scores are not cosine similarities, so the similarity gate
+    and the session pool (which need the dense vectors) are skipped. A query
+    sharing no terms with the corpus, while no chunk is embedded yet, exits
+    before any LLM call; otherwise only the reranker filters the hits.
+    """
+    session = conversations.get(session_id) if session_id else None
+    history = list(session.questions) if session is not None else []
+    search_query = session.contextual_query(query) if session is not None else query
+    filters = active_filters(filters)
+    logger.info(f"Dense index {version.reference_embeddings.coverage:.0%} built; retrieving lexically")
+
+    with track_stage("probe"):
+        probe_docs, _ = retrieve_documents(search_query, version, filters=filters, k=1)
+    if not probe_docs:
+        return NO_RELEVANT_ANSWER
+
+    with track_stage("enrich"):
+        modified_query = format_prompt_initial(query=query, llm=llm_router.stage("enrich"), history=history)
+    logger.info(f"Modified query: {modified_query}")
+
+    # The enrichment expands the question's terms rather than replacing them, which BM25 needs
+    with track_stage("retrieve"):
+        retrieved_docs, scores = retrieve_documents(f"{search_query} {modified_query}", version,
+                                                    filters=filters, k=Config.GATE_MAX_K)
+    with track_stage("score"):
+        relevance_scores = rerank_scores(retrieved_docs, query)
+    relevant_docs = relevance_gate.select(retrieved_docs, scores, relevance_scores, cosine=False)
+
+    with track_stage("answer"):
+        final_answer = build_final_answer(relevant_docs, query, llm_router.stage("answer"), start_time,
+                                          version.spans, history)
+    if session is not None:
+        session.remember(query)
+        conversations.record_turn(session, "full", time.time() - start_time)
+    return final_answer
+
 def main(
     query: str = "What are the possible Parkinson treatments",
     log_stream = None,
-    cached_embeddings: Optional[List] = None
+    filters: Optional[Dict] = None,
+    session_id: Optional[str] = None
 ) -> Tuple[Optional[List], str]:
     """
     Run the complete RAG pipeline: read, chunk, embed, retrieve, and generate.
 
+    The corpus is loaded and indexed once per process by the index manager,
+    which rebuilds it in the background when the corpus changes. The query
+    is answered entirely from the index version current when it started.
+
     Args:
         query (str): User query.
         log_stream (io.StringIO, optional): Stream for capturing logs.
-        cached_embeddings (list, optional): Cached reference embeddings.
+        filters (dict, optional): Metadata filters ('year_from', 'year_to',
+            'journal', 'article_type') applied before vector scoring.
+        session_id (str, optional): Conversation the query belongs to. Follow-ups
+            are read in the context of the previous questions and answered from
+            the chunks retrieved for them when those still match well.
 
     Returns:
         tuple: (reference_embeddings, final_answer)
     """
-    global _cached_chunks
     start_time = time.time()
 
-    document_text = read_and_clean_document()
-    if not document_text:
-        return None, "Failed to load document."
-
-    chunks = process_document(document_text)
-    #llm_model = OllamaLLM(model=Config.MODEL_NAME, base_url=Config.OLLAMA_HOST)
-    llm_model = ChatGroq(model="llama-3.3-70b-versatile", api_key="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")
-
-
-    reference_embeddings = get_reference_embeddings(chunks, cached_embeddings)
-
-    logger.info("Get enriched query from LLM (consider removing)")
-    modified_query = format_prompt_initial(query=query, llm=llm_model)
-    logger.info(f"Modified query: {modified_query}")
-
-    retrieved_docs = retrieve_documents(modified_query, reference_embeddings, chunks)
-
-    relevance_scores = [10] * len(retrieved_docs)  # Placeholder for scoring logic
-
-    final_answer = build_final_answer(retrieved_docs, query, llm_model, relevance_scores, start_time)
-    return reference_embeddings, final_answer
+    with index_manager.acquire() as version:
+        if version is None:
+            return None, "Failed to load document."
+        final_answer = run_pipeline(version, query, filters, session_id, start_time)
+        return version.reference_embeddings, final_answer
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+import sys
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+# Filter keys accepted by the retrieval functions
+FILTER_KEYS = ('year_from', 'year_to', 'journal', 'article_type')
+
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+class MetadataIndex:
+    """
+    Posting lists from article metadata to chunk positions.
+
+    Chunk positions are indices into the chunk list the embeddings were
+    built from, so a filter resolves to the rows of the embedding matrix
+    that need scoring. Years are kept sorted for range lookups; journals
+    and publication types map to sorted position arrays.
+    """
+
+    def __init__(self, chunk_pmids: List[str], articles: Dict[str, list]):
+        """
+        Args:
+            chunk_pmids (List[str]): PMID of every chunk, in chunk order.
+            articles (Dict[str, list]): Columns 'pmid', 'journal', 'year' and
+                'publication_types' from `CorpusStore.load_articles`.
+        """
+        by_pmid = {
+            pmid: (journal, year, json.loads(types or '[]'))
+            for pmid, journal, year, types in zip(
+                articles['pmid'], articles['journal'], articles['year'], articles['publication_types']
+            )
+        }
+        self.size = len(chunk_pmids)
+
+        years = np.full(self.size, -1, dtype=np.int32)
+        journals: Dict[str, List[int]] = {}
+        types: Dict[str, List[int]] = {}
+        self.chunk_metadata = []
+        for position, pmid in enumerate(chunk_pmids):
+            journal, year, pub_types = by_pmid.get(pmid, (None, None, []))
+            if year is not None:
+                years[position] = year
+            if journal:
+                journals.setdefault(journal.lower(), []).append(position)
+            for pub_type in pub_types:
+                types.setdefault(pub_type.lower(), []).append(position)
+            self.chunk_metadata.append(self._chroma_metadata(pmid, journal, year, pub_types))
+
+        self._year_order = np.argsort(years, kind='stable').astype(np.int64)
+        self._sorted_years = years[self._year_order]
+        self.journals = {key: np.array(positions, dtype=np.int64) for key, positions in journals.items()}
+        self.article_types = {key: np.array(positions, dtype=np.int64) for key, positions in types.items()}
+
+    @staticmethod
+    def _chroma_metadata(pmid: str, journal: Optional[str], year: Optional[int], pub_types: List[str]) -> Dict:
+        metadata = {'pmid': pmid, 'journal': (journal or '').lower(), 'year': year if year is not None else -1}
+        for pub_type in pub_types:
+            metadata[f'type:{pub_type.lower()}'] = True
+        return metadata
+
+    def select(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        Resolve filters to the sorted chunk positions that satisfy all of them.
+
+        Args:
+            filters (Dict, optional): Any of 'year_from', 'year_to' (inclusive),
+                'journal' and 'article_type' (a value or list of values).
+
+        Returns:
+            np.ndarray or None: Matching positions, or None when no filter is set.
+        """
+        if not filters or all(filters.get(key) in (None, '', []) for key in FILTER_KEYS):
+            return None
+
+        selected = None
+
+        def narrow(positions: np.ndarray):
+            nonlocal selected
+            selected = positions if selected is None else np.intersect1d(selected, positions, assume_unique=True)
+
+        year_from, year_to = filters.get('year_from'), filters.get('year_to')
+        if year_from is not None or year_to is not None:
+            low = np.searchsorted(self._sorted_years, int(year_from) if year_from is not None else 0, side='left')
+            high = np.searchsorted(self._sorted_years, int(year_to) if year_to is not None else 10 ** 6, side='right')
+            narrow(np.sort(self._year_order[low:high]))
+
+        for key, postings in (('journal', self.journals), ('article_type', self.article_types)):
+            values = _as_list(filters.get(key))
+            if values:
+                matches = [postings.get(value.lower(), np.empty(0, dtype=np.int64)) for value in values]
+                narrow(np.unique(np.concatenate(matches)))
+
+        logger.info(f"Metadata filter {filters} selected {len(selected)}/{self.size} chunks")
+        return selected
+
+    def footprint(self) -> int:
+        """Approximate bytes held by the postings and the per-chunk Chroma metadata."""
+        postings = [*self.journals.values(), *self.article_types.values(), self._year_order, self._sorted_years]
+        metadata = sum(sys.getsizeof(entry) for entry in self.chunk_metadata)
+        return sum(array.nbytes for array in postings) + metadata + sys.getsizeof(self.chunk_metadata)
+
+
+def chroma_where(filters: Optional[Dict]) -> Optional[Dict]:
+    """Translate retrieval filters into a Chroma `where` clause."""
+    if not filters:
+        return None
+
+    clauses = []
+    if filters.get('year_from') is not None:
+        clauses.append({'year': {'$gte': int(filters['year_from'])}})
+    if filters.get('year_to') is not None:
+        clauses.append({'year': {'$lte': int(filters['year_to'])}})
+    journals = _as_list(filters.get('journal'))
+    if journals:
+        clauses.append({'journal': {'$in': [journal.lower() for journal in journals]}})
+    types = _as_list(filters.get('article_type'))
+    if types:
+        type_clauses = [{f'type:{pub_type.lower()}': True} for pub_type in types]
+        clauses.append(type_clauses[0] if len(type_clauses) == 1 else {'$or': type_clauses})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
@@ -0,0 +1,108 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, NamedTuple
+
+import numpy as np
+
+from config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+
+class _Pending(NamedTuple):
+    text: str
+    future: Future
+    enqueued: float
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-text encodes into one forward pass.
+
+    Callers block on a future while a background thread collects requests
+    for up to `max_wait_ms` after the first one arrives, or until
+    `max_batch` are queued, then encodes them together.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch: int, max_wait_ms: float):
+        self.encode_fn = encode_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.wait_seconds = 0.0
+        self.encode_seconds = 0.0
+
+    def _ensure_started(self):
+        # Started on first use so importing the module never spawns a thread
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="query-micro-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for encoding; the future resolves to its embedding row."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put(_Pending(text, future, time.monotonic()))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        """Encode one text as part of whatever batch it lands in."""
+        return self.submit(text).result()
+
+    def _collect(self) -> List[_Pending]:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            try:
+                embeddings = self.encode_fn([item.text for item in batch])
+                for item, embedding in zip(batch, embeddings):
+                    item.future.set_result(embedding)
+            except Exception as e:
+                logger.error(f"Batched encode of {len(batch)} queries failed: {e}")
+                for item in batch:
+                    item.future.set_exception(e)
+            finished = time.monotonic()
+
+            with self._stats_lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.wait_seconds += sum(started - item.enqueued for item in batch)
+                self.encode_seconds += finished - started
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            mean_batch = self.requests / self.batches if self.batches else 0.0
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": mean_batch,
+                "largest_batch": self.largest_batch,
+                "fill_ratio": mean_batch / self.max_batch,
+                "mean_queue_wait_ms": 1000 * self.wait_seconds / self.requests if self.requests else 0.0,
+                "mean_encode_ms": 1000 * self.encode_seconds / self.batches if self.batches else 0.0,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000
+            }
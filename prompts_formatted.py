@@ -1,13 +1,24 @@
 
+from typing import List, Optional
+
 from langchain.prompts import PromptTemplate
 
-def format_prompt_initial(query: str, llm ) -> str:
+
+def _history_section(history: Optional[List[str]]) -> str:
+    """Earlier questions of a conversation, framed as context rather than questions to answer."""
+    if not history:
+        return ""
+    questions = "\n".join(f"- {question}" for question in history)
+    return f"Earlier questions in this conversation (context only, do not answer them):\n{questions}\n"
+
+def format_prompt_initial(query: str, llm, history: Optional[List[str]] = None) -> str:
 
     # Define the prompt template
     prompt_template = PromptTemplate(
-        input_variables=["query"],
+        input_variables=["query", "history"],
         template=
         """You are a highly reliable medical assistant.\n
+        {history}
         User Query:
         {query}
         Task:
@@ -18,19 +29,21 @@ def format_prompt_initial(query: str, llm ) -> str:
     
     llm_chain = prompt_template | llm 
 
-    input_data = {"query": query}
+    input_data = {"query": query, "history": _history_section(history)}
     result = llm_chain.invoke(input_data)
 
     result = result.content
     return result
 
-def format_rag_prompt(retrieved_docs: list[str], query: str, llm ) -> str:
+def format_rag_prompt(retrieved_docs: list[str], query: str, llm, history: Optional[List[str]] = None) -> str:
     """
     Formats the RAG prompt using the provided retrieved documents and query.
 
     Args:
         retrieved_docs (List[str]): List of retrieved documents.
         query (str): User query.
+        history (List[str], optional): Earlier questions of the conversation,
+            shown as context only.
 
     Returns:
         str: The formatted prompt.
@@ -40,12 +53,13 @@ def format_rag_prompt(retrieved_docs: list[str], query: str, llm ) -> str:
     
     # Define the prompt template
     prompt_template = PromptTemplate(
-        input_variables=["context", "query"],
+        input_variables=["context", "query", "history"],
         template=
         """You are a highly reliable medical assistant.\n
         You have been provided with the following context information from trusted sources.\n\n
         Context:
         {context}
+        {history}
         User Query:
         {query}
         Task:
@@ -56,7 +70,7 @@ def format_rag_prompt(retrieved_docs: list[str], query: str, llm ) -> str:
     
     llm_chain = prompt_template | llm 
 
-    input_data = {"query": query, "context": context}
+    input_data = {"query": query, "context": context, "history": _history_section(history)}
     result = llm_chain.invoke(input_data)
 
     return result
\ No newline at end of file
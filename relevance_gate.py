@@ -0,0 +1,235 @@
+import threading
+from collections import deque
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from vector_index import normalize_rows
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+
+def reference_matrix(reference_embeddings):
+    """Row-indexable chunk vectors of an in-process index, or None (e.g. for a Chroma collection)."""
+    if hasattr(reference_embeddings, "matrix"):  # MappedIndex
+        return reference_embeddings.matrix
+    if hasattr(reference_embeddings, "full_precision"):  # QuantizedIndex
+        return reference_embeddings.full_precision
+    if hasattr(reference_embeddings, "matrix_path"):  # ShardedIndex
+        return np.load(reference_embeddings.matrix_path, mmap_mode="r")
+    if hasattr(reference_embeddings, "numpy"):  # torch.Tensor
+        return reference_embeddings.cpu().numpy()
+    return None
+
+
+def is_chroma_collection(reference_embeddings) -> bool:
+    return hasattr(reference_embeddings, "count") and hasattr(reference_embeddings, "get")
+
+
+def sample_reference_vectors(reference_embeddings, n: int, seed: int = 0) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Draw up to `n` normalized chunk vectors from any supported reference index.
+
+    Returns:
+        tuple: (sampled vectors or None if the index does not expose them, index size)
+    """
+    rng = np.random.default_rng(seed)
+
+    matrix = reference_matrix(reference_embeddings)
+    if matrix is not None:
+        total = len(matrix)
+        picks = np.sort(rng.choice(total, size=min(n, total), replace=False))
+        vectors = np.asarray(matrix[picks], dtype=np.float32)
+    elif is_chroma_collection(reference_embeddings):
+        total = reference_embeddings.count()
+        offset = int(rng.integers(0, max(1, total - n + 1)))
+        embeddings = reference_embeddings.get(limit=n, offset=offset, include=["embeddings"])["embeddings"]
+        vectors = np.asarray(embeddings, dtype=np.float32) if embeddings is not None and len(embeddings) else None
+    else:
+        total, vectors = 0, None
+
+    if vectors is None or len(vectors) < 2:
+        return None, total
+    return normalize_rows(vectors), total
+
+
+def chunk_vectors(reference_embeddings, positions: Sequence[int], chroma_ids: Sequence[str]) -> Optional[np.ndarray]:
+    """
+    Normalized vectors of the chunks at `positions`, in that order.
+
+    Args:
+        reference_embeddings: Any supported reference index.
+        positions (sequence): Chunk positions in the corpus.
+        chroma_ids (sequence): Collection id of each position, used for Chroma.
+
+    Returns:
+        np.ndarray or None if the index does not expose its vectors.
+    """
+    if not len(positions):
+        return np.empty((0, 0), dtype=np.float32)
+    matrix = reference_matrix(reference_embeddings)
+    if matrix is not None:
+        return normalize_rows(matrix[np.asarray(positions)])
+    if is_chroma_collection(reference_embeddings):
+        ids = [chroma_ids[position] for position in positions]
+        result = reference_embeddings.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(result["ids"], result["embeddings"]))
+        if len(by_id) < len(set(ids)):
+            return None
+        return normalize_rows(np.asarray([by_id[chunk_id] for chunk_id in ids], dtype=np.float32))
+    return None
+
+
+class RelevanceGate:
+    """
+    Decides from retrieval similarities whether a query is worth an LLM call.
+
+    Early exit only applies with an explicit `min_similarity`, fitted on
+    labelled query-to-chunk scores (`scripts/calibrate_gate.py`). Without
+    it the gate runs in log-only mode. The cosine scores of random chunk
+    pairs give the background similarity of the corpus, and the best of N
+    unrelated scores is expected near mean + std * sqrt(2 ln N). That
+    estimate plus `min_z` deviations is reported as `auto_threshold`, and
+    queries under it are counted as `would_skip`, but they are answered.
+    Chunk pairs are not query-chunk pairs: in a single-topic corpus random
+    pairs are already on-topic, and the estimate can sit above the best hit
+    of real questions. Hits more than `max_drop_z` deviations below the
+    best one are dropped, so the number of chunks sent to the LLM follows
+    the score distribution instead of a fixed top-k.
+    """
+
+    def __init__(self, enabled: bool, min_similarity: Optional[float], min_z: float, max_drop_z: float,
+                 min_rerank_score: float, calibration_samples: int, history: int = 1000):
+        self.enabled = enabled
+        self.min_similarity = min_similarity
+        self.min_z = min_z
+        self.max_drop_z = max_drop_z
+        self.min_rerank_score = min_rerank_score
+        self.calibration_samples = calibration_samples
+        self.threshold = min_similarity if min_similarity is not None else float("-inf")
+        self.auto_threshold: Optional[float] = None
+        self.margin = float("inf")
+        self.background = None
+        self._calibrated_key = None
+        self._lock = threading.Lock()
+        self._top_scores = deque(maxlen=history)
+        self.queries = 0
+        self.skipped = 0
+        self.would_skip = 0
+        self.selected = 0
+        self.retrieved = 0
+        self.rerank_dropped = 0
+
+    def ensure_calibrated(self, reference_embeddings):
+        """Calibrate against `reference_embeddings` unless it is the index calibrated last."""
+        key = (id(reference_embeddings), len(reference_embeddings) if hasattr(reference_embeddings, "__len__") else None)
+        if not self.enabled or key == self._calibrated_key:
+            return
+        with self._lock:
+            if key == self._calibrated_key:
+                return
+            vectors, total = sample_reference_vectors(reference_embeddings, self.calibration_samples)
+            if vectors is None:
+                logger.warning("Relevance gate could not sample the index; only GATE_MIN_SIMILARITY applies")
+            else:
+                partners = np.roll(np.arange(len(vectors)), 1)
+                pair_scores = np.einsum("ij,ij->i", vectors, vectors[partners])
+                mean, std = float(pair_scores.mean()), float(max(pair_scores.std(), 1e-6))
+                expected_best = mean + std * np.sqrt(2 * np.log(max(total, 2)))
+                self.background = {"mean": mean, "std": std, "pairs": len(pair_scores),
+                                   "chunks": total, "expected_best_unrelated": float(expected_best)}
+                self.margin = self.max_drop_z * std
+                self.auto_threshold = float(expected_best + self.min_z * std)
+                logger.info(f"Relevance gate calibrated on {len(pair_scores)} chunk pairs: background "
+                            f"{mean:.3f} +/- {std:.3f}, "
+                            + (f"threshold {self.threshold:.3f}" if self.min_similarity is not None else
+                               f"log-only until GATE_MIN_SIMILARITY is set (estimate {self.auto_threshold:.3f})"))
+            self._calibrated_key = key
+
+    def passes(self, similarities: Sequence[float]) -> bool:
+        """Record a probe retrieval and return False if nothing clears the threshold."""
+        top = float(np.max(similarities)) if len(similarities) else float("-inf")
+        with self._lock:
+            self.queries += 1
+            if np.isfinite(top):
+                self._top_scores.append(top)
+            if self.auto_threshold is not None and top < self.auto_threshold:
+                self.would_skip += 1
+            if not self.enabled or top >= self.threshold:
+                return True
+            self.skipped += 1
+            skip_rate = self.skipped / self.queries
+        logger.info(f"Early exit: best similarity {top:.3f} below threshold {self.threshold:.3f} "
+                    f"(skip rate {skip_rate:.1%} over {self.queries} queries)")
+        return False
+
+    def select(self, docs: List[str], similarities: Sequence[float],
+               rerank_scores: Optional[Sequence[float]] = None, cosine: bool = True) -> List[str]:
+        """
+        Keep the hits close enough to the best one and above the threshold.
+
+        Args:
+            docs (list): Retrieved chunks, most similar first.
+            similarities (sequence): Cosine similarity of each chunk.
+            rerank_scores (sequence, optional): Reranker scores (1-10); chunks
+                under MIN_RELEVANCE_SCORE are dropped as well. Chunks without a
+                score (None) are kept.
+            cosine (bool): False when the scores are not cosine similarities
+                (e.g. lexical scores), so only the reranker filter applies.
+
+        Returns:
+            list: The chunks worth sending to the LLM, possibly empty.
+        """
+        if not self.enabled or not cosine or not docs:
+            kept = list(docs)
+        else:
+            top = float(np.max(similarities))
+            floor = max(self.threshold, top - self.margin)
+            kept = [doc for doc, score in zip(docs, similarities) if score >= floor]
+
+        dropped = 0
+        if rerank_scores is not None:
+            scores = dict(zip(docs, rerank_scores))
+            reranked = [doc for doc in kept if scores[doc] is None or scores[doc] >= self.min_rerank_score]
+            dropped = len(kept) - len(reranked)
+            kept = reranked
+
+        with self._lock:
+            self.retrieved += len(docs)
+            self.selected += len(kept)
+            self.rerank_dropped += dropped
+        logger.info(f"Relevance gate kept {len(kept)} of {len(docs)} retrieved chunks")
+        return kept
+
+    def stats(self) -> dict:
+        with self._lock:
+            top_scores = np.array(self._top_scores)
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold if np.isfinite(self.threshold) else None,
+                "auto_threshold": self.auto_threshold,
+                "background": self.background,
+                "queries": self.queries,
+                "skipped": self.skipped,
+                "would_skip": self.would_skip,
+                "skip_rate": self.skipped / self.queries if self.queries else 0.0,
+                "mean_selected_k": self.selected / (self.queries - self.skipped) if self.queries > self.skipped else 0.0,
+                "selected_fraction": self.selected / self.retrieved if self.retrieved else 0.0,
+                "rerank_dropped": self.rerank_dropped,
+                # Percentiles of the best probe score, to tune GATE_MIN_SIMILARITY / GATE_MIN_Z
+                "top_score_percentiles": {
+                    str(p): float(np.percentile(top_scores, p)) for p in (10, 25, 50, 75, 90)
+                } if len(top_scores) else {}
+            }
+
+
+relevance_gate = RelevanceGate(
+    enabled=Config.GATE_ENABLED,
+    min_similarity=Config.GATE_MIN_SIMILARITY,
+    min_z=Config.GATE_MIN_Z,
+    max_drop_z=Config.GATE_MAX_DROP_Z,
+    min_rerank_score=Config.MIN_RELEVANCE_SCORE,
+    calibration_samples=Config.GATE_CALIBRATION_SAMPLES
+)
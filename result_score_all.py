@@ -1,105 +1,225 @@
-def calc_score_from_llm(retrieved_documents: list, question: str, llm) -> list[int]:
-    """
-    Score multiple documents in a single LLM call for efficiency
-    """
-    if not retrieved_documents:
-        return []
-    
-    # Build the batch prompt
-    prompt = f"""You are a highly reliable medical assistant.
-    Rate the relevance of each document below to the query on a scale of 1-10.
-    Consider the specific intent of the query.
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Dict, List, Optional, Tuple
 
-    Query: {question}
+from config import Config
+from utils.logger import setup_logger
+from utils.memory import register_component
+from admission import PipelineCancelled, cancelled
 
-    Please provide scores in this exact format: [score1, score2, score3, ...]
-    where each score is a number between 1 and 10.
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
 
+SCORE_PROMPT = """You are a highly reliable medical assistant.
+Rate the relevance of the document below to the query on a scale of 1-10.
+Consider the specific intent of the query.
+
+Query: {question}
+
+Document:
+{document}
+
+Respond with JSON only, in exactly this format: {{"score": <integer 1-10>}}"""
+
+
+# Marks a call that timed out, so it is reported but not cached
+_TIMED_OUT = object()
+
+
+def query_hash(question: str) -> str:
+    """Hash of the whitespace- and case-normalized query."""
+    return hashlib.sha256(" ".join(question.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id(document: str) -> str:
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_score(response: str) -> Optional[int]:
     """
-    
-    # Add each document with clear numbering
-    for i, doc in enumerate(retrieved_documents, 1):
-        prompt += f"\nDocument {i}:\n{doc}\n"
-    
-    prompt += "\nRelevance Scores (format: [score1, score2, score3, ...]):"
-    
-    # Get response from LLM
-    response = llm.invoke(prompt)
-    
-    # Extract scores from response
-    scores = extract_scores_from_batch_response(response, len(retrieved_documents))
-    
-    return scores
-
-def extract_scores_from_batch_response(response: str, num_docs: int) -> list[int]:
-    """
-    Extract numerical scores from LLM batch response
+    Extract the score from a `{"score": n}` reply.
+
+    A bare number is accepted as well. Returns None when the reply holds
+    neither, instead of guessing a score.
     """
-    import re
-    
-    # Try to find list format like [7, 8, 6, 9, 5]
-    list_match = re.search(r'\[([0-9,\s]+)\]', response)
-    if list_match:
-        numbers_str = list_match.group(1)
+    match = re.search(r"\{.*?\}", response, re.S)
+    if match:
         try:
-            scores = [int(x.strip()) for x in numbers_str.split(',')]
-            if len(scores) == num_docs:
-                return [max(1, min(10, score)) for score in scores]  # Clamp to 1-10
-        except ValueError:
+            score = json.loads(match.group(0)).get("score")
+            return max(1, min(10, int(score)))
+        except (ValueError, TypeError, AttributeError):
             pass
-    
-    # Fallback: find individual numbers in order
-    numbers = re.findall(r'\b([1-9]|10)\b', response)
-    if len(numbers) >= num_docs:
-        scores = [int(num) for num in numbers[:num_docs]]
-        return scores
-    
-    # Last resort: default scores
-    print(f"Warning: Could not parse scores from response. Using default scores.")
-    return [5] * num_docs  # Default to middle score
-
-# Alternative version if you want to keep your existing extract function
-def calc_score_from_llm_alternative(retrieved_documents: list, question: str, llm) -> list[int]:
+    match = re.fullmatch(r"\s*(10|[1-9])\s*", response)
+    return int(match.group(1)) if match else None
+
+
+class RelevanceScorer:
     """
-    Alternative version using your existing get_num function
+    Scores retrieved documents against a query, one small LLM call per document.
+
+    Calls run in parallel on `workers` threads, shared by all requests. The
+    LLM enforces the timeout of each call (e.g. `llm_router.stage("score",
+    timeout=...)`), counted from when this scorer hands it over, so waiting
+    here for a worker is free but waiting for a router thread is not. An
+    optional deadline bounds the whole request: calls not answered by then
+    are given up. Scores are cached per (query hash, chunk id), so repeated
+    or overlapping queries only score chunks not seen before. Timed-out and
+    unparseable calls yield None and are not cached.
     """
-    if not retrieved_documents:
-        return []
-    
-    prompt = f"""You are a highly reliable medical assistant.
-Rate the relevance of each document below to the query on a scale of 1-10.
-Consider the specific intent of the query.
 
-Query: {question}
+    def __init__(self, workers: int, cache_size: int):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.unparsed = 0
+
+    def score(self, documents: List[str], question: str, llm,
+              deadline: Optional[float] = None) -> List[Optional[int]]:
+        """
+        Score each document for relevance to `question`.
+
+        Args:
+            documents (list): Retrieved chunks.
+            question (str): User query.
+            llm: Runnable LLM returning a message or text, raising `TimeoutError`
+                when a call exceeds its timeout (e.g. a router stage).
+            deadline (float, optional): `time.monotonic()` by which all
+                scores are due; documents still unscored then get None.
+
+        Returns:
+            list: A 1-10 score per document, None where no score was obtained.
+        """
+        if not documents:
+            return []
+
+        question_key = query_hash(question)
+        keys = [(question_key, chunk_id(document)) for document in documents]
+        scores: Dict[Tuple[str, str], Optional[int]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+            self.hits += len(scores)
+            # Duplicate chunks in one request are scored once
+            pending = {key: document for key, document in zip(keys, documents) if key not in scores}
+            self.misses += len(pending)
+
+        if pending:
+            scores.update(self._score_pending(pending, question, llm, deadline))
+        logger.info(f"Scored {len(documents)} documents ({len(documents) - len(pending)} cached)")
+        return [scores.get(key) for key in keys]
+
+    def _score_pending(self, pending: Dict[Tuple[str, str], str], question: str, llm,
+                       deadline: Optional[float]) -> Dict[Tuple[str, str], Optional[int]]:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="score")
+
+        # Keep the request id on log records emitted by the scoring calls
+        futures = {
+            self._executor.submit(contextvars.copy_context().run, self._score_one, document, question, llm): key
+            for key, document in pending.items()
+        }
+        # Every call is bounded by its own timeout; the deadline bounds the waves of calls queued here
+        done, _ = wait(futures, timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        results, given_up = {}, 0
+        for future, key in futures.items():
+            if future in done:
+                results[key] = future.result()
+            else:
+                # Calls already running end on their own timeout, which counts them, and are dropped
+                given_up += future.cancel()
+                results[key] = _TIMED_OUT
+        if given_up:
+            with self._lock:
+                self.timeouts += given_up
+        timed_out = sum(score is _TIMED_OUT for score in results.values())
+        results = {key: None if score is _TIMED_OUT else score for key, score in results.items()}
+        with self._lock:
+            for key, score in results.items():
+                if score is not None:
+                    self._cache[key] = score
+                    self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        if timed_out:
+            logger.warning(f"Relevance scoring timed out for {timed_out} of {len(futures)} documents")
+        return results
+
+    def _score_one(self, document: str, question: str, llm) -> Optional[int]:
+        if cancelled():
+            return None
+        try:
+            response = llm.invoke(SCORE_PROMPT.format(question=question, document=document))
+        except PipelineCancelled:
+            return None
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            return _TIMED_OUT
+        except Exception as error:
+            with self._lock:
+                self.failures += 1
+            logger.warning(f"Relevance scoring call failed: {type(error).__name__}: {error}")
+            return None
+        response = getattr(response, "content", response)  # Chat models return a message
+        score = parse_score(response)
+        if score is None:
+            with self._lock:
+                self.unparsed += 1
+            logger.warning(f"Could not parse a relevance score from: {response[:200]!r}")
+        return score
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def footprint(self) -> dict:
+        with self._lock:
+            # Keys are pairs of 16-character hashes; scores are small interned ints
+            entry = sys.getsizeof(("", "")) + 2 * sys.getsizeof("0" * 16)
+            return {"bytes": len(self._cache) * entry + sys.getsizeof(self._cache), "entries": len(self._cache)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache_size": len(self._cache),
+                "max_cache_size": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+                "unparsed": self.unparsed
+            }
+
 
-"""
-    
-    for i, doc in enumerate(retrieved_documents, 1):
-        prompt += f"\nDocument {i}:\n{doc}\n"
-    
-    prompt += """
-Please provide scores in this format:
-Document 1: X out of 10
-Document 2: Y out of 10
-Document 3: Z out of 10
-(and so on...)
-
-Relevance Scores:"""
-    
-    response = llm.invoke(prompt)
-    
-    # Use your existing get_num function to extract each score
-    lines = response.split('\n')
-    scores = []
-    
-    for line in lines:
-        if 'out of 10' in line.lower():
-            score = get_num(line)  # Your existing function
-            if score is not None:
-                scores.append(score)
-    
-    # Ensure we have the right number of scores
-    while len(scores) < len(retrieved_documents):
-        scores.append(5)  # Default score
-    
-    return scores[:len(retrieved_documents)]
\ No newline at end of file
+relevance_scorer = RelevanceScorer(
+    workers=Config.SCORE_WORKERS,
+    cache_size=Config.SCORE_CACHE_SIZE
+)
+
+register_component("relevance_score_cache", relevance_scorer.footprint)
+
+
+def calc_score_from_llm(retrieved_documents: list, question: str, llm,
+                        deadline: Optional[float] = None) -> List[Optional[int]]:
+    """
+    Score each retrieved document's relevance (1-10) with parallel, cached LLM calls.
+    """
+    return relevance_scorer.score(retrieved_documents, question, llm, deadline)
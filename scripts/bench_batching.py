@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from micro_batcher import MicroBatcher
+from transformers_embed import get_model
+
+
+def run_load(encode, queries, concurrency: int):
+    latencies = []
+
+    def timed(query):
+        start = time.perf_counter()
+        encode(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, queries))
+    return len(queries) / (time.perf_counter() - start), np.array(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query-encoding throughput with and without micro-batching")
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    model = get_model()
+    queries = [f"What is the effect of treatment {i} on Parkinson's disease progression?" for i in range(args.queries)]
+    model.encode(queries[:8])  # Warm up
+
+    rows = [("unbatched", *run_load(lambda q: model.encode(q, convert_to_numpy=True), queries, args.concurrency), None)]
+    for max_batch in args.max_batch:
+        batcher = MicroBatcher(lambda texts: model.encode(texts, batch_size=len(texts), convert_to_numpy=True),
+                               max_batch, args.max_wait_ms)
+        throughput, latency = run_load(batcher.encode, queries, args.concurrency)
+        rows.append((f"batch<={max_batch}, {args.max_wait_ms:g} ms", throughput, latency, batcher.stats()))
+
+    print(f"\n{args.queries} queries, {args.concurrency} concurrent callers")
+    print(f"{'setup':<22}{'queries/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'mean batch':>12}{'fill':>7}")
+    for name, throughput, latency, stats in rows:
+        mean_batch = f"{stats['mean_batch_size']:.1f}" if stats else "1.0"
+        fill = f"{stats['fill_ratio']:.2f}" if stats else "-"
+        print(f"{name:<22}{throughput:>11.1f}{np.percentile(latency, 50):>9.1f}"
+              f"{np.percentile(latency, 95):>9.1f}{mean_batch:>12}{fill:>7}")
@@ -0,0 +1,79 @@
+"""
+Report the pipeline's memory footprint per component and per stage.
+
+Builds the index, runs the gold-set questions through retrieval (or the
+whole pipeline with `--full`, which calls the configured LLMs) and prints
+the process RSS next to what each registered component accounts for.
+The gap between the two is memory no probe explains: allocator slack,
+interpreter and library overhead, or a copy nobody registered.
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.memory import enable_stage_tracing, memory_report, track_stage
+
+
+def mb(value) -> str:
+    return f"{value / 2 ** 20:.1f}" if value is not None else "-"
+
+
+def print_report(report: dict):
+    process = report["process"]
+    print(f"\nRSS {mb(process['rss_bytes'])} MB, peak {mb(process['peak_rss_bytes'])} MB, "
+          f"accounted {mb(report['accounted_bytes'])} MB")
+    print(f"\n{'component':<24}{'MB':>10}{'mapped MB':>12}{'external MB':>13}  details")
+    for name, component in sorted(report["components"].items(), key=lambda item: -(item[1].get("bytes") or 0)):
+        details = {key: value for key, value in component.items()
+                   if key not in ("bytes", "mapped_bytes", "external_bytes", "versions")}
+        print(f"{name:<24}{mb(component.get('bytes')):>10}{mb(component.get('mapped_bytes')):>12}"
+              f"{mb(component.get('external_bytes')):>13}  {json.dumps(details) if details else ''}")
+    print(f"\n{'stage':<16}{'calls':>7}{'RSS growth MB':>15}{'traced peak MB':>16}{'overlapped':>12}{'total s':>10}")
+    for name, stage in report["stages"].items():
+        print(f"{name:<16}{stage['calls']:>7}{mb(stage['max_rss_growth_bytes']):>15}"
+              f"{mb(stage['max_traced_peak_bytes']):>16}{stage['traced_overlapped']:>12}{stage['total_seconds']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory footprint per component and pipeline stage")
+    parser.add_argument("--gold", default=os.path.join("data", "gold_retrieval.jsonl"))
+    parser.add_argument("--queries", type=int, default=50, help="Gold questions to run")
+    parser.add_argument("--full", action="store_true", help="Run the whole pipeline, including LLM calls")
+    parser.add_argument("--trace", action="store_true",
+                        help="Trace Python/numpy allocation peaks per stage (slower)")
+    parser.add_argument("--output", help="Also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    if args.trace:
+        enable_stage_tracing()
+    # Imported after tracing starts so the index build is traced as well
+    import main as pipeline
+
+    with open(args.gold, encoding="utf-8") as f:
+        questions = [json.loads(line)["question"] for line in f if line.strip()][:args.queries]
+
+    # Measured against the dense index, so build it up front instead of serving BM25 meanwhile
+    pipeline.Config.PROGRESSIVE_INDEX = False
+    version = pipeline.index_manager.current()
+    if version is None:
+        raise SystemExit("Could not load the corpus; check FILE_PATH / CORPUS_DB")
+    print(f"Index version {version.number}: {len(version.chunks)} chunks")
+    before = memory_report()["process"]["rss_bytes"]
+
+    for question in questions:
+        if args.full:
+            pipeline.main(question)
+        else:
+            with pipeline.index_manager.acquire() as pinned, track_stage("retrieve"):
+                pipeline.retrieve_documents(question, pinned)
+
+    report = memory_report()
+    print_report(report)
+    if before is not None and report["process"]["rss_bytes"] is not None:
+        print(f"\nRSS grew {mb(report['process']['rss_bytes'] - before)} MB over {len(questions)} questions")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from vector_index import QuantizedIndex, normalize_rows, top_k
+
+
+def synthetic_embeddings(n: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Clustered Gaussian vectors, closer to real sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, n)
+    return centers[assignment] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def load_store_embeddings(path: str) -> np.ndarray:
+    from config import Config
+    from corpus_store import CorpusStore
+
+    store = CorpusStore(path)
+    embeddings = store.load_embeddings(store.load_chunks()['id'], Config.TRANSFORMER_MODEL)
+    if embeddings is None:
+        raise SystemExit(f"{path} has no complete set of embeddings; run the pipeline or sync first")
+    return embeddings
+
+
+def time_queries(search, queries: np.ndarray):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory, latency and recall of quantized vs exact retrieval")
+    parser.add_argument("--n", type=int, default=200000, help="Number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=10)
+    parser.add_argument("--store", default=None, help="Benchmark the embeddings saved in a corpus store instead")
+    args = parser.parse_args()
+
+    embeddings = load_store_embeddings(args.store) if args.store else synthetic_embeddings(args.n, args.dim)
+    normalized = normalize_rows(embeddings)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors, like a paraphrase of a stored passage
+    picks = rng.integers(0, len(normalized), args.queries)
+    queries = normalized[picks] + 0.3 * rng.standard_normal((args.queries, normalized.shape[1])).astype(np.float32)
+
+    exact_results, exact_latency = time_queries(lambda q: top_k(normalized @ normalize_rows(q), args.k), queries)
+    rows = [("float32 exact", normalized.nbytes, exact_latency, 1.0)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("int8", "binary"):
+            index = QuantizedIndex.build(embeddings, mode, os.path.join(tmp, mode), rescore_factor=args.rescore_factor)
+            results, latency = time_queries(lambda q: index.search(q, args.k)[0], queries)
+            recall = np.mean([len(set(got) & set(want)) / len(want) for got, want in zip(results, exact_results)])
+            rows.append((f"{mode} + rescore x{args.rescore_factor}", index.nbytes, latency, recall))
+
+    print(f"\n{len(normalized)} vectors x {normalized.shape[1]} dims, {args.queries} queries, k={args.k}")
+    print(f"{'mode':<24}{'memory MB':>12}{'p50 ms':>10}{'p95 ms':>10}{'recall@k':>10}")
+    for name, nbytes, latency, recall in rows:
+        print(f"{name:<24}{nbytes / 1e6:>12.1f}{np.percentile(latency, 50):>10.2f}"
+              f"{np.percentile(latency, 95):>10.2f}{recall:>10.3f}")
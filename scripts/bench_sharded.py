@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sharded_index import ShardedIndex
+from vector_index import normalize_rows, top_k
+
+
+def measure(search, queries: np.ndarray) -> np.ndarray:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval latency of scatter-gather shards vs one process")
+    parser.add_argument("--n", type=int, default=500000, help="Number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--shards", type=int, nargs="+", default=None,
+                        help="Shard counts to test (default: powers of two up to the core count)")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    shard_counts = args.shards or [2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores]
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.n, args.dim)).astype(np.float32)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    normalized = normalize_rows(embeddings)
+    baseline = measure(lambda q: top_k(normalized @ normalize_rows(q), args.k), queries)
+    rows = [("single process", baseline)]
+    del normalized
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in shard_counts:
+            index = ShardedIndex(embeddings, shards, os.path.join(tmp, str(shards)))
+            index.search(queries[0], args.k)  # Warm up the workers
+            rows.append((f"{shards} shards", measure(lambda q: index.search(q, args.k), queries)))
+            index.close()
+
+    print(f"\n{args.n} vectors x {args.dim} dims, {args.queries} queries, k={args.k}, {cores} cores")
+    print(f"{'setup':<18}{'p50 ms':>10}{'p95 ms':>10}{'speedup':>10}")
+    base_p50 = np.percentile(baseline, 50)
+    for name, latency in rows:
+        p50 = np.percentile(latency, 50)
+        print(f"{name:<18}{p50:>10.2f}{np.percentile(latency, 95):>10.2f}{base_p50 / p50:>10.2f}")
@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules that must only be imported once their backend is actually used
+HEAVY_MODULES = ("torch", "sentence_transformers", "chromadb", "langchain_groq", "langchain_ollama")
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    """Import `module` in a fresh interpreter and report the time and heavy modules it pulled in."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold import time of the pipeline entry points")
+    parser.add_argument("--modules", nargs="+", default=["main", "app"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=3.0,
+                        help="Fail if the median import time of any module exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<12}{'median s':>10}{'max s':>10}  eagerly imported backends")
+    for module in args.modules:
+        runs = [measure_import(module) for _ in range(args.runs)]
+        seconds = np.array([run["seconds"] for run in runs])
+        heavy = sorted(set().union(*(run["heavy"] for run in runs)))
+        print(f"{module:<12}{np.median(seconds):>10.2f}{seconds.max():>10.2f}  {', '.join(heavy) or '-'}")
+        if np.median(seconds) > args.max_seconds or heavy:
+            failed = True
+
+    if failed:
+        print(f"\nStartup regression: imports must stay under {args.max_seconds:.1f}s "
+              f"without loading {', '.join(HEAVY_MODULES)}")
+        sys.exit(1)
@@ -0,0 +1,69 @@
+"""
+Fit the relevance gate threshold on labelled on- and off-topic questions.
+
+On-topic questions come from the retrieval gold set, off-topic ones from a
+plain text file (one per line). Each question is probed against the
+pipeline's reference index exactly like `main.main` does before any LLM
+call, and the threshold with the best balanced accuracy is reported next
+to the chunk-pair estimate. The gate only exits early once the fitted
+value is set as GATE_MIN_SIMILARITY.
+"""
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import main as pipeline
+from relevance_gate import relevance_gate
+
+
+def probe_scores(questions, version) -> np.ndarray:
+    return np.array([
+        max(pipeline.retrieve_documents(question, version, k=1)[1], default=float("-inf"))
+        for question in questions
+    ])
+
+
+def balanced_accuracy(on_topic: np.ndarray, off_topic: np.ndarray, threshold: float) -> float:
+    return 0.5 * (np.mean(on_topic >= threshold) + np.mean(off_topic < threshold))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate GATE_MIN_SIMILARITY on labelled questions")
+    parser.add_argument("--gold", default=os.path.join("data", "gold_retrieval.jsonl"))
+    parser.add_argument("--off-topic", default=os.path.join("data", "offtopic_queries.txt"))
+    args = parser.parse_args()
+
+    with open(args.gold, encoding="utf-8") as f:
+        on_topic_questions = [json.loads(line)["question"] for line in f if line.strip()]
+    with open(args.off_topic, encoding="utf-8") as f:
+        off_topic_questions = [line.strip() for line in f if line.strip()]
+
+    # Measured against the dense index, so build it up front instead of serving BM25 meanwhile
+    pipeline.Config.PROGRESSIVE_INDEX = False
+    version = pipeline.index_manager.current()
+    if version is None:
+        raise SystemExit("Could not load the corpus; check FILE_PATH / CORPUS_DB")
+    relevance_gate.ensure_calibrated(version.reference_embeddings)
+
+    on_topic = probe_scores(on_topic_questions, version)
+    off_topic = probe_scores(off_topic_questions, version)
+
+    candidates = np.unique(np.concatenate([on_topic, off_topic]))
+    midpoints = (candidates[:-1] + candidates[1:]) / 2 if len(candidates) > 1 else candidates
+    best = max(midpoints, key=lambda t: (balanced_accuracy(on_topic, off_topic, t), -abs(t - np.median(midpoints))))
+
+    print(f"\nBest-hit similarity of {len(on_topic)} on-topic and {len(off_topic)} off-topic questions")
+    for name, scores in (("on-topic", on_topic), ("off-topic", off_topic)):
+        print(f"  {name:<10} min {scores.min():.3f}  p50 {np.median(scores):.3f}  max {scores.max():.3f}")
+    if relevance_gate.auto_threshold is not None:
+        auto = relevance_gate.auto_threshold
+        print(f"\nChunk-pair estimate {auto:.3f} (log-only): balanced accuracy "
+              f"{balanced_accuracy(on_topic, off_topic, auto):.3f}, "
+              f"on-topic kept {np.mean(on_topic >= auto):.1%}, off-topic skipped {np.mean(off_topic < auto):.1%}")
+    print(f"Fitted threshold {best:.3f}: balanced accuracy {balanced_accuracy(on_topic, off_topic, best):.3f}, "
+          f"on-topic kept {np.mean(on_topic >= best):.1%}, off-topic skipped {np.mean(off_topic < best):.1%}")
+    print(f"\nTo use the fitted value: GATE_MIN_SIMILARITY={best:.3f}")
@@ -0,0 +1,198 @@
+"""
+Offline retrieval evaluation and parameter sweep.
+
+Chunks a corpus with every chunk size / overlap combination, builds each
+retrieval mode over the embeddings and scores a gold set of
+(question, relevant PMIDs) pairs. For each setting it reports recall@k,
+MRR, build time, index size, query latency and the context tokens the
+retrieved chunks would cost, then recommends a Pareto-optimal setting.
+
+Questions are embedded as written, without the LLM query rewrite the
+pipeline applies, so the numbers isolate the retrieval stage.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from bulk_embed import bulk_embed
+from context_packing import estimate_tokens
+from corpus_store import CorpusStore, clean_abstract
+from text_split import split_into_chunks
+from transformers_embed import get_model
+from vector_index import QuantizedIndex, normalize_rows, top_k
+
+MODES = ("float32", "int8", "binary")
+
+# Objectives for the Pareto front: +1 is better when higher, -1 when lower
+OBJECTIVES = {"recall": 1, "mrr": 1, "latency_ms": -1, "index_bytes": -1, "context_tokens": -1}
+
+
+def load_pubmed_text(path: str) -> List[Tuple[str, str]]:
+    """Split a PubMed text export into (pmid, cleaned article text); each record ends at its PMID line."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    articles = []
+    previous_end = 0
+    for match in re.finditer(r"^PMID: (\d+)", text, re.M):
+        article = clean_abstract(text[previous_end:match.start()])
+        previous_end = match.end()
+        if article:
+            articles.append((match.group(1), article))
+    return articles
+
+
+def load_store_articles(path: str) -> List[Tuple[str, str]]:
+    columns = CorpusStore(path).load_articles(("pmid", "text"))
+    return [(pmid, text) for pmid, text in zip(columns["pmid"], columns["text"]) if text]
+
+
+def load_gold(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def chunk_articles(articles: List[Tuple[str, str]], chunk_size: int, chunk_overlap: int) -> Tuple[List[str], List[str]]:
+    chunks, chunk_pmids = [], []
+    for pmid, text in articles:
+        for chunk in split_into_chunks(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap):
+            chunks.append(chunk)
+            chunk_pmids.append(pmid)
+    return chunks, chunk_pmids
+
+
+def build_mode(mode: str, embeddings: np.ndarray, path: str):
+    """Return (search function, resident bytes) for one retrieval mode."""
+    if mode == "float32":
+        normalized = normalize_rows(embeddings)
+
+        def search(query, k):
+            scores = normalized @ normalize_rows(query)
+            return top_k(scores, k)
+        return search, normalized.nbytes
+
+    index = QuantizedIndex.build(embeddings, mode, os.path.join(path, mode))
+    return (lambda query, k: index.search(query, k)[0]), index.nbytes
+
+
+def score_queries(search, query_embeddings: np.ndarray, gold: List[Dict], chunks: List[str],
+                  chunk_pmids: List[str], k: int) -> Dict:
+    recalls, reciprocal_ranks, latencies, tokens = [], [], [], []
+    for query, item in zip(query_embeddings, gold):
+        relevant = set(item["pmids"])
+        start = time.perf_counter()
+        ranked = search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        retrieved = [chunk_pmids[i] for i in ranked]
+        recalls.append(len(relevant & set(retrieved)) / len(relevant))
+        first_hit = next((rank for rank, pmid in enumerate(retrieved, 1) if pmid in relevant), None)
+        reciprocal_ranks.append(1.0 / first_hit if first_hit else 0.0)
+        tokens.append(sum(estimate_tokens(chunks[i]) for i in ranked))
+
+    return {
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency_ms": float(np.percentile(latencies, 50)),
+        "context_tokens": float(np.mean(tokens))
+    }
+
+
+def pareto_front(rows: List[Dict]) -> List[Dict]:
+    """Rows not dominated on every objective by some other row."""
+    def dominates(a, b):
+        at_least_as_good = all(sign * (a[key] - b[key]) >= 0 for key, sign in OBJECTIVES.items())
+        strictly_better = any(sign * (a[key] - b[key]) > 0 for key, sign in OBJECTIVES.items())
+        return at_least_as_good and strictly_better
+    return [row for row in rows if not any(dominates(other, row) for other in rows)]
+
+
+def recommend(front: List[Dict], min_recall: float) -> Dict:
+    """Cheapest front member reaching `min_recall`, else the one with the best recall."""
+    eligible = [row for row in front if row["recall"] >= min_recall]
+    if not eligible:
+        return max(front, key=lambda row: (row["recall"], row["mrr"]))
+    return min(eligible, key=lambda row: (row["context_tokens"], row["latency_ms"], row["index_bytes"], -row["mrr"]))
+
+
+def run_sweep(articles, gold, chunk_sizes, overlaps, top_ks, modes) -> List[Dict]:
+    model = get_model()
+    query_embeddings = np.asarray(model.encode([item["question"] for item in gold], convert_to_numpy=True))
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for chunk_size in chunk_sizes:
+            for chunk_overlap in overlaps:
+                if chunk_overlap >= chunk_size:
+                    continue
+                chunks, chunk_pmids = chunk_articles(articles, chunk_size, chunk_overlap)
+                start = time.perf_counter()
+                embeddings = bulk_embed(chunks, model=model)
+                embed_seconds = time.perf_counter() - start
+                print(f"chunk_size={chunk_size} overlap={chunk_overlap}: {len(chunks)} chunks embedded in {embed_seconds:.1f}s")
+
+                for mode in modes:
+                    start = time.perf_counter()
+                    search, index_bytes = build_mode(mode, embeddings, os.path.join(tmp, f"{chunk_size}_{chunk_overlap}"))
+                    build_seconds = embed_seconds + time.perf_counter() - start
+                    for k in top_ks:
+                        metrics = score_queries(search, query_embeddings, gold, chunks, chunk_pmids, k)
+                        rows.append({
+                            "chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "mode": mode, "top_k": k,
+                            "chunks": len(chunks), "build_seconds": build_seconds, "index_bytes": index_bytes,
+                            **metrics
+                        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep chunking, top-k and index modes against a gold retrieval set")
+    parser.add_argument("--corpus", default=os.path.join("data", "abstracts_park.txt"), help="PubMed text export")
+    parser.add_argument("--store", default=None, help="Evaluate over the articles of a corpus store instead")
+    parser.add_argument("--gold", default=os.path.join("data", "gold_retrieval.jsonl"),
+                        help="JSONL lines of {\"question\": ..., \"pmids\": [...]}")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[300, 600, 1000])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 100, 300])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--min-recall", type=float, default=None,
+                        help="Recall the recommendation must reach (default: 90%% of the best observed)")
+    parser.add_argument("--output", default=None, help="Write all rows and the recommendation as JSON")
+    args = parser.parse_args()
+
+    articles = load_store_articles(args.store) if args.store else load_pubmed_text(args.corpus)
+    gold = load_gold(args.gold)
+    print(f"{len(articles)} articles, {len(gold)} gold questions")
+
+    rows = run_sweep(articles, gold, args.chunk_sizes, args.overlaps, args.top_k, args.modes)
+    front = pareto_front(rows)
+    min_recall = args.min_recall if args.min_recall is not None else 0.9 * max(row["recall"] for row in rows)
+    best = recommend(front, min_recall)
+
+    print(f"\n{'size':>5}{'overlap':>8}{'mode':>8}{'k':>4}{'recall':>8}{'MRR':>7}{'build s':>9}"
+          f"{'index MB':>10}{'p50 ms':>8}{'ctx tok':>9}  pareto")
+    for row in sorted(rows, key=lambda r: (-r["recall"], -r["mrr"], r["context_tokens"])):
+        print(f"{row['chunk_size']:>5}{row['chunk_overlap']:>8}{row['mode']:>8}{row['top_k']:>4}"
+              f"{row['recall']:>8.3f}{row['mrr']:>7.3f}{row['build_seconds']:>9.1f}"
+              f"{row['index_bytes'] / 1e6:>10.2f}{row['latency_ms']:>8.2f}{row['context_tokens']:>9.0f}"
+              f"  {'*' if row in front else ''}")
+
+    print(f"\nRecommended (Pareto-optimal, recall >= {min_recall:.3f}, fewest context tokens):")
+    print(f"  CHUNK_SIZE={best['chunk_size']}")
+    print(f"  CHUNK_OVERLAP={best['chunk_overlap']}")
+    print(f"  RETRIEVE_TOP_K={best['top_k']}")
+    print(f"  INDEX_STORAGE={best['mode']}")
+    print(f"  -> recall@{best['top_k']}={best['recall']:.3f}, MRR={best['mrr']:.3f}, "
+          f"{best['latency_ms']:.2f} ms, {best['index_bytes'] / 1e6:.2f} MB, {best['context_tokens']:.0f} context tokens")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"rows": rows, "pareto_front": front, "recommendation": best,
+                       "model": Config.TRANSFORMER_MODEL}, f, indent=2)
@@ -0,0 +1,160 @@
+"""
+Ingest a directory or glob of corpus files into the corpus store.
+
+Each file is read, hashed, parsed (PubMed "Abstract" text exports, or one
+document per paragraph otherwise), cleaned and chunked in a process pool.
+The main process merges the results into the SQLite store, recording which
+file every article came from, and embeds the new chunks. Files whose
+content hash is already recorded are skipped, so re-running the command
+over a growing export directory only processes new or changed files.
+A running service picks the merged corpus up on its next index reload.
+"""
+import os
+import sys
+import glob
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from corpus_store import CorpusStore, prepare_article
+from utils.doc_parser import parse_pubmed_export
+from utils.logger import setup_logger
+from pubmed_sync import index_new_chunks
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+
+def expand_paths(patterns: List[str], extensions: List[str]) -> List[str]:
+    """Resolve directories (searched recursively) and glob patterns to a sorted list of files."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                paths.update(os.path.join(root, name) for name in files if name.endswith(tuple(extensions)))
+        else:
+            paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(os.path.abspath(path) for path in paths)
+
+
+def prepare_file(path: str, known_hash: Optional[str], chunk_size: int, chunk_overlap: int) -> Dict:
+    """
+    Hash, parse, clean and chunk one file; runs in a worker process.
+
+    Returns:
+        Dict: 'path', 'content_hash', 'size' and 'seconds', plus 'articles'
+        (prepared rows) unless the file is unchanged since its last ingestion.
+    """
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        data = f.read()
+    result = {'path': path, 'content_hash': hashlib.sha256(data).hexdigest(), 'size': len(data)}
+    if result['content_hash'] != known_hash:
+        articles = parse_pubmed_export(data.decode('utf-8', errors='replace'))
+        result['articles'] = [prepare_article(article, chunk_size, chunk_overlap) for article in articles]
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def ingest(store: CorpusStore, paths: List[str], workers: int, force: bool = False) -> List[Dict]:
+    """
+    Prepare files in parallel and merge them into `store` as they complete.
+
+    Returns:
+        List[Dict]: Per-file report with 'status' ('added', 'unchanged',
+        'duplicate' or 'failed'), counts and timings.
+    """
+    known = {} if force else {path: store.get_source(path) for path in paths}
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(prepare_file, path, (known.get(path) or {}).get('content_hash'),
+                            store.chunk_size, store.chunk_overlap): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                logger.error(f"Ingesting {path} failed: {type(error).__name__}: {error}")
+                reports.append({'path': path, 'status': 'failed', 'error': str(error)})
+                continue
+            report = {'path': path, 'size': result['size'], 'seconds': result['seconds'],
+                      'articles': 0, 'new_articles': [], 'chunks': 0}
+            source = {key: result[key] for key in ('path', 'content_hash', 'size')}
+            if 'articles' not in result:
+                report.update(status='unchanged', articles=known[path]['articles'])
+            elif not force and (copy := store.get_source(content_hash=result['content_hash'])) is not None:
+                # Same export saved under another name: link its articles without parsing them again
+                store.copy_source(copy['path'], source)
+                report.update(status='duplicate', articles=copy['articles'])
+            else:
+                report['new_articles'] = store.add_prepared(result['articles'], source=source)
+                added = set(report['new_articles'])
+                report.update(status='added', articles=len(result['articles']), chunks=sum(
+                    len(article['chunks']) for article in result['articles'] if article['row'][0] in added
+                ))
+            reports.append(report)
+            logger.info(f"{os.path.basename(path)}: {report['status']}, {report['articles']} articles, "
+                        f"{len(report['new_articles'])} new")
+    return reports
+
+
+def print_report(reports: List[Dict], wall_seconds: float, embed_seconds: float, embedded: int):
+    print(f"\n{'file':<40}{'status':>10}{'MB':>8}{'articles':>10}{'new':>6}{'chunks':>8}{'s':>7}{'MB/s':>8}")
+    for report in sorted(reports, key=lambda report: report['path']):
+        if report['status'] == 'failed':
+            print(f"{os.path.basename(report['path'])[:39]:<40}{'failed':>10}  {report['error']}")
+            continue
+        mb = report['size'] / 2 ** 20
+        print(f"{os.path.basename(report['path'])[:39]:<40}{report['status']:>10}{mb:>8.2f}{report['articles']:>10}"
+              f"{len(report['new_articles']):>6}{report['chunks']:>8}{report['seconds']:>7.2f}"
+              f"{mb / report['seconds'] if report['seconds'] else 0:>8.1f}")
+
+    processed = [report for report in reports if report['status'] != 'failed']
+    total_mb = sum(report['size'] for report in processed) / 2 ** 20
+    new_articles = sum(len(report['new_articles']) for report in processed)
+    chunks = sum(report['chunks'] for report in processed)
+    worker_seconds = sum(report['seconds'] for report in processed)
+    print(f"\n{len(reports)} files ({sum(report['status'] == 'added' for report in reports)} ingested, "
+          f"{sum(report['status'] in ('unchanged', 'duplicate') for report in reports)} skipped, "
+          f"{sum(report['status'] == 'failed' for report in reports)} failed), {total_mb:.1f} MB "
+          f"in {wall_seconds:.1f}s: {total_mb / wall_seconds if wall_seconds else 0:.1f} MB/s, "
+          f"{new_articles / wall_seconds if wall_seconds else 0:.0f} new articles/s, "
+          f"{chunks / wall_seconds if wall_seconds else 0:.0f} chunks/s "
+          f"(parallel speed-up {worker_seconds / wall_seconds if wall_seconds else 0:.1f}x)")
+    if embedded:
+        print(f"Embedded {embedded} chunks in {embed_seconds:.1f}s ({embedded / embed_seconds:.0f} chunks/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest corpus files from a directory or glob into the corpus store")
+    parser.add_argument("paths", nargs="+", help="Directories (searched recursively) or glob patterns")
+    parser.add_argument("--store", default=Config.CORPUS_DB or "./data/corpus.db")
+    parser.add_argument("--extensions", nargs="+", default=[".txt"], help="File extensions picked up in directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="Re-parse files even if their content is unchanged")
+    parser.add_argument("--no-embed", action="store_true",
+                        help="Leave embedding the new chunks to the service's next index build")
+    args = parser.parse_args()
+
+    paths = expand_paths(args.paths, args.extensions)
+    if not paths:
+        raise SystemExit(f"No corpus files found in {' '.join(args.paths)}")
+    store = CorpusStore(args.store)
+    print(f"Ingesting {len(paths)} files into {args.store} with {args.workers} workers")
+
+    start = time.perf_counter()
+    reports = ingest(store, paths, args.workers, force=args.force)
+    wall_seconds = time.perf_counter() - start
+
+    embed_start, embedded = time.perf_counter(), 0
+    new_pmids = [pmid for report in reports for pmid in report.get('new_articles', [])]
+    if new_pmids and not args.no_embed:
+        embedded = index_new_chunks(store, new_pmids)
+    print_report(reports, wall_seconds, time.perf_counter() - embed_start, embedded)
+    print(f"Corpus store now holds {store.count()}")
@@ -0,0 +1,108 @@
+"""
+Minimal local stand-in for NCBI E-utilities (esearch + efetch with history),
+used to exercise the harvester without touching the real service.
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+
+def _article_xml(pmid: int) -> str:
+    year = 2000 + pmid % 25
+    return f"""<PubmedArticle>
+  <MedlineCitation>
+    <PMID>{pmid}</PMID>
+    <Article>
+      <Journal><Title>{escape(f"Journal {pmid % 7}")}</Title>
+        <JournalIssue><PubDate><Year>{year}</Year></PubDate></JournalIssue>
+      </Journal>
+      <ArticleTitle>Synthetic article {pmid}</ArticleTitle>
+      <Abstract><AbstractText>Synthetic abstract {pmid} about Parkinson's disease treatment.</AbstractText></Abstract>
+      <AuthorList><Author><LastName>Doe</LastName><ForeName>Jane</ForeName></Author></AuthorList>
+      <PublicationTypeList><PublicationType>Journal Article</PublicationType></PublicationTypeList>
+    </Article>
+  </MedlineCitation>
+</PubmedArticle>"""
+
+
+class MockEUtilsHandler(BaseHTTPRequestHandler):
+    """Serves a fixed synthetic result set of `server.count` records"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.record_request(url.path)
+
+        if self.server.fail_every and self.server.request_count % self.server.fail_every == 0:
+            self._send(429, "text/plain", "Too Many Requests")
+        elif url.path.endswith("esearch.fcgi"):
+            body = {"esearchresult": {
+                "count": str(self.server.count),
+                "webenv": "MOCK_WEBENV",
+                "querykey": "1",
+                "idlist": [str(self.server.first_pmid + i) for i in range(min(self.server.count, int(params.get("retmax", 20))))]
+            }}
+            self._send(200, "application/json", json.dumps(body))
+        elif url.path.endswith("efetch.fcgi"):
+            start = int(params.get("retstart", 0))
+            stop = min(self.server.count, start + int(params.get("retmax", 20)))
+            articles = "\n".join(_article_xml(self.server.first_pmid + i) for i in range(start, stop))
+            self._send(200, "text/xml", f"<?xml version=\"1.0\"?>\n<PubmedArticleSet>\n{articles}\n</PubmedArticleSet>")
+        else:
+            self._send(404, "text/plain", "Not Found")
+
+    def _send(self, status: int, content_type: str, body: str):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MockEUtilsServer(ThreadingHTTPServer):
+    def __init__(self, address: Tuple[str, int], count: int = 1000, first_pmid: int = 10000000, fail_every: int = 0):
+        super().__init__(address, MockEUtilsHandler)
+        self.count = count
+        self.first_pmid = first_pmid
+        self.fail_every = fail_every
+        self.request_count = 0
+        self.request_times = []
+        self._lock = threading.Lock()
+
+    def record_request(self, path: str):
+        with self._lock:
+            self.request_count += 1
+            self.request_times.append((time.monotonic(), path))
+
+
+def start_mock_server(count: int = 1000, port: int = 0, fail_every: int = 0) -> Tuple[MockEUtilsServer, str]:
+    """
+    Start the mock server in a background thread.
+
+    Returns:
+        tuple: (server, base URL to pass to PubMedHarvester)
+    """
+    server = MockEUtilsServer(("127.0.0.1", port), count=count, fail_every=fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock E-utilities server")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with HTTP 429")
+    args = parser.parse_args()
+
+    server = MockEUtilsServer(("127.0.0.1", args.port), count=args.count, fail_every=args.fail_every)
+    print(f"Mock E-utilities listening on http://127.0.0.1:{args.port}/")
+    server.serve_forever()
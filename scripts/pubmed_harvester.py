@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, Optional
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from pubmed_retrieval import PubMedAPIRetriever
+from corpus_store import CorpusStore
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces requests evenly under a per-second cap."""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """Block until the caller may send its next request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PubMedHarvester(PubMedAPIRetriever):
+    def __init__(
+        self,
+        email: str,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+        checkpoint_path: Optional[str] = None,
+        max_retries: int = 3
+    ):
+        """
+        Harvest large PubMed result sets through the E-utilities history server
+
+        Args:
+            email: Your email address (required by NCBI)
+            api_key: NCBI API key, raises the rate limit from 3 to 10 requests/s
+            base_url: E-utilities base URL, e.g. a local mock server
+            batch_size: Number of records per efetch page
+            workers: Number of concurrent efetch workers
+            requests_per_second: Override the NCBI rate limit
+            checkpoint_path: JSON file recording completed pages for resuming
+            max_retries: Attempts per request before giving up on a page
+        """
+        super().__init__(email)
+        self.api_key = api_key if api_key is not None else Config.NCBI_API_KEY
+        if base_url:
+            self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.batch_size = batch_size or Config.HARVEST_BATCH_SIZE
+        self.workers = workers or Config.HARVEST_WORKERS
+        self.rate_limiter = RateLimiter(requests_per_second or (10 if self.api_key else 3))
+        self.checkpoint_path = checkpoint_path
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self._checkpoint_lock = threading.Lock()
+        self.failed_pages = 0
+
+    def _get(self, endpoint: str, params: Dict, stream: bool = False) -> requests.Response:
+        """GET an E-utilities endpoint under the rate limit, retrying transient failures"""
+        params = dict(params, tool="rag_transforms", email=self.email)
+        if self.api_key:
+            params['api_key'] = self.api_key
+
+        for attempt in range(1, self.max_retries + 1):
+            self.rate_limiter.wait()
+            try:
+                response = self.session.get(f"{self.base_url}{endpoint}", params=params, stream=stream, timeout=60)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                response.raise_for_status()
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"{endpoint} failed ({e}), retry {attempt}/{self.max_retries - 1}")
+                time.sleep(2 ** attempt)
+
+    def start_search(self, keyword: str, **search_params) -> Dict:
+        """
+        Run esearch with usehistory=y and return the history handle
+
+        Returns:
+            Dictionary with 'webenv', 'query_key' and 'count'
+        """
+        params = {
+            'db': 'pubmed',
+            'term': keyword,
+            'usehistory': 'y',
+            'retmax': 0,
+            'retmode': 'json'
+        }
+        params.update(search_params)
+        result = self._get("esearch.fcgi", params).json()['esearchresult']
+        return {
+            'webenv': result['webenv'],
+            'query_key': result['querykey'],
+            'count': int(result['count'])
+        }
+
+    def fetch_page(self, history: Dict, retstart: int) -> Iterator[Dict]:
+        """Request one page of the stored result set, returning its articles as they are parsed from the body"""
+        params = {
+            'db': 'pubmed',
+            'WebEnv': history['webenv'],
+            'query_key': history['query_key'],
+            'retstart': retstart,
+            'retmax': self.batch_size,
+            'retmode': 'xml'
+        }
+        response = self._get("efetch.fcgi", params, stream=True)
+        response.raw.decode_content = True
+        return self._stream_articles(response)
+
+    def _stream_articles(self, response: requests.Response) -> Iterator[Dict]:
+        with response:
+            yield from self.iter_xml_articles(response.raw)
+
+    def _load_checkpoint(self, keyword: str) -> Dict:
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('query') == keyword:
+                logger.info(f"Resuming harvest: {len(checkpoint['done'])} pages already fetched")
+                return checkpoint
+        return {'query': keyword, 'history': None, 'done': []}
+
+    def _save_checkpoint(self, checkpoint: Dict):
+        if not self.checkpoint_path:
+            return
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def harvest(
+        self,
+        keyword: str,
+        max_results: Optional[int] = None,
+        on_batch: Optional[Callable[[Iterator[Dict]], None]] = None,
+        **search_params
+    ) -> int:
+        """
+        Harvest all records for a query, paging efetch concurrently
+
+        Args:
+            keyword: Search term or query
+            max_results: Stop after this many records
+            on_batch: Called from the fetching threads with each page's articles as
+                an iterator that parses them while the page downloads. It must
+                be thread-safe and consume the iterator
+            **search_params: Extra esearch parameters (e.g. mindate, datetype)
+
+        Returns:
+            Number of articles delivered in this run
+        """
+        checkpoint = self._load_checkpoint(keyword)
+        if checkpoint['history'] is None:
+            checkpoint['history'] = self.start_search(keyword, **search_params)
+            self._save_checkpoint(checkpoint)
+        history = checkpoint['history']
+
+        total = history['count'] if max_results is None else min(history['count'], max_results)
+        done = set(checkpoint['done'])
+        pending = [start for start in range(0, total, self.batch_size) if start not in done]
+        logger.info(f"Harvesting {total} records for '{keyword}' in {len(pending)} pages "
+                    f"with {self.workers} workers")
+
+        delivered = 0
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._harvest_page, checkpoint, keyword, start, search_params, on_batch): start
+                       for start in pending}
+            for future in as_completed(futures):
+                retstart = futures[future]
+                try:
+                    delivered += future.result()
+                except Exception as e:
+                    logger.error(f"Page at {retstart} failed: {e}")
+                    continue
+                with self._checkpoint_lock:
+                    checkpoint['done'].append(retstart)
+                    self._save_checkpoint(checkpoint)
+                rate = delivered / max(time.time() - start_time, 1e-9)
+                logger.info(f"Fetched page at {retstart}: {delivered} articles so far ({rate:.1f} articles/s)")
+
+        failed = len(pending) - (len(checkpoint['done']) - len(done))
+        self.failed_pages = failed
+        if failed:
+            logger.warning(f"{failed} pages failed; re-run with the same checkpoint to resume")
+        elif self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return delivered
+
+    def _harvest_page(self, checkpoint: Dict, keyword: str, retstart: int, search_params: Dict,
+                      on_batch: Optional[Callable[[Iterator[Dict]], None]]) -> int:
+        """Stream one page into `on_batch` and return the number of articles it held"""
+        delivered = 0
+
+        def counted(articles: Iterator[Dict]) -> Iterator[Dict]:
+            nonlocal delivered
+            for article in articles:
+                delivered += 1
+                yield article
+
+        articles = counted(self._fetch_with_refresh(checkpoint, keyword, retstart, search_params))
+        if on_batch:
+            on_batch(articles)
+        else:
+            for _ in articles:
+                pass
+        return delivered
+
+    def _fetch_with_refresh(self, checkpoint: Dict, keyword: str, retstart: int,
+                            search_params: Dict) -> Iterator[Dict]:
+        """Fetch a page, re-running esearch once if the stored WebEnv has expired"""
+        history = checkpoint['history']
+        try:
+            articles = self.fetch_page(history, retstart)
+            # An expired WebEnv shows as an ERROR element ahead of any article
+            first = next(articles, None)
+        except (requests.HTTPError, ET.ParseError, ValueError):
+            with self._checkpoint_lock:
+                if checkpoint['history'] is history:
+                    logger.info("History session expired, starting a new search")
+                    checkpoint['history'] = self.start_search(keyword, **search_params)
+                    self._save_checkpoint(checkpoint)
+            articles = self.fetch_page(checkpoint['history'], retstart)
+            first = next(articles, None)
+        return articles if first is None else itertools.chain([first], articles)
+
+
+def harvest_to_jsonl(harvester: PubMedHarvester, keyword: str, output_path: str,
+                     max_results: Optional[int] = None) -> int:
+    """Harvest a query and append every article to a JSON Lines file"""
+    lock = threading.Lock()
+
+    with open(output_path, 'a', encoding='utf-8') as f:
+        def write_batch(articles: Iterator[Dict]):
+            for article in articles:
+                line = json.dumps(article, ensure_ascii=False) + '\n'
+                with lock:
+                    f.write(line)
+
+        return harvester.harvest(keyword, max_results=max_results, on_batch=write_batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harvest PubMed records through the E-utilities history server")
+    parser.add_argument("query")
+    parser.add_argument("--output", default="./data/harvest.jsonl")
+    parser.add_argument("--store", default=Config.CORPUS_DB or None,
+                        help="Write articles into this SQLite corpus store instead of JSON Lines")
+    parser.add_argument("--max-results", type=int, default=None)
+    parser.add_argument("--checkpoint", default=None, help="Defaults to <store or output>.checkpoint.json")
+    parser.add_argument("--base-url", default=None, help="E-utilities base URL, e.g. a local mock server")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    harvester = PubMedHarvester(
+        Config.EMAIL_FOR_PUBMED,
+        base_url=args.base_url,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint or (args.store or args.output) + ".checkpoint.json"
+    )
+    if args.store:
+        store = CorpusStore(args.store)
+        count = harvester.harvest(args.query, max_results=args.max_results, on_batch=store.add_articles)
+        print(f"Harvested {count} articles into {args.store} ({store.count()})")
+    else:
+        count = harvest_to_jsonl(harvester, args.query, args.output, max_results=args.max_results)
+        print(f"Harvested {count} articles into {args.output}")
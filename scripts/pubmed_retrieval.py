@@ -3,7 +3,7 @@ import requests
 import xml.etree.ElementTree as ET
 from Bio import Entrez
 import pandas as pd
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, IO
 import json
 
 from config import Config
@@ -64,11 +64,21 @@ class PubMedRetriever:
         Returns:
             List of dictionaries containing article information
         """
+        return list(self.iter_abstracts(pmids))
+
+    def iter_abstracts(self, pmids: List[str]) -> Iterator[Dict]:
+        """
+        Fetch abstracts for given PubMed IDs, yielding each article as it is parsed
+
+        Args:
+            pmids: List of PubMed IDs
+
+        Yields:
+            Dictionaries containing article information
+        """
         if not pmids:
-            return []
-            
-        articles = []
-        
+            return
+
         try:
             # Fetch article details
             fetch_handle = Entrez.efetch(
@@ -77,19 +87,17 @@ class PubMedRetriever:
                 rettype="medline",
                 retmode="xml"
             )
-            records = Entrez.read(fetch_handle)
-            fetch_handle.close()
-            
-            # Parse each article
-            for record in records['PubmedArticle']:
-                article_info = self._parse_article(record)
-                if article_info:
-                    articles.append(article_info)
-                    
+            try:
+                # Entrez.parse builds one record at a time instead of the whole set
+                for record in Entrez.parse(fetch_handle):
+                    article_info = self._parse_article(record)
+                    if article_info:
+                        yield article_info
+            finally:
+                fetch_handle.close()
+
         except Exception as e:
             print(f"Error fetching abstracts: {e}")
-            
-        return articles
     
     def _parse_article(self, record) -> Optional[Dict]:
         """Parse individual article record"""
@@ -126,6 +134,8 @@ class PubMedRetriever:
             else:
                 publication_date = 'Unknown date'
             
+            publication_types = [str(pub_type) for pub_type in article.get('PublicationTypeList', [])]
+            
             return {
                 'pmid': str(pmid),
                 'title': title,
@@ -133,6 +143,7 @@ class PubMedRetriever:
                 'authors': authors,
                 'journal': journal,
                 'publication_date': publication_date,
+                'publication_types': publication_types,
                 'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
             }
             
@@ -140,7 +151,7 @@ class PubMedRetriever:
             print(f"Error parsing article: {e}")
             return None
     
-    def search_and_retrieve(self, keyword: str, max_results: int = 50) -> List[Dict]:
+    def search_and_retrieve(self, keyword: str, max_results: int = 50) -> Iterator[Dict]:
         """
         Complete workflow: search and retrieve abstracts
         
@@ -148,8 +159,8 @@ class PubMedRetriever:
             keyword: Search term
             max_results: Maximum number of results
             
-        Returns:
-            List of article dictionaries with abstracts
+        Yields:
+            Article dictionaries with abstracts, as they are parsed
         """
         print(f"Searching PubMed for: '{keyword}'")
         pmids = self.search_pubmed(keyword, retmax=max_results)
@@ -157,12 +168,13 @@ class PubMedRetriever:
         
         if pmids:
             print("Fetching abstracts...")
-            articles = self.fetch_abstracts(pmids)
-            print(f"Retrieved {len(articles)} abstracts")
-            return articles
+            retrieved = 0
+            for article in self.iter_abstracts(pmids):
+                retrieved += 1
+                yield article
+            print(f"Retrieved {retrieved} abstracts")
         else:
             print("No articles found")
-            return []
     
     def save_to_csv(self, articles: List[Dict], filename: str):
         """Save articles to CSV file"""
@@ -188,8 +200,8 @@ class PubMedAPIRetriever:
         self.email = email
         self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
     
-    def search_and_retrieve(self, keyword: str, max_results: int = 50) -> List[Dict]:
-        """Search and retrieve using direct API calls"""
+    def search_and_retrieve(self, keyword: str, max_results: int = 50) -> Iterator[Dict]:
+        """Search and retrieve using direct API calls, yielding articles as the efetch body streams in"""
         
         # Step 1: Search for PMIDs
         search_url = f"{self.base_url}esearch.fcgi"
@@ -208,7 +220,7 @@ class PubMedAPIRetriever:
             
             if not pmids:
                 print("No articles found")
-                return []
+                return
             
             print(f"Found {len(pmids)} articles")
             
@@ -223,24 +235,43 @@ class PubMedAPIRetriever:
                 'retmode': 'xml'
             }
             
-            response = requests.get(fetch_url, params=fetch_params)
+            response = requests.get(fetch_url, params=fetch_params, stream=True)
             response.raise_for_status()
+            response.raw.decode_content = True
             
-            # Parse XML response
-            root = ET.fromstring(response.content)
-            articles = []
-            
-            for article in root.findall('.//PubmedArticle'):
-                article_info = self._parse_xml_article(article)
-                if article_info:
-                    articles.append(article_info)
-            
-            return articles
+            # Parse XML response incrementally as it downloads
+            with response:
+                yield from self.iter_xml_articles(response.raw)
             
         except Exception as e:
             print(f"Error: {e}")
-            return []
     
+    def iter_xml_articles(self, stream: IO[bytes]) -> Iterator[Dict]:
+        """
+        Stream-parse an efetch XML body, yielding one article per PubmedArticle element
+
+        Elements are cleared once parsed, so memory stays flat regardless of
+        how many records the body holds.
+
+        Args:
+            stream: File-like object with the XML response body
+
+        Yields:
+            Dictionaries containing article information
+        """
+        context = ET.iterparse(stream, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end':
+                continue
+            if elem.tag == 'PubmedArticle':
+                article_info = self._parse_xml_article(elem)
+                if article_info:
+                    yield article_info
+                root.clear()
+            elif elem.tag == 'ERROR':
+                raise ValueError(f"efetch error: {elem.text}")
+
     def _parse_xml_article(self, article_elem) -> Optional[Dict]:
         """Parse XML article element"""
         try:
@@ -270,12 +301,24 @@ class PubMedAPIRetriever:
             journal_elem = article_elem.find('.//Journal/Title')
             journal = journal_elem.text if journal_elem is not None else 'Unknown journal'
             
+            # Extract publication date and types
+            pub_date_elem = article_elem.find('.//Journal/JournalIssue/PubDate')
+            if pub_date_elem is not None:
+                medline_date = pub_date_elem.findtext('MedlineDate')
+                parts = [pub_date_elem.findtext(tag) for tag in ('Year', 'Month', 'Day')]
+                publication_date = medline_date or '-'.join(part for part in parts if part)
+            else:
+                publication_date = 'Unknown date'
+            publication_types = [elem.text for elem in article_elem.findall('.//PublicationType') if elem.text]
+            
             return {
                 'pmid': pmid,
                 'title': title,
                 'abstract': abstract,
                 'authors': authors,
                 'journal': journal,
+                'publication_date': publication_date,
+                'publication_types': publication_types,
                 'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
             }
             
@@ -291,7 +334,7 @@ if __name__ == "__main__":
     
     # Search for articles about machine learning in healthcare
     keyword = "machine learning healthcare"
-    articles = retriever.search_and_retrieve(keyword, max_results=10)
+    articles = list(retriever.search_and_retrieve(keyword, max_results=10))
     
     # Display results
     for i, article in enumerate(articles[:3], 1):  # Show first 3 articles
@@ -311,6 +354,6 @@ if __name__ == "__main__":
     print(f"\n=== Alternative API Method ===")
     # Method 2: Using direct API calls
     api_retriever = PubMedAPIRetriever("your.email@example.com")
-    api_articles = api_retriever.search_and_retrieve("COVID-19 vaccine", max_results=5)
+    api_articles = list(api_retriever.search_and_retrieve("COVID-19 vaccine", max_results=5))
     
     print(f"Retrieved {len(api_articles)} articles using API method")
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+from datetime import date
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from corpus_store import CorpusStore
+from pubmed_harvester import PubMedHarvester
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+# E-utilities date format for mindate/maxdate
+DATE_FORMAT = "%Y/%m/%d"
+
+
+def index_new_chunks(store: CorpusStore, pmids: List[str]) -> int:
+    """
+    Embed the chunks of the given articles that have no embedding yet and save them in the store.
+
+    A running service picks the new chunks up on its next index reload,
+    reusing the saved embeddings for both the in-memory and the ChromaDB path.
+
+    Returns:
+        Number of chunks embedded
+    """
+    columns = store.load_chunks(pmids, unembedded=True)
+    if not columns['id']:
+        return 0
+
+    from transformers_embed import embed_corpus
+
+    embeddings = embed_corpus(columns['text']).numpy()
+    store.save_embeddings(columns['id'], embeddings, Config.TRANSFORMER_MODEL)
+    return len(columns['id'])
+
+
+def sync_query(
+    store: CorpusStore,
+    harvester: PubMedHarvester,
+    query: str,
+    reldate: Optional[int] = None,
+    max_results: Optional[int] = None
+) -> Dict:
+    """
+    Fetch only records added to PubMed since the last sync of a query
+
+    The first sync of a query harvests the full result set. Later syncs ask
+    esearch for records with an Entrez date (edat) from the last sync date
+    onwards; records already in the store are skipped on insert. Chunks of
+    every fetched record that are still unembedded get embedded, so a run
+    that stored articles but died before embedding them is completed by the
+    next one.
+
+    Args:
+        store: Corpus store to append to
+        harvester: Harvester used for esearch/efetch
+        query: PubMed search term
+        reldate: Look back this many days instead of using the stored date
+        max_results: Cap on records fetched in this run
+
+    Returns:
+        Dictionary with counts of fetched articles, new articles and new chunks
+    """
+    today = date.today().strftime(DATE_FORMAT)
+    state = store.get_sync_state(query)
+
+    search_params = {}
+    if reldate is not None:
+        search_params = {'datetype': 'edat', 'reldate': reldate}
+    elif state is not None:
+        search_params = {'datetype': 'edat', 'mindate': state['last_date'], 'maxdate': today}
+    logger.info(f"Syncing '{query}' ({search_params or 'full harvest'})")
+
+    start_time = time.time()
+    new_pmids, fetched_pmids = [], []
+
+    def on_batch(articles):
+        def recorded():
+            for article in articles:
+                fetched_pmids.append(str(article['pmid']))
+                yield article
+
+        new_pmids.extend(store.add_articles(recorded()))
+
+    fetched = harvester.harvest(query, max_results=max_results, on_batch=on_batch, **search_params)
+    # Articles are committed before they are embedded, so pick the chunks from the store, not from what was new
+    new_chunks = index_new_chunks(store, fetched_pmids)
+    if harvester.failed_pages:
+        logger.warning(f"Not advancing the sync date of '{query}': {harvester.failed_pages} pages failed")
+    else:
+        store.update_sync_state(query, today, len(new_pmids))
+
+    logger.info(f"Synced '{query}': fetched {fetched}, {len(new_pmids)} new articles, "
+                f"{new_chunks} new chunks indexed in {time.time() - start_time:.1f}s")
+    return {'fetched': fetched, 'new_articles': len(new_pmids), 'new_chunks': new_chunks}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append newly published PubMed articles to the corpus store")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("--store", default=Config.CORPUS_DB or "./data/corpus.db")
+    parser.add_argument("--reldate", type=int, default=None, help="Look back N days instead of the last sync date")
+    parser.add_argument("--max-results", type=int, default=None)
+    parser.add_argument("--base-url", default=None, help="E-utilities base URL, e.g. a local mock server")
+    args = parser.parse_args()
+
+    store = CorpusStore(args.store)
+    for query in args.queries:
+        harvester = PubMedHarvester(
+            Config.EMAIL_FOR_PUBMED,
+            base_url=args.base_url,
+            checkpoint_path=f"{args.store}.{hashlib.md5(query.encode()).hexdigest()[:12]}.checkpoint.json"
+        )
+        result = sync_query(store, harvester, query, reldate=args.reldate, max_results=args.max_results)
+        print(f"{query}: {result}")
@@ -3,13 +3,25 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from  config import Config
 from pubmed_retrieval import PubMedRetriever
+from corpus_store import CorpusStore
 
 retriever = PubMedRetriever(Config.EMAIL_FOR_PUBMED)
 articles = retriever.search_and_retrieve("Parkinson's Disease", max_results=500)
+count = 0
 
 with open('./data/N_abstracts.txt' , 'w', encoding="utf-8") as file_output:
-    for article in articles:
-        file_output.write(article['abstract'])
-        file_output.write('\n')
-    file_output.close()
-print (len(articles))
\ No newline at end of file
+    def written(articles):
+        # Articles stream in from efetch; write each one as it passes to the store
+        global count
+        for article in articles:
+            file_output.write(article['abstract'])
+            file_output.write('\n')
+            count += 1
+            yield article
+
+    if Config.CORPUS_DB:
+        CorpusStore(Config.CORPUS_DB).add_articles(written(articles))
+    else:
+        for _ in written(articles):
+            pass
+print (count)
\ No newline at end of file
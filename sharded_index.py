@@ -0,0 +1,198 @@
+import os
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from vector_index import normalize_rows, top_k
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+# BLAS thread pools of the shard workers; one thread each so shards don't oversubscribe cores
+_BLAS_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def _serve_shard(conn, path: str, start: int, stop: int, threads: int):
+    """
+    Worker loop: score queries against rows [start, stop) of the shared matrix.
+
+    Requests carry an id and are scored on `threads` threads (numpy releases
+    the GIL), so queries from concurrent callers overlap. Replies go back
+    tagged with their request id, in whatever order they finish.
+    """
+    matrix = np.array(np.load(path, mmap_mode="r")[start:stop])
+    send_lock = threading.Lock()
+
+    def score(request_id, query, k, local_rows):
+        try:
+            if local_rows is None:
+                scores = matrix @ query
+                best = top_k(scores, k)
+                reply = (best + start, scores[best])
+            else:
+                scores = matrix[local_rows] @ query
+                best = top_k(scores, k)
+                reply = (local_rows[best] + start, scores[best])
+        except Exception as error:
+            reply = error
+        with send_lock:
+            conn.send((request_id, reply))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            executor.submit(score, *request)
+    conn.close()
+
+
+class ShardedIndex:
+    """
+    Exact cosine index partitioned across local worker processes.
+
+    The normalized embedding matrix is written once to disk, and every
+    worker loads its contiguous slice. A query is sent to all shards at
+    once; each returns its own top-k and the coordinator merges them
+    into the global top-k. Requests are tagged with an id and a reader
+    thread per shard hands each reply to the caller waiting for it, so
+    concurrent searches are in flight at the same time.
+
+    Args:
+        embeddings (np.ndarray): One row per chunk.
+        num_shards (int): Worker processes.
+        path (str): Directory for the shared matrix file.
+        threads_per_shard (int, optional): Queries each worker scores at once
+            (default: ADMISSION_MAX_IN_FLIGHT, the pipelines that can search concurrently).
+    """
+
+    def __init__(self, embeddings: np.ndarray, num_shards: int, path: str, threads_per_shard: Optional[int] = None):
+        os.makedirs(path, exist_ok=True)
+        matrix_path = os.path.join(path, "vectors.npy")
+        np.save(matrix_path, normalize_rows(embeddings))
+
+        self.matrix_path = matrix_path
+        self.size = len(embeddings)
+        bounds = np.linspace(0, self.size, num_shards + 1).astype(int)
+        self.bounds: List[Tuple[int, int]] = list(zip(bounds[:-1], bounds[1:]))
+        threads_per_shard = threads_per_shard or max(1, Config.ADMISSION_MAX_IN_FLIGHT)
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._connections = []
+        self._send_locks: List[threading.Lock] = []
+        self._pending: List[Dict[int, Future]] = []
+        self._readers: List[threading.Thread] = []
+        self._processes = []
+
+        context = multiprocessing.get_context("spawn")
+        saved = {name: os.environ.get(name) for name in _BLAS_THREAD_VARS}
+        os.environ.update({name: "1" for name in _BLAS_THREAD_VARS})
+        try:
+            for start, stop in self.bounds:
+                parent_conn, child_conn = context.Pipe()
+                process = context.Process(target=_serve_shard, daemon=True,
+                                          args=(child_conn, matrix_path, start, stop, threads_per_shard))
+                process.start()
+                self._connections.append(parent_conn)
+                self._send_locks.append(threading.Lock())
+                self._pending.append({})
+                self._processes.append(process)
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        for shard, conn in enumerate(self._connections):
+            reader = threading.Thread(target=self._read_replies, args=(shard, conn), name=f"shard-{shard}-replies", daemon=True)
+            reader.start()
+            self._readers.append(reader)
+        logger.info(f"Started {num_shards} retrieval shards over {self.size} vectors")
+
+    def _read_replies(self, shard: int, conn):
+        """Hand each reply of one shard to the search waiting for its request id."""
+        pending = self._pending[shard]
+        while True:
+            try:
+                request_id, reply = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = pending.pop(request_id, None)
+            if future is None:
+                continue
+            if isinstance(reply, Exception):
+                future.set_exception(reply)
+            else:
+                future.set_result(reply)
+        with self._lock:
+            orphaned = list(pending.values())
+            pending.clear()
+        for future in orphaned:
+            future.set_exception(RuntimeError(f"Retrieval shard {shard} stopped"))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def search(self, query_embedding: np.ndarray, k: int, candidate_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fan the query out to all shards and merge their top-k lists.
+
+        Args:
+            query_embedding (np.ndarray): Query vector.
+            k (int): Number of results.
+            candidate_ids (np.ndarray, optional): Restrict the search to these rows.
+
+        Returns:
+            tuple: (chunk positions best first, cosine scores)
+        """
+        query = normalize_rows(np.asarray(query_embedding).reshape(-1))
+        if candidate_ids is not None:
+            candidate_ids = np.sort(np.asarray(candidate_ids, dtype=np.int64))
+
+        futures = []
+        for shard, (start, stop) in enumerate(self.bounds):
+            local_rows = None
+            if candidate_ids is not None:
+                low, high = np.searchsorted(candidate_ids, [start, stop])
+                local_rows = candidate_ids[low:high] - start
+            future: Future = Future()
+            with self._lock:
+                if shard >= len(self._connections):
+                    raise RuntimeError("Sharded index is closed")
+                request_id = next(self._request_ids)
+                self._pending[shard][request_id] = future
+            # Only the send is serialized per shard; the wait for the reply is not
+            with self._send_locks[shard]:
+                self._connections[shard].send((request_id, query, k, local_rows))
+            futures.append(future)
+        results = [future.result() for future in futures]
+
+        ids = np.concatenate([shard_ids for shard_ids, _ in results])
+        scores = np.concatenate([shard_scores for _, shard_scores in results])
+        best = top_k(scores, k)
+        return ids[best], scores[best]
+
+    def close(self):
+        """Stop the shard workers."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            processes, self._processes = self._processes, []
+        for conn, send_lock in zip(connections, self._send_locks):
+            with send_lock:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in processes:
+            process.join(timeout=5)
+        for reader in self._readers:
+            reader.join(timeout=5)
+        for conn in connections:
+            conn.close()
+        self._readers = []
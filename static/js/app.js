@@ -1,6 +1,12 @@
 // static/js/app.js
 
 let conversationCount = 0;
+// Server-side conversation state, so follow-up questions reuse earlier retrieval
+let sessionId = newSessionId();
+
+function newSessionId() {
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
 
 // Initialize when DOM is loaded
 document.addEventListener('DOMContentLoaded', function() {
@@ -54,7 +60,7 @@ async function runPipeline() {
     queryInput.value = '';
 
     try {
-        const response = await fetch('/run?query=' + encodeURIComponent(query));
+        const response = await fetch('/run?query=' + encodeURIComponent(query) + '&session_id=' + sessionId);
         
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
@@ -113,6 +119,8 @@ function clearHistory() {
     if (confirm('Are you sure you want to clear the conversation history?')) {
         document.getElementById('conversation-history').innerHTML = '';
         conversationCount = 0;
+        fetch('/session/' + sessionId, { method: 'DELETE' });
+        sessionId = newSessionId();
     }
 }
 
@@ -1,46 +1,82 @@
-import chromadb
-from sentence_transformers import SentenceTransformer 
-from transformers_embed import embed_text
+from transformers_embed import embed_query, get_model
+from bulk_embed import iter_bulk_embeddings
+from backends import get_backend
 from config import Config
 from utils.logger import setup_logger
 
-model = SentenceTransformer(Config.TRANSFORMER_MODEL)  # Or any other model
-client = chromadb.Client()
-
 logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
 
 # Initialize ChromaDB client and collection
-def run_chroma(docs):
+def run_chroma(docs, ids=None, metadatas=None, signature=None, name='docs', embeddings=None):
+    """
+    Embed the chunks into the persistent collection `name`.
+
+    When `signature` matches the corpus the collection was built from, the
+    existing collection is reused instead of being embedded again. Precomputed
+    `embeddings` (one row per chunk) are inserted as they are.
+    """
     logger.info("Applying ChromaDB")
+    ids = [str(i) for i in ids] if ids is not None else [str(i) for i in range(len(docs))]
     # Initialize Chroma client and collection
-    client = chromadb.PersistentClient(path="./chroma_data")
-
-    collection = client.create_collection('docs',
-                            metadata={"hnsw:space": "cosine"})
-    # Embed and add documents to ChromaDB
-    embeddings = model.encode(docs).tolist()
-    collection.add(
-        documents=docs,
-        embeddings=embeddings,
-        ids=[str(i) for i in range(len(docs))]
-    )
+    client = get_backend("vector_store", "chroma")
+
+    existing = {c if isinstance(c, str) else c.name for c in client.list_collections()}
+    if name in existing:
+        collection = client.get_collection(name)
+        if signature is not None and (collection.metadata or {}).get("corpus_signature") == signature \
+                and collection.count() == len(docs):
+            logger.info("Reusing ChromaDB collection built from the same corpus")
+            return collection
+        logger.info("Corpus changed since the ChromaDB collection was built; recreating it")
+        client.delete_collection(name)
+
+    collection_metadata = {"hnsw:space": "cosine"}
+    if signature is not None:
+        collection_metadata["corpus_signature"] = signature
+    collection = client.create_collection(name, metadata=collection_metadata)
+    if embeddings is not None:
+        batches = ((range(start, min(start + 1024, len(docs))), embeddings[start:start + 1024])
+                   for start in range(0, len(docs), 1024))
+    else:
+        batches = iter_bulk_embeddings(docs, model=get_model())
+    # Embed and add documents to ChromaDB as each bucket finishes
+    for batch_ids, batch_embeddings in batches:
+        collection.add(
+            documents=[docs[i] for i in batch_ids],
+            embeddings=batch_embeddings.tolist(),
+            metadatas=[metadatas[i] for i in batch_ids] if metadatas else None,
+            ids=[ids[i] for i in batch_ids]
+        )
     return collection
 
 
+def drop_collection(name):
+    """Delete a collection, e.g. one built for an index version that was retired."""
+    client = get_backend("vector_store", "chroma")
+    try:
+        client.delete_collection(name)
+    except Exception as e:
+        logger.warning(f"Could not delete ChromaDB collection {name}: {e}")
+
+
 # Your search query
-def nearest_to_q(query , collection , n_results):
+def nearest_to_q(query , collection , n_results, where=None, with_scores=False):
     # Embed the query
-    query_embedding = model.encode([query]).tolist()[0]
+    query_embedding = embed_query(query).tolist()
 
-    # Query ChromaDB for the top 2 nearest documents
+    # Query ChromaDB for the nearest documents, pre-filtered on metadata
     resulted_docs = collection.query(
         query_embeddings=[query_embedding],
-        n_results=n_results
+        n_results=n_results,
+        where=where
     )
 
 
     if 'documents' not in resulted_docs:
-        return resulted_docs
+        return (resulted_docs, []) if with_scores else resulted_docs
 
     # Print the most similar documents
+    if with_scores:
+        # The collection uses cosine distance; convert back to similarity
+        return resulted_docs['documents'][0], [1.0 - d for d in resulted_docs['distances'][0]]
     return resulted_docs['documents'][0]
@@ -0,0 +1,76 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from admission import AdmissionController, ClientDisconnected, Overloaded, PipelineCancelled, check_cancelled
+
+
+def blocking(release: threading.Event, result="done"):
+    release.wait(5)
+    return result
+
+
+def test_requests_beyond_the_queue_are_rejected_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout_s=5, poll_s=0.01)
+        release = threading.Event()
+        running = asyncio.ensure_future(controller.run(blocking, release, "first"))
+        queued = asyncio.ensure_future(controller.run(blocking, release, "second"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded) as rejected:
+            await controller.run(blocking, release)
+        assert rejected.value.retry_after >= 1
+        assert controller.stats()["in_flight"] == 1 and controller.stats()["queued"] == 1
+        release.set()
+        return await running, await queued, controller.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert (first, second) == ("first", "second")
+    assert stats["admitted"] == 2 and stats["rejected"] == 1 and stats["in_flight"] == 0
+
+
+def test_queue_wait_is_bounded():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout_s=0.05, poll_s=0.01)
+        release = threading.Event()
+        running = asyncio.ensure_future(controller.run(blocking, release))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded):
+            await controller.run(blocking, release)
+        release.set()
+        await running
+        return controller.stats()
+
+    assert asyncio.run(scenario())["queue_timeouts"] == 1
+
+
+def test_disconnect_cancels_the_running_pipeline_before_its_next_call():
+    calls = []
+
+    def pipeline():
+        for step in range(50):
+            check_cancelled()
+            calls.append(step)
+            time.sleep(0.01)
+
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout_s=1, poll_s=0.01)
+        started = time.perf_counter()
+
+        async def is_disconnected():
+            return time.perf_counter() - started > 0.05
+
+        with pytest.raises(ClientDisconnected):
+            await controller.run(pipeline, is_disconnected=is_disconnected)
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["cancelled"] == 1 and stats["in_flight"] == 0
+    assert 0 < len(calls) < 50
+
+
+def test_check_cancelled_is_a_no_op_outside_admitted_requests():
+    check_cancelled()
+    assert not issubclass(PipelineCancelled, Exception)
@@ -0,0 +1,37 @@
+from context_packing import estimate_tokens, locate_chunks, pack_context, truncate_to_tokens
+
+FIRST = "Levodopa remains the most effective therapy. Dyskinesia develops with long-term use. " * 4
+SECOND = "Deep brain stimulation improves tremor."
+
+
+def test_overlapping_chunks_are_merged_into_one_passage():
+    text = "Levodopa remains the most effective therapy for motor symptoms."
+    chunks = [text[:40], text[30:]]
+
+    assert pack_context(chunks, spans=locate_chunks(text, chunks), token_budget=100) == [text]
+
+
+def test_truncate_to_tokens_ends_at_a_sentence_boundary():
+    truncated = truncate_to_tokens(FIRST, 21)
+
+    assert truncated == "Levodopa remains the most effective therapy. Dyskinesia develops with long-term use."
+    assert estimate_tokens(truncated) <= 21
+    assert truncate_to_tokens(SECOND, 100) == SECOND
+    assert truncate_to_tokens("no sentence end in here at all", 3) == "no sentence"
+
+
+def test_a_top_passage_larger_than_the_budget_is_truncated_not_dropped():
+    packed = pack_context([FIRST, SECOND], token_budget=25)
+
+    assert len(packed) == 1
+    assert FIRST.startswith(packed[0])
+    assert packed[0].endswith(".")
+    assert estimate_tokens(packed[0]) <= 25
+
+
+def test_later_passages_that_fit_are_kept_after_a_truncated_one():
+    packed = pack_context([SECOND, FIRST, "Exercise helps."], token_budget=35)
+
+    assert packed[0] == SECOND
+    assert FIRST.startswith(packed[1])
+    assert sum(estimate_tokens(passage) for passage in packed) <= 35
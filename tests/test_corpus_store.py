@@ -0,0 +1,87 @@
+import pytest
+import numpy as np
+
+from corpus_store import CorpusStore, prepare_article
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CorpusStore(str(tmp_path / "corpus.db"), chunk_size=200, chunk_overlap=20)
+    yield store
+    store.close()
+
+
+def article(pmid, abstract):
+    return {'pmid': pmid, 'title': f"Article {pmid}", 'journal': 'Mov Disord', 'publication_date': '2021 Mar',
+            'abstract': abstract}
+
+
+def prepared(*articles):
+    return [prepare_article(item, 200, 20) for item in articles]
+
+
+def test_add_prepared_records_the_source_file(store):
+    source = {'path': '/exports/a.txt', 'content_hash': 'hash-a', 'size': 1234}
+    added = store.add_prepared(prepared(article('1', 'Levodopa therapy.'), article('2', 'Deep brain stimulation.')),
+                               source=source)
+
+    assert added == ['1', '2']
+    recorded = store.get_source(path='/exports/a.txt')
+    assert recorded['content_hash'] == 'hash-a'
+    assert recorded['size'] == 1234
+    assert recorded['articles'] == 2
+    assert recorded['chunks_added'] > 0
+    assert store.get_source(content_hash='hash-a')['path'] == '/exports/a.txt'
+    assert store.get_source(path='/exports/missing.txt') is None
+    assert store.sources_of(['1', '2']) == {'1': ['/exports/a.txt'], '2': ['/exports/a.txt']}
+
+
+def test_articles_in_several_files_are_stored_once_and_linked_to_each(store):
+    store.add_prepared(prepared(article('1', 'Levodopa therapy.')),
+                       source={'path': '/exports/a.txt', 'content_hash': 'hash-a', 'size': 10})
+    added = store.add_prepared(prepared(article('1', 'Levodopa therapy.'), article('3', 'Tremor.')),
+                               source={'path': '/exports/b.txt', 'content_hash': 'hash-b', 'size': 20})
+
+    assert added == ['3']
+    assert store.count()['articles'] == 2
+    assert store.get_source(path='/exports/b.txt')['articles'] == 2
+    assert store.sources_of(['1', '3']) == {'1': ['/exports/a.txt', '/exports/b.txt'], '3': ['/exports/b.txt']}
+
+
+def test_reingesting_a_file_replaces_its_links(store):
+    store.add_prepared(prepared(article('1', 'Levodopa.'), article('2', 'Tremor.')),
+                       source={'path': '/exports/a.txt', 'content_hash': 'old', 'size': 10})
+    store.add_prepared(prepared(article('2', 'Tremor.')),
+                       source={'path': '/exports/a.txt', 'content_hash': 'new', 'size': 5})
+
+    assert store.get_source(path='/exports/a.txt')['content_hash'] == 'new'
+    assert store.sources_of(['1', '2']) == {'2': ['/exports/a.txt']}
+
+
+def test_copy_source_links_the_articles_of_an_identical_file(store):
+    store.add_prepared(prepared(article('1', 'Levodopa.')),
+                       source={'path': '/exports/a.txt', 'content_hash': 'same', 'size': 10})
+    store.copy_source('/exports/a.txt', {'path': '/exports/copy.txt', 'content_hash': 'same', 'size': 10})
+
+    assert store.get_source(path='/exports/copy.txt')['chunks_added'] == 0
+    assert store.sources_of(['1']) == {'1': ['/exports/a.txt', '/exports/copy.txt']}
+
+
+def test_load_chunks_can_skip_embedded_chunks(store):
+    store.add_articles([article('1', 'Levodopa therapy.'), article('2', 'Tremor.')])
+    first = store.load_chunks(['1'])['id']
+    store.save_embeddings(first, np.ones((len(first), 4)), 'model')
+
+    assert store.load_chunks(['1', '2'], unembedded=True)['pmid'] == ['2']
+    assert store.load_chunks(unembedded=True)['pmid'] == ['2']
+
+
+def test_load_embeddings_returns_only_the_requested_chunks_in_order(store):
+    store.add_articles([article('1', 'Levodopa therapy.'), article('2', 'Tremor.')])
+    ids = store.load_chunks()['id']
+    store.save_embeddings(ids, np.arange(len(ids) * 4, dtype=np.float32).reshape(len(ids), 4), 'model')
+
+    loaded = store.load_embeddings(ids[::-1], 'model')
+    assert loaded.tolist() == np.arange(len(ids) * 4).reshape(len(ids), 4)[::-1].tolist()
+    assert store.load_embeddings(ids[:1] + [max(ids) + 1], 'model') is None
+    assert store.load_embeddings(ids, 'other-model') is None
@@ -0,0 +1,68 @@
+from utils.doc_parser import parse_pubmed_export
+
+EXPORT = """1. Mov Disord. 2021 Mar;36(3):600-610. doi: 10.1002/mds.28400.
+
+Levodopa-induced dyskinesia: a review.
+
+Smith J(1), Doe A(2).
+
+Author information:
+(1)Department of Neurology.
+(2)Department of Pharmacology.
+
+BACKGROUND: Dyskinesia is a common complication
+of long-term levodopa therapy.
+
+RESULTS: Amantadine reduced dyskinesia.
+
+© 2021 International Parkinson and Movement Disorder Society.
+
+DOI: 10.1002/mds.28400
+PMID: 33100000
+
+
+2. J Neurol. 2020 Jan 5;267(1):1-9.
+
+Deep brain stimulation outcomes.
+
+BACKGROUND: Stimulation of the subthalamic nucleus improves motor symptoms.
+
+PMID: 33100001
+"""
+
+
+def test_pubmed_export_yields_one_article_per_record():
+    articles = parse_pubmed_export(EXPORT)
+
+    assert [article['pmid'] for article in articles] == ['33100000', '33100001']
+    first = articles[0]
+    assert first['journal'] == 'Mov Disord'
+    assert first['publication_date'] == '2021 Mar'
+    assert first['title'] == 'Levodopa-induced dyskinesia: a review.'
+    assert first['authors'] == ['Smith J', 'Doe A']
+    assert first['url'] == 'https://pubmed.ncbi.nlm.nih.gov/33100000/'
+    assert first['abstract'] == ('BACKGROUND: Dyskinesia is a common complication of long-term levodopa therapy.'
+                                 '\n\nRESULTS: Amantadine reduced dyskinesia.')
+    assert articles[1]['authors'] == []
+    assert articles[1]['abstract'] == 'BACKGROUND: Stimulation of the subthalamic nucleus improves motor symptoms.'
+
+
+def test_plain_text_yields_one_document_per_paragraph():
+    articles = parse_pubmed_export('line one\nline two\n\nSecond')
+
+    assert [article['abstract'] for article in articles] == ['line one line two', 'Second']
+    assert all(article['pmid'].startswith('sha1:') for article in articles)
+    assert parse_pubmed_export('line one\nline two')[0]['pmid'] == articles[0]['pmid']
+
+
+def test_records_without_blank_lines_between_them_are_split_at_pmid_lines():
+    export = EXPORT.replace("PMID: 33100000\n\n\n2. J Neurol.",
+                            "PMID: 33100000\n\nConflict of interest statement: None.2. J Neurol.")
+    glued = EXPORT.replace("PMID: 33100000\n\n\n2. J Neurol.", "PMID: 331000002. J Neurol.")
+
+    for text in (export, glued):
+        articles = parse_pubmed_export(text)
+        assert [article['pmid'] for article in articles] == ['33100000', '33100001']
+        assert articles[0]['abstract'] == parse_pubmed_export(EXPORT)[0]['abstract']
+        assert articles[1]['journal'] == 'J Neurol'
+        assert articles[1]['title'] == 'Deep brain stimulation outcomes.'
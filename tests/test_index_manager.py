@@ -0,0 +1,92 @@
+from index_manager import IndexManager, IndexVersion
+
+
+class Corpus:
+    """Mutable stand-in for the corpus source; builds record what they were built from."""
+
+    def __init__(self):
+        self.signature = ("corpus.txt", 1)
+        self.chunks = ["levodopa", "tremor"]
+        self.closed = []
+
+    def build(self, number):
+        return IndexVersion(number, self.signature, "|".join(self.chunks), list(self.chunks), {}, None, None,
+                            reference_embeddings=None, cleanup=lambda: self.closed.append(number))
+
+    def change(self, *chunks):
+        self.signature = (self.signature[0], self.signature[1] + 1)
+        self.chunks = list(chunks)
+
+
+def manager_for(corpus, retain=1):
+    return IndexManager(build=corpus.build, source_signature=lambda: corpus.signature,
+                        retain=retain, watch_interval_s=0)
+
+
+def reload(manager, force=False):
+    started = manager.request_reload(force=force)
+    manager.wait_for_build()
+    return started
+
+
+def test_reload_swaps_only_when_the_source_changed():
+    corpus = Corpus()
+    manager = manager_for(corpus)
+    first = manager.current()
+
+    assert first.number == 1
+    assert not reload(manager)
+    corpus.change("levodopa", "dyskinesia")
+    assert reload(manager)
+    assert manager.current().number == 2
+    assert manager.current().chunks == ["levodopa", "dyskinesia"]
+
+
+def test_pinned_version_survives_a_swap_until_released():
+    corpus = Corpus()
+    manager = manager_for(corpus, retain=0)
+
+    with manager.acquire() as pinned:
+        corpus.change("dyskinesia")
+        reload(manager)
+        assert manager.current() is not pinned
+        assert pinned.chunks == ["levodopa", "tremor"]
+        assert corpus.closed == []
+    assert corpus.closed == [1]
+
+
+def test_rollback_serves_the_retained_version_and_can_be_undone():
+    corpus = Corpus()
+    manager = manager_for(corpus)
+    manager.current()
+    corpus.change("dyskinesia")
+    reload(manager)
+
+    assert manager.rollback().number == 1
+    assert manager.current().number == 1
+    # The rolled-back source is not rebuilt again until it changes
+    assert not reload(manager)
+    assert manager.rollback().number == 2
+
+
+def test_unchanged_content_keeps_the_serving_version():
+    corpus = Corpus()
+    manager = manager_for(corpus)
+    first = manager.current()
+    corpus.change("levodopa", "tremor")
+
+    reload(manager)
+    assert manager.current() is first
+    assert first.source_signature == corpus.signature
+
+
+def test_replace_upgrades_only_the_serving_version():
+    corpus = Corpus()
+    manager = manager_for(corpus)
+    first = manager.current()
+    upgraded = corpus.build(first.number)
+
+    assert manager.replace(first, upgraded)
+    assert manager.current() is upgraded
+    assert not manager.replace(first, corpus.build(first.number))
+    assert manager.current() is upgraded
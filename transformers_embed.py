@@ -1,7 +1,98 @@
-from sentence_transformers import SentenceTransformer, util
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Hashable
+
+from backends import get_backend
 from config import Config
+from bulk_embed import bulk_embed
+from micro_batcher import MicroBatcher
+from utils.logger import setup_logger
+from utils.memory import register_component, array_bytes
+
+# torch is imported where it is used so importing this module stays cheap
+if TYPE_CHECKING:
+    import torch
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+
+def get_model():
+    """
+    Return the configured embedding backend, loading it on first use.
+
+    With EMBED_SERVICE_ADDRESS set, this is a client of the shared
+    embedding process, so API workers never load the weights.
+    """
+    return get_backend("embedder")
+
+
+class QueryEmbeddingCache:
+    """Bounded, thread-safe LRU cache of query embeddings."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
-model = SentenceTransformer(Config.TRANSFORMER_MODEL)
+    def get_or_compute(self, key: Hashable, compute: Callable[[], torch.Tensor]) -> torch.Tensor:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Encode outside the lock so concurrent misses don't serialize
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def footprint(self) -> dict:
+        with self._lock:
+            return {"bytes": sum(array_bytes(value) for value in self._entries.values()),
+                    "entries": len(self._entries)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+query_cache = QueryEmbeddingCache(Config.QUERY_CACHE_SIZE)
+register_component("query_embedding_cache", query_cache.footprint)
+query_batcher = MicroBatcher(
+    lambda texts: get_model().encode(texts, batch_size=len(texts), convert_to_numpy=True),
+    max_batch=Config.QUERY_BATCH_SIZE,
+    max_wait_ms=Config.QUERY_BATCH_WAIT_MS
+)
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace, and case for uncased models, so equivalent queries share a cache entry."""
+    text = " ".join(text.split())
+    if getattr(get_model().tokenizer, "do_lower_case", False):
+        text = text.lower()
+    return text
 
 def embed_text(text: str) -> list[float]:
     """
@@ -14,22 +105,88 @@ def embed_text(text: str) -> list[float]:
         list[float]: The embedding of the text.
     """
     
-    embedding = model.encode(text, convert_to_tensor=True)
+    embedding = get_model().encode(text, convert_to_tensor=True)
     return embedding
 
-def nearest_sentences(llm_response:str, reference_texts : list[str] , k:int = 5, reference_embeddings = None ) -> tuple[list[str], list[float]]:
+def embed_query(text: str) -> torch.Tensor:
+    """
+    Embed a query, reusing the cached embedding for repeated queries.
+
+    Args:
+        text (str): The query text.
+
+    Returns:
+        torch.Tensor: The query embedding.
+    """
+
+    import torch
+
+    normalized = normalize_query(text)
+    if Config.QUERY_BATCH_SIZE > 1:
+        # Cache misses from concurrent requests share one forward pass
+        encode = lambda: torch.from_numpy(query_batcher.encode(normalized))
+    else:
+        encode = lambda: embed_text(normalized)
+    return query_cache.get_or_compute((Config.TRANSFORMER_MODEL, normalized), encode)
+
+def embed_corpus(texts: list[str]) -> torch.Tensor:
+    """
+    Embed a full list of chunks with the length-bucketed bulk engine.
+
+    Args:
+        texts (list[str]): The chunks to embed.
+
+    Returns:
+        torch.Tensor: The embeddings, one row per chunk in input order.
+    """
+
+    import torch
+
+    return torch.from_numpy(bulk_embed(texts, model=get_model()))
+
+def nearest_sentences(llm_response:str, reference_texts : list[str] , k:int = 5, reference_embeddings = None, candidate_ids = None ) -> tuple[list[str], list[float]]:
+    """
+    Return the k reference texts closest to the given text.
+
+    Args:
+        llm_response (str): The text to search with.
+        reference_texts (list[str]): The corpus chunks.
+        k (int): Number of chunks to return.
+        reference_embeddings (torch.Tensor or index): One embedding row per chunk,
+            or an index object exposing `search(query, k, candidate_ids)`.
+        candidate_ids (array-like, optional): Restrict scoring to these chunk
+            positions, e.g. the output of a metadata filter.
+
+    Returns:
+        tuple: (best chunks most relevant first, their cosine scores)
+    """
     best_chunks = []
     # Load BioBERT model
 
-    response_embedding = embed_text(llm_response)
+    response_embedding = embed_query(llm_response)
+
+    if hasattr(reference_embeddings, "search"):
+        best_ixs, scores = reference_embeddings.search(response_embedding.cpu().numpy(), k, candidate_ids)
+        best_chunks = [reference_texts[match_idx] for match_idx in best_ixs]
+        return best_chunks, scores
+
+    import torch
+    import torch.nn.functional as F
+
+    if candidate_ids is not None:
+        if len(candidate_ids) == 0:
+            return [], []
+        candidate_ids = torch.as_tensor(candidate_ids, dtype=torch.long)
+        reference_embeddings = reference_embeddings.index_select(0, candidate_ids)
 
     # Calculate cosine similarities
-    cosine_scores = util.cos_sim(response_embedding, reference_embeddings)
-    cosine_scores = cosine_scores[0].numpy()  # Get the first row of the cosine similarity matrix
+    query = F.normalize(response_embedding.reshape(1, -1), dim=1)
+    cosine_scores = (query @ F.normalize(reference_embeddings, dim=1).T)[0].numpy()
 
-    best_ixs = cosine_scores.argsort()[-k:]
+    best_ixs = cosine_scores.argsort()[-k:][::-1]  # Most relevant first
     for match_idx in best_ixs:
-        best_chunks.append(reference_texts[match_idx]) #, Score: {cosine_scores[match_idx]}")
-        print (f"score: {cosine_scores[match_idx]}")
+        text_idx = int(candidate_ids[match_idx]) if candidate_ids is not None else match_idx
+        best_chunks.append(reference_texts[text_idx]) #, Score: {cosine_scores[match_idx]}")
+    logger.debug(f"Retrieval scores: {cosine_scores[best_ixs].tolist()}")
 
-    return best_chunks , cosine_scores
\ No newline at end of file
+    return best_chunks , cosine_scores[best_ixs]
\ No newline at end of file
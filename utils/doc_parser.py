@@ -1,4 +1,5 @@
 import re
+import hashlib
 
 def filter_conflict_lines(document_text  : str) -> str:
     """
@@ -24,3 +25,87 @@ def filter_author_like_lines(document_text: str) -> str:
     pattern = r'\(\d+\)'
     lines_filtered = [line for line in document_text.split('\n') if not bool(re.search(pattern,line))]
     return '\n'.join(lines_filtered)
+
+def _unwrap(paragraph: str) -> str:
+    return ' '.join(line.strip() for line in paragraph.split('\n') if line.strip())
+
+def _split_records(document_text: str) -> list:
+    """
+    Splits an export into records at blank lines before a record number.
+
+    When the blank lines before a record were lost, its header is glued to
+    the end of the previous record ("...conflict of interest.61. Interdiscip
+    Med." or even "PMID: 40334129121. ACS Chem Neurosci."). A chunk holding
+    several PMID lines is therefore cut again after each PMID line, where
+    the next record number appears.
+    """
+    records = re.split(r'\n\s*\n\s*\n(?=\d+\.\s)', '\n\n\n' + document_text.strip())
+    split = []
+    for record in records:
+        pmid_lines = [match.start() for match in re.finditer(r'^PMID:', record, re.M)]
+        number_match = re.match(r'\s*(\d+)\.\s', record)
+        number = int(number_match.group(1)) if number_match else None
+        start = 0
+        for pmid_start, next_pmid in zip(pmid_lines, pmid_lines[1:]):
+            header = None
+            if number is not None:
+                number += 1
+                # The PMID's own digits come first; the header may follow them directly
+                header = re.compile(rf'{number}\.\s').search(record, pmid_start + len('PMID: 0'), next_pmid)
+            end = header.start() if header else record.index('\n', pmid_start)
+            split.append(record[start:end])
+            start = end
+        split.append(record[start:])
+    return [record for record in split if record.strip()]
+
+def parse_pubmed_export(document_text: str) -> list:
+    """
+    Parses a PubMed "Abstract" text export into article dictionaries.
+
+    Records are numbered ("1. Journal. Date. doi: ...") and separated by blank
+    lines, or at least end at their PMID line; the title, authors, author information and abstract follow as
+    paragraphs, and the record ends with DOI/PMID lines and statements that are
+    not part of the abstract. Text that is not in this format yields one
+    article per paragraph, with an id derived from its content.
+    Args:
+        document_text (str): Contents of one export file.
+    Returns:
+        list: Dictionaries with 'pmid', 'title', 'journal', 'publication_date',
+        'authors', 'publication_types', 'url' and 'abstract', as accepted by
+        `CorpusStore.add_articles`.
+    """
+    document_text = document_text.replace('\r\n', '\n')
+    records = _split_records(document_text)
+    if not any(re.search(r'^PMID:\s*\d+', record, re.M) for record in records):
+        paragraphs = [_unwrap(p) for p in re.split(r'\n\s*\n', document_text) if p.strip()]
+        return [{'pmid': f"sha1:{hashlib.sha1(p.encode('utf-8')).hexdigest()[:16]}", 'abstract': p}
+                for p in paragraphs]
+
+    articles = []
+    for record in records:
+        pmid_match = re.search(r'^PMID:\s*(\d+)', record, re.M)
+        paragraphs = [p.strip() for p in re.split(r'\n\s*\n', record.strip()) if p.strip()]
+        header = _unwrap(paragraphs[0])
+        header_match = re.match(r'\d+\.\s+([^.]+)\.\s+([^.;:]+)', header)
+        body = paragraphs[1:]
+        end = next((i for i, p in enumerate(body) if re.match(r'(©|Copyright|DOI:|PMCID:|PMID:|Conflict of interest)', p)), len(body))
+        body = body[:end]
+        title = _unwrap(body[0]) if body else None
+        authors, abstract_start = [], 1
+        if len(body) > 1 and not re.match(r'[A-Z ]+:', body[1]) and not body[1].startswith('Author information'):
+            authors = [re.sub(r'(\(\d+\))+', '', name).strip() for name in _unwrap(body[1]).rstrip('.').split(',')]
+            abstract_start = 2
+        if len(body) > abstract_start and body[abstract_start].startswith('Author information'):
+            abstract_start += 1
+        pmid = pmid_match.group(1) if pmid_match else f"sha1:{hashlib.sha1(record.encode('utf-8')).hexdigest()[:16]}"
+        articles.append({
+            'pmid': pmid,
+            'title': title,
+            'journal': header_match.group(1).strip() if header_match else None,
+            'publication_date': header_match.group(2).strip() if header_match else None,
+            'authors': [name for name in authors if name],
+            'publication_types': [],
+            'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" if pmid_match else None,
+            'abstract': '\n\n'.join(_unwrap(p) for p in body[abstract_start:])
+        })
+    return articles
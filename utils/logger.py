@@ -1,27 +1,155 @@
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
+import uuid
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, TextIO
 
-def setup_logger(log_file: str, log_level: str = "INFO") -> logging.Logger:
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# Correlation id of the request being handled in the current thread/task
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+# Streams currently capturing a request's log lines, for memory accounting
+_capture_streams: "weakref.WeakSet[TextIO]" = weakref.WeakSet()
+
+
+def _install_record_factory():
+    """Stamp every record with the current request id when it is created."""
+    base_factory = logging.getLogRecordFactory()
+    if getattr(base_factory, "_adds_request_id", False):
+        return
+
+    def factory(*args, **kwargs):
+        record = base_factory(*args, **kwargs)
+        record.request_id = request_id_var.get()
+        return record
+
+    factory._adds_request_id = True
+    logging.setLogRecordFactory(factory)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers and `jq`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the writer falls behind."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logger(log_file: str, log_level: str = "INFO", structured: bool = False,
+                 fmt: str = TEXT_FORMAT, queue_size: int = 10000) -> logging.Logger:
     """
-    Sets up a logger with console and file handlers.
-    Ensures no duplicate handlers are added.
+    Sets up the root logger to write through a queue.
+
+    Request threads only enqueue records; a background listener formats
+    them and writes to the file and console handlers. Ensures no
+    duplicate handlers are added.
     """
+    global _listener, _queue_handler
+
     # Use the root logger to maintain a single instance across modules
     logger = logging.getLogger()
 
-    # Check if handlers are already configured
-    if not logger.hasHandlers():
+    if _listener is None:
+        _install_record_factory()
         logger.setLevel(log_level)
 
-        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        formatter = JsonFormatter() if structured else logging.Formatter(fmt)
 
         # File handler
         file_handler = logging.FileHandler(log_file)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
 
         # Console handler
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
 
-    return logger
\ No newline at end of file
+        _queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+        logger.addHandler(_queue_handler)
+        _listener = logging.handlers.QueueListener(
+            _queue_handler.queue, file_handler, console_handler, respect_handler_level=True
+        )
+        _listener.start()
+        # Flush whatever is still queued when the process exits
+        atexit.register(_listener.stop)
+
+    return logger
+
+
+def log_buffer_footprint() -> dict:
+    """Characters held by in-flight request log captures and records waiting in the log queue."""
+    streams = list(_capture_streams)
+    captured = 0
+    for stream in streams:
+        try:
+            captured += stream.tell()  # StringIO position = characters written
+        except (ValueError, OSError):
+            pass
+    queued = _queue_handler.queue.qsize() if _queue_handler is not None else 0
+    return {"bytes": captured, "captures": len(streams), "queued_records": queued}
+
+
+def dropped_log_records() -> int:
+    """Records discarded because the log queue was full."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """Tag all log records emitted inside the block with a correlation id."""
+    request_id = request_id or uuid.uuid4().hex[:12]
+    token = request_id_var.set(request_id)
+    try:
+        yield request_id
+    finally:
+        request_id_var.reset(token)
+
+
+@contextmanager
+def capture_request_logs(stream: TextIO, request_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Run a request under a new correlation id and copy its log lines to `stream`.
+
+    Records of other concurrent requests are not captured.
+    """
+    with request_context(request_id) as current_id:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        handler.addFilter(lambda record: getattr(record, "request_id", None) == current_id)
+        logger = logging.getLogger()
+        logger.addHandler(handler)
+        _capture_streams.add(stream)
+        try:
+            yield current_id
+        finally:
+            logger.removeHandler(handler)
+            _capture_streams.discard(stream)
@@ -0,0 +1,157 @@
+"""
+Memory accounting for the pipeline.
+
+Components (model weights, index vectors, chunk text, caches...) register
+a probe returning their size in bytes, and `memory_report` collects them
+next to the process RSS. `track_stage` records, per pipeline stage, how
+much the resident set grew and, with tracing enabled, the peak of Python
+and numpy allocations. Torch's CPU allocator bypasses tracemalloc, so
+the RSS growth is what shows its tensors.
+
+tracemalloc keeps a single, process-wide peak, so traced peaks are only
+meaningful for a stage that ran alone. Runs that overlapped another
+traced stage (a concurrent request, or a nested stage) are counted as
+`traced_overlapped` instead of reporting a peak that another stage's
+reset may have cut short. Trace on a single-threaded workload such as
+`scripts/bench_memory.py --trace`.
+"""
+import sys
+import time
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+_PAGE_SIZE = resource.getpagesize()
+
+_components: Dict[str, Callable[[], Dict]] = {}
+_stages: Dict[str, Dict] = {}
+_lock = threading.Lock()
+_tracing = False
+# Traced stage runs in progress; each records whether another one overlapped it
+_active_traces: Dict[int, Dict[str, bool]] = {}
+
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """Current and peak resident set size of this process, in bytes."""
+    rss = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if sys.platform == "darwin" else peak * 1024
+    return {"rss_bytes": rss, "peak_rss_bytes": peak}
+
+
+def text_bytes(texts: Iterable[str]) -> int:
+    """Size of a collection of strings, including the per-object overhead."""
+    return sum(sys.getsizeof(text) for text in texts)
+
+
+def array_bytes(array) -> int:
+    """Bytes held by a numpy array or torch tensor; 0 for memory-mapped (file-backed) arrays."""
+    if array is None:
+        return 0
+    if hasattr(array, "element_size"):  # torch.Tensor
+        return array.numel() * array.element_size()
+    base = array
+    while getattr(base, "base", None) is not None:
+        base = base.base
+    if type(base).__name__ == "mmap" or type(array).__name__ == "memmap":
+        return 0
+    return int(getattr(array, "nbytes", 0))
+
+
+def module_bytes(module) -> int:
+    """Parameter and buffer bytes of a torch module."""
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def register_component(name: str, probe: Callable[[], Dict]):
+    """
+    Register a probe reporting a component's footprint.
+
+    The probe returns a dict with at least `bytes`; other keys (counts,
+    notes) are passed through to the report.
+    """
+    _components[name] = probe
+
+
+def enable_stage_tracing(enabled: bool = True):
+    """Trace Python/numpy allocations in `track_stage` (adds overhead to every allocation)."""
+    global _tracing
+    _tracing = enabled
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextmanager
+def track_stage(name: str) -> Iterator[None]:
+    """
+    Record the RSS growth, traced allocation peak and duration of a pipeline stage.
+
+    The RSS growth includes whatever other threads allocated or freed during
+    the stage. The traced peak is only recorded when no other traced stage
+    ran at the same time, because resetting the process-wide peak for one
+    stage clears it for all others.
+    """
+    rss_before = process_memory()["rss_bytes"]
+    traced_before = None
+    trace = {"overlapped": False}
+    if _tracing and tracemalloc.is_tracing():
+        with _lock:
+            if _active_traces:
+                trace["overlapped"] = True
+                for other in _active_traces.values():
+                    other["overlapped"] = True
+            _active_traces[id(trace)] = trace
+            traced_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        rss_after = process_memory()["rss_bytes"]
+        traced_peak = None
+        with _lock:
+            if traced_before is not None:
+                _active_traces.pop(id(trace), None)
+                if not trace["overlapped"] and tracemalloc.is_tracing():
+                    traced_peak = max(tracemalloc.get_traced_memory()[1] - traced_before, 0)
+            stats = _stages.setdefault(name, {"calls": 0, "max_rss_growth_bytes": 0, "max_traced_peak_bytes": None,
+                                              "traced_overlapped": 0, "total_seconds": 0.0})
+            stats["calls"] += 1
+            stats["traced_overlapped"] += traced_before is not None and trace["overlapped"]
+            stats["total_seconds"] += elapsed
+            if rss_before is not None and rss_after is not None:
+                stats["max_rss_growth_bytes"] = max(stats["max_rss_growth_bytes"], rss_after - rss_before)
+            if traced_peak is not None:
+                stats["max_traced_peak_bytes"] = max(stats["max_traced_peak_bytes"] or 0, traced_peak)
+
+
+def memory_report() -> Dict:
+    """Process RSS, per-component footprint and per-stage allocation peaks."""
+    components = {}
+    for name, probe in list(_components.items()):
+        try:
+            components[name] = probe()
+        except Exception as error:
+            components[name] = {"bytes": None, "error": f"{type(error).__name__}: {error}"}
+    accounted = sum(component.get("bytes") or 0 for component in components.values())
+    with _lock:
+        stages = {name: dict(stats) for name, stats in _stages.items()}
+    return {
+        "process": process_memory(),
+        "components": components,
+        "accounted_bytes": accounted,
+        "stages": stages,
+        "stage_tracing": _tracing
+    }
@@ -0,0 +1,232 @@
+import os
+import fcntl
+import hashlib
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger(log_file=Config.LOG_FILE, log_level=Config.LOG_LEVEL)
+
+# Rows scanned per block; small blocks keep the temporary float32 copy in cache
+SCAN_BLOCK_ROWS = 1024
+
+STORAGE_MODES = ("int8", "binary")
+
+# Set-bit counts for every 16-bit value, used when np.bitwise_count (numpy>=2) is unavailable
+_POPCOUNT16 = np.unpackbits(np.arange(65536, dtype=np.uint16).view(np.uint8)).reshape(-1, 16).sum(axis=1).astype(np.uint8)
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so dot products are cosine similarities."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+def corpus_signature(chunks: List[str], model_name: str) -> str:
+    """Hash of the chunk texts and embedding model, used to name shared index files."""
+    digest = hashlib.sha256(model_name.encode())
+    for chunk in chunks:
+        digest.update(chunk.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class MappedIndex:
+    """
+    Exact cosine index over a normalized float32 matrix memory-mapped from disk.
+
+    Every process that opens the same file shares one copy of the vectors
+    through the OS page cache, so N API workers cost one matrix of RAM
+    instead of N.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    @classmethod
+    def open_or_build(cls, signature: str, compute: Callable[[], np.ndarray], path: str) -> "MappedIndex":
+        """
+        Map the published matrix for `signature`, building it first if no process has yet.
+
+        Args:
+            signature (str): Corpus signature from `corpus_signature`.
+            compute (callable): Returns the embeddings; only called by the first process.
+            path (str): Directory holding the published matrices.
+
+        Returns:
+            MappedIndex: Index over the shared read-only matrix.
+        """
+        os.makedirs(path, exist_ok=True)
+        matrix_path = os.path.join(path, f"shared_{signature}.npy")
+        with open(matrix_path + ".lock", "w") as lock_file:
+            # Other workers block here until the first one has published the file
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(matrix_path):
+                normalized = normalize_rows(compute())
+                tmp_path = f"{matrix_path}.{os.getpid()}.tmp.npy"
+                np.save(tmp_path, normalized)
+                os.replace(tmp_path, matrix_path)
+                logger.info(f"Published {normalized.shape[0]} shared embeddings to {matrix_path}")
+        matrix = np.load(matrix_path, mmap_mode="r")
+        logger.info(f"Mapped shared embeddings {matrix_path} ({matrix.nbytes / 1e6:.1f} MB)")
+        return cls(matrix)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def search(self, query_embedding: np.ndarray, k: int, candidate_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest chunks by cosine similarity.
+
+        Args:
+            query_embedding (np.ndarray): Query vector.
+            k (int): Number of results.
+            candidate_ids (np.ndarray, optional): Restrict the search to these rows.
+
+        Returns:
+            tuple: (chunk positions best first, cosine scores)
+        """
+        query = normalize_rows(np.asarray(query_embedding).reshape(-1))
+        if candidate_ids is None:
+            scores = self.matrix @ query
+            best = top_k(scores, k)
+            return best, scores[best]
+        rows = np.sort(np.asarray(candidate_ids, dtype=np.int64))
+        scores = np.asarray(self.matrix[rows]) @ query
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+
+class QuantizedIndex:
+    """
+    Compressed in-memory index with full-precision rescoring from disk.
+
+    The first pass scans compact codes: int8 scalar-quantized vectors
+    (4x smaller than float32) or binary sign codes (32x smaller). The best
+    `k * rescore_factor` candidates are then rescored exactly against the
+    normalized float32 vectors, which stay on disk behind a memory map.
+    """
+
+    def __init__(self, codes: np.ndarray, scale: Optional[np.ndarray], full_precision: np.ndarray,
+                 mode: str, rescore_factor: Optional[int] = None):
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown index storage mode '{mode}', expected one of {STORAGE_MODES}")
+        self.codes = codes
+        self.scale = scale
+        self.full_precision = full_precision
+        self.mode = mode
+        self.rescore_factor = rescore_factor or Config.RESCORE_FACTOR
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, mode: str, path: str, rescore_factor: Optional[int] = None) -> "QuantizedIndex":
+        """
+        Quantize embeddings and write the full-precision copy to disk.
+
+        Args:
+            embeddings (np.ndarray): Float embeddings, one row per chunk.
+            mode (str): 'int8' or 'binary'.
+            path (str): Directory for the index files.
+            rescore_factor (int, optional): Candidates rescored per result.
+
+        Returns:
+            QuantizedIndex: Index whose float32 vectors are memory-mapped from `path`.
+        """
+        os.makedirs(path, exist_ok=True)
+        normalized = normalize_rows(embeddings)
+        if mode == "int8":
+            scale = np.maximum(np.abs(normalized).max(axis=0), 1e-12) / 127.0
+            codes = np.clip(np.rint(normalized / scale), -127, 127).astype(np.int8)
+        elif mode == "binary":
+            scale = None
+            codes = np.packbits(normalized > 0, axis=1)
+        else:
+            raise ValueError(f"Unknown index storage mode '{mode}', expected one of {STORAGE_MODES}")
+
+        np.save(os.path.join(path, "vectors.npy"), normalized)
+        np.save(os.path.join(path, f"codes_{mode}.npy"), codes)
+        if scale is not None:
+            np.save(os.path.join(path, "scale.npy"), scale.astype(np.float32))
+        logger.info(f"Built {mode} index for {len(codes)} vectors in {path}: "
+                    f"{codes.nbytes / 1e6:.1f} MB in memory vs {normalized.nbytes / 1e6:.1f} MB float32")
+        return cls.load(path, mode, rescore_factor)
+
+    @classmethod
+    def load(cls, path: str, mode: str, rescore_factor: Optional[int] = None) -> "QuantizedIndex":
+        """Load codes into memory and memory-map the float32 vectors."""
+        codes = np.load(os.path.join(path, f"codes_{mode}.npy"))
+        scale_path = os.path.join(path, "scale.npy")
+        scale = np.load(scale_path) if mode == "int8" and os.path.exists(scale_path) else None
+        full_precision = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        return cls(codes, scale, full_precision, mode, rescore_factor)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory (the memory-mapped float32 vectors are excluded)."""
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def _approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.mode == "binary":
+            query_bits = np.packbits(query > 0)
+            # Compare 64 bits at a time with a native popcount, else 16 bits through a lookup table
+            if hasattr(np, "bitwise_count") and codes.shape[1] % 8 == 0:
+                word = np.uint64
+            else:
+                word = np.uint16 if codes.shape[1] % 2 == 0 else np.uint8
+            codes = np.ascontiguousarray(codes).view(word)
+            query_bits = query_bits.view(word)
+            scores = np.empty(len(codes), dtype=np.float32)
+            for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+                xor = np.bitwise_xor(codes[start:start + SCAN_BLOCK_ROWS], query_bits)
+                counts = np.bitwise_count(xor) if word is np.uint64 else _POPCOUNT16[xor]
+                scores[start:start + SCAN_BLOCK_ROWS] = -counts.sum(axis=1, dtype=np.int32)
+            return scores
+
+        scaled_query = (query * self.scale).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + SCAN_BLOCK_ROWS] = block @ scaled_query
+        return scores
+
+    def search(self, query_embedding: np.ndarray, k: int, candidate_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest chunks by cosine similarity.
+
+        Args:
+            query_embedding (np.ndarray): Query vector.
+            k (int): Number of results.
+            candidate_ids (np.ndarray, optional): Restrict the search to these rows.
+
+        Returns:
+            tuple: (chunk positions best first, exact cosine scores)
+        """
+        query = normalize_rows(np.asarray(query_embedding).reshape(-1))
+        rows = None if candidate_ids is None else np.asarray(candidate_ids, dtype=np.int64)
+
+        approximate = self._approximate_scores(query, rows)
+        shortlist = top_k(approximate, k * self.rescore_factor)
+        if rows is not None:
+            shortlist = rows[shortlist]
+
+        # Sorted positions keep memory-map reads sequential
+        shortlist = np.sort(shortlist)
+        exact = np.asarray(self.full_precision[shortlist]) @ query
+        best = top_k(exact, k)
+        return shortlist[best], exact[best]